@@ -0,0 +1,20 @@
+# gunicorn configuration, loaded automatically when gunicorn is started from the repository root
+import os
+import shutil
+
+# every worker writes its prometheus metrics in this directory, so that /metrics served by any
+# worker aggregates all of them: it must be set before prometheus_client is imported, here or by the app
+prometheus_multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # metrics files of a previous run would be summed to the new ones
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir)
+
+
+def child_exit(server, worker):
+    # drop the live gauges (pool sizes) of dead workers
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,11 +1,27 @@
 from dotenv import load_dotenv
 load_dotenv()
 from fastapi import FastAPI
-from src.db.models import init_db
+from src.db.blocklist_filter import revoked_token_filter
+from src.db.models import SessionLocal, async_engine, engine, init_db
+from src.db.redis import (
+    TOKEN_BLOCKLIST_CHANNEL,
+    TOKEN_BLOCKLIST_STREAM,
+    USER_CHANGES_CHANNEL,
+    async_redis_pool,
+    invalidation_listener,
+    token_blacklist,
+)
+from src.db.snapshot import load_vocabulary_snapshot
+from src.instrumentation import SQLInstrumentationMiddleware, instrument_engine
+from src.metrics import MetricsMiddleware
 from src.routes.default import router as default_router
 from src.routes.games import router as games_router
+from src.routes.metrics import router as metrics_router
 from src.routes.stats import router as stats_router
 from src.routes.users import router as user_router
+from src.services.password_hashing import password_hashing_pool
+from src.services.principals import user_principal_cache
+from src.services.token_cache import verified_token_cache
 from contextlib import asynccontextmanager
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import os
@@ -16,16 +32,34 @@ DOMAIN = os.getenv("DOMAIN")
 async def lifespan(app: FastAPI):
     print("Server is starting...")
     init_db()
+    with SessionLocal() as db:
+        load_vocabulary_snapshot(db)
+    # the routes only use the async engine, and vocabulary reloads a single connection of the synchronous one
+    # at a time: the connections opened at startup would stay idle
+    engine.dispose()
+    invalidation_listener.register(TOKEN_BLOCKLIST_CHANNEL, verified_token_cache)
+    invalidation_listener.register(USER_CHANGES_CHANNEL, user_principal_cache)
+    invalidation_listener.start(token_blacklist)
+    revoked_token_filter.start(token_blacklist, TOKEN_BLOCKLIST_STREAM)
     yield
     print("Server is stopping...")
+    invalidation_listener.stop()
+    revoked_token_filter.stop()
+    await async_redis_pool.close()
+    password_hashing_pool.shutdown()
 
 
 version = "v1"
 app = FastAPI(title="learn your language api", version=version, lifespan=lifespan)
 
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1", "testserver", DOMAIN])
+app.add_middleware(SQLInstrumentationMiddleware)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
 
 app.include_router(default_router)
+app.include_router(metrics_router)
 app.include_router(router=games_router, prefix=f"/api/{version}/games")
 app.include_router(router=stats_router, prefix=f"/api/{version}/stats")
 app.include_router(router=user_router, prefix=f"/api/{version}/users")
\ No newline at end of file
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import os
+import threading
+import time
+import redis
+
+# expected number of revoked jtis alive at once, and false positive rate of the filter at that size:
+# the filter is rebuilt twice as large when more revocations come in
+TOKEN_BLOCKLIST_FILTER_CAPACITY = int(os.getenv("TOKEN_BLOCKLIST_FILTER_CAPACITY", 100000))
+TOKEN_BLOCKLIST_FILTER_ERROR_RATE = float(os.getenv("TOKEN_BLOCKLIST_FILTER_ERROR_RATE", 0.001))
+# how long the filter answers alone without hearing from redis: revocations published meanwhile are missed
+TOKEN_BLOCKLIST_FILTER_MAX_STALENESS_SECONDS = float(os.getenv("TOKEN_BLOCKLIST_FILTER_MAX_STALENESS_SECONDS", 30))
+SYNC_BATCH_SIZE = 10000
+SYNC_BLOCK_MILLISECONDS = 1000
+SYNC_RETRY_DELAY_SECONDS = 1.0
+
+
+class BloomFilter:
+    """
+    Set membership with false positives but no false negatives, in a fixed size bit array.
+
+    Attributes:
+        capacity (int): Number of items the filter is sized for.
+        error_rate (float): False positive rate once capacity items were added.
+        n_bits (int): Size of the bit array.
+        n_hashes (int): Number of bits set per item.
+        n_items (int): Number of distinct items added, i.e. of adds that set at least one bit.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.n_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.n_items = 0
+        self._bits = bytearray((self.n_bits + 7) // 8)
+
+    def _get_positions(self, item: str):
+        # double hashing: k positions out of the two halves of a single digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def add(self, item: str) -> None:
+        # an item added twice (e.g. revoked locally, then read back from the stream) only fills the filter once
+        is_new = False
+        for position in self._get_positions(item):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                is_new = True
+        self.n_items += is_new
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._get_positions(item))
+
+
+class RevokedTokenFilter:
+    """
+    Per-process bloom filter of the revoked jtis, so that the blocklist only needs redis to confirm a hit.
+
+    Revocations are appended to a redis stream (see add_jti_to_blocklist): the filter is loaded from the
+    whole stream, then a thread tails it. Since a filter cannot forget, it is rebuilt from the stream,
+    which only holds the revocations of the tokens still alive, once it is full.
+
+    Attributes:
+        capacity (int): Number of revocations the next filter is sized for.
+        error_rate (float): False positive rate of the filter.
+        max_staleness_seconds (float): How long the filter is trusted since it last heard from redis.
+        last_id (str): Id of the last stream entry added to the filter.
+        synced_at (float | None): Monotonic time of the last successful read of the stream.
+    """
+    def __init__(
+        self,
+        capacity: int = TOKEN_BLOCKLIST_FILTER_CAPACITY,
+        error_rate: float = TOKEN_BLOCKLIST_FILTER_ERROR_RATE,
+        max_staleness_seconds: float = TOKEN_BLOCKLIST_FILTER_MAX_STALENESS_SECONDS
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_staleness_seconds = max_staleness_seconds
+        self.last_id = "0-0"
+        self.synced_at: float | None = None
+        self._filter: BloomFilter | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def is_ready(self) -> bool:
+        return (
+            self._filter is not None
+            and self.synced_at is not None
+            and time.monotonic() - self.synced_at < self.max_staleness_seconds
+        )
+
+    def might_contain(self, jti: str) -> bool:
+        """
+        Whether the jti may have been revoked: only meaningful when the filter is ready.
+        """
+        bloom_filter = self._filter
+        return bloom_filter is None or jti in bloom_filter
+
+    def add(self, jti: str) -> None:
+        bloom_filter = self._filter
+        if bloom_filter is not None:
+            bloom_filter.add(jti)
+
+    def start(self, redis_client: redis.Redis, stream: str) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sync, args=(redis_client, stream), name="token-blocklist-filter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._filter = None
+        self.synced_at = None
+
+    def _load(self, redis_client: redis.Redis, stream: str) -> None:
+        n_revocations = redis_client.xlen(stream)
+        self.capacity = max(self.capacity, 2 * n_revocations)
+        bloom_filter = BloomFilter(self.capacity, self.error_rate)
+        last_id = "0-0"
+        while True:
+            entries = redis_client.xrange(stream, f"({last_id}", "+", count=SYNC_BATCH_SIZE)
+            for entry_id, fields in entries:
+                bloom_filter.add(fields[b"jti"].decode())
+                last_id = entry_id.decode()
+            if len(entries) < SYNC_BATCH_SIZE:
+                break
+        self._filter = bloom_filter
+        self.last_id = last_id
+        self.synced_at = time.monotonic()
+        print(f"Token blocklist filter loaded: {bloom_filter.n_items} revocations, capacity {self.capacity}")
+
+    def _sync(self, redis_client: redis.Redis, stream: str) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._filter is None or self._filter.n_items >= self._filter.capacity:
+                    self._load(redis_client, stream)
+                response = redis_client.xread(
+                    {stream: self.last_id}, count=SYNC_BATCH_SIZE, block=SYNC_BLOCK_MILLISECONDS
+                )
+                for _, entries in response:
+                    for entry_id, fields in entries:
+                        self._filter.add(fields[b"jti"].decode())
+                        self.last_id = entry_id.decode()
+                self.synced_at = time.monotonic()
+            except redis.RedisError as exception:
+                print(f"Token blocklist filter sync failed: {exception}")
+                self._stop.wait(SYNC_RETRY_DELAY_SECONDS)
+
+
+revoked_token_filter = RevokedTokenFilter()
@@ -1,19 +1,83 @@
-import csv
 import os
-from typing import List
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, create_engine, text, Index
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base, deferred, Mapped
+import uuid
+from typing import Any, Dict, List
+from sqlalchemy import URL, Column, Computed, Float, ForeignKey, Integer, NullPool, String, Boolean, create_engine, make_url, text, Index
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, relationship, declarative_base, deferred, Mapped
 from sqlalchemy.dialects import postgresql
 from datetime import datetime
 from dotenv import load_dotenv
+from src.metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool
 load_dotenv()
 
 DATABASE_URL = os.getenv("POSTGRES_DB_URL")
+# connections kept open by the pool of every engine, and opened beyond when all are in use: every worker
+# holds up to DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW connections, which times the number of workers
+# must stay below max_connections of postgres (the synchronous engine is disposed of after the startup)
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 5))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", 10))
+# how long a checkout waits for a connection once the pool is exhausted, before failing
+DATABASE_POOL_TIMEOUT_SECONDS = float(os.getenv("DATABASE_POOL_TIMEOUT_SECONDS", 30))
+# connections older than this are replaced at checkout, -1 keeps them forever
+DATABASE_POOL_RECYCLE_SECONDS = int(os.getenv("DATABASE_POOL_RECYCLE_SECONDS", 1800))
+# test every connection at checkout, at the cost of a round trip, to survive database restarts and dropped connections
+DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "false").lower() == "true"
+# statements running longer are cancelled by postgres, 0 disables the timeout
+DATABASE_STATEMENT_TIMEOUT_MILLISECONDS = int(os.getenv("DATABASE_STATEMENT_TIMEOUT_MILLISECONDS", 0))
+# when connecting through pgbouncer in transaction pooling mode: pgbouncer pools the connections, and consecutive
+# transactions may run on different server connections, which rules out server side prepared statements and
+# session settings (set the statement timeout on the role instead: ALTER ROLE ... SET statement_timeout = ...)
+DATABASE_PGBOUNCER_MODE = os.getenv("DATABASE_PGBOUNCER_MODE", "false").lower() == "true"
 
-engine = create_engine(
-    DATABASE_URL, echo=False
-)
+
+def get_engine_options(is_async: bool) -> Dict[str, Any]:
+    """
+    Keyword arguments of create_engine or create_async_engine, from the pool and timeout settings.
+    """
+    if is_async and DATABASE_PGBOUNCER_MODE:
+        # no prepared statements cached by asyncpg, and unique names for the ones it still prepares
+        return {
+            "poolclass": NullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            },
+        }
+    options: Dict[str, Any] = {
+        "poolclass": TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        "pool_size": DATABASE_POOL_SIZE,
+        "max_overflow": DATABASE_MAX_OVERFLOW,
+        "pool_timeout": DATABASE_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": DATABASE_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": DATABASE_POOL_PRE_PING,
+    }
+    # psycopg2 does not prepare statements, so only session settings are left out in pgbouncer mode
+    if DATABASE_STATEMENT_TIMEOUT_MILLISECONDS > 0 and not DATABASE_PGBOUNCER_MODE:
+        if is_async:
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DATABASE_STATEMENT_TIMEOUT_MILLISECONDS)}
+            }
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DATABASE_STATEMENT_TIMEOUT_MILLISECONDS}"}
+    return options
+
+
+engine = create_engine(DATABASE_URL, echo=False, **get_engine_options(is_async=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def get_async_database_url(database_url: str) -> URL:
+    return make_url(database_url).set(drivername="postgresql+asyncpg")
+
+
+# the routes run on the event loop and query the database through asyncpg; the synchronous engine
+# above is kept for the startup and the command line scripts (schema, vocabulary sync, snapshots)
+async_engine = create_async_engine(
+    get_async_database_url(DATABASE_URL), echo=False, **get_engine_options(is_async=True)
+)
+# objects stay loaded after commit: expired attributes cannot be lazy loaded by an AsyncSession
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 SUPPORTED_LANGUAGES = ["german", "italian"]
@@ -79,6 +143,7 @@ class WordTranslation(Base):
         word_id (int): Foreign key to the Word.
         translation_id (int): Foreign key to the Translation.
         frequency (int): Frequency of usage or importance.
+        import_checkpoint_id (int | None): Foreign key to the streaming import that loaded the pair, if any.
         word (Word): The source word.
         translation (Translation): The translated word.
     """
@@ -87,8 +152,14 @@ class WordTranslation(Base):
     word_id = Column(Integer, ForeignKey("words.id", ondelete="CASCADE"))
     translation_id = Column(Integer, ForeignKey("words.id", ondelete="CASCADE"))
     frequency = Column(Integer, nullable=False, index=True)
+    # pairs of a streaming import are not in the language csv: syncs do not retire them while the import exists
+    import_checkpoint_id = Column(Integer, ForeignKey("vocabulary_import_checkpoints.id", ondelete="SET NULL"), nullable=True)
     word: Mapped[Word] = relationship("Word", foreign_keys=[word_id], back_populates="associated_translations")
     translation: Mapped[Word]= relationship("Word", foreign_keys=[translation_id], back_populates="associated_words")
+    __table_args__ = (
+        Index('ix_unique_word_translation', 'word_id', 'translation_id', unique=True),
+        Index('ix_word_translations_translation_id', 'translation_id'),
+    )
 
     def __repr__(self):
         return f"<WordTranslation: word:{self.word.text}, translation:{self.translation.text}, id={self.id}>"
@@ -147,6 +218,8 @@ class GameWord(Base):
             f"game_id:{self.game_id}, word_id:{self.word_id}>"
         )
 
+STAT_SCORE_EXPRESSION = "CAST(n_correct_answers AS DOUBLE PRECISION) / n_appearances"
+
 class Stat(Base):
     """
     Tracks user performance on individual words.
@@ -158,16 +231,30 @@ class Stat(Base):
         language (str): The language of the stats: it always corresponds to the language of the game updating the stat.
         n_appearances (int): Number of times the word appeared.
         n_correct_answers (int): Number of times the user answered correctly.
+        score (float): Ratio of correct answers over appearances, computed and stored by the database.
+        sample_key (float): Random position of the stat, drawn again at every answer, to sample stats uniformly.
         user (User): The associated user.
         word (Word): The associated word.
     """
     __tablename__ = "stats"
+    # hard/recap games sample the stats of a user in a language by probing random sample keys, and by score range
+    # with a keyset on (score, word_id) when the stats in the range are too few to be found that way
+    __table_args__ = (
+        Index('ix_stats_user_language_score_word', 'user_id', 'language', 'score', 'word_id'),
+        Index(
+            'ix_stats_user_language_sample_key', 'user_id', 'language', 'sample_key',
+            postgresql_include=['score', 'word_id']
+        ),
+        Index('ix_unique_user_word_stat', 'user_id', 'word_id', unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     word_id = Column(Integer, ForeignKey("words.id", ondelete="CASCADE"))
     language = Column(String, nullable=False)
     n_appearances = Column(Integer, nullable=False)
     n_correct_answers = Column(Integer, nullable=False)
+    score = Column(Float, Computed(STAT_SCORE_EXPRESSION, persisted=True))
+    sample_key = Column(Float, nullable=False, server_default=text('random()'))
     user: Mapped[User] = relationship("User")
     word: Mapped[Word] = relationship("Word")
 
@@ -177,49 +264,139 @@ class Stat(Base):
             f"n_appearances:{self.n_appearances}, n_correct_answers:{self.n_correct_answers}>"
         )
 
+class VocabularyManifest(Base):
+    """
+    Records which version of a vocabulary csv has been synced to the database.
+
+    Attributes:
+        id (int): Primary key.
+        language (str): The language of the csv (unique).
+        checksum (str): sha256 digest of the csv content last synced.
+        n_word_translations (int): Number of word translations loaded from the csv.
+        updated_at (datetime): Timestamp of the last sync.
+    """
+    __tablename__ = "vocabulary_manifests"
+    id = Column(Integer, primary_key=True, index=True, nullable=False)
+    language = Column(String, unique=True, nullable=False)
+    checksum = Column(String, nullable=False)
+    n_word_translations = Column(Integer, nullable=False)
+    updated_at = Column(postgresql.TIMESTAMP, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+    def __repr__(self):
+        return f"<VocabularyManifest: language:{self.language}, checksum={self.checksum}>"
+
+class VocabularyImportCheckpoint(Base):
+    """
+    Progress of a streaming vocabulary import, used to resume it after an interruption.
+
+    Attributes:
+        id (int): Primary key.
+        source (str): Unique identifier of the import (language and path of the csv).
+        language (str): The language of the imported words.
+        checksum (str): sha256 digest of the csv being imported.
+        n_rows_imported (int): Number of csv rows already flushed to the database.
+        is_completed (bool): Whether the whole csv has been imported.
+        updated_at (datetime): Timestamp of the last flushed chunk.
+    """
+    __tablename__ = "vocabulary_import_checkpoints"
+    id = Column(Integer, primary_key=True, index=True, nullable=False)
+    source = Column(String, unique=True, nullable=False)
+    language = Column(String, nullable=False)
+    checksum = Column(String, nullable=False)
+    n_rows_imported = Column(Integer, nullable=False, default=0, server_default=text('0'))
+    is_completed = Column(Boolean, nullable=False, default=False, server_default=text('false'))
+    updated_at = Column(postgresql.TIMESTAMP, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+    def __repr__(self):
+        return f"<VocabularyImportCheckpoint: source:{self.source}, n_rows_imported={self.n_rows_imported}>"
+
+
+# create_all only creates missing tables: indexes added to already existing tables are created here
+SCHEMA_UPGRADES = [
+    """
+    DO $$ BEGIN
+        IF to_regclass('ix_unique_word_translation') IS NULL THEN
+            DELETE FROM word_translations a USING word_translations b
+                WHERE a.word_id = b.word_id AND a.translation_id = b.translation_id AND a.id > b.id;
+            CREATE UNIQUE INDEX ix_unique_word_translation ON word_translations (word_id, translation_id);
+        END IF;
+    END $$
+    """,
+    f"""
+    ALTER TABLE stats ADD COLUMN IF NOT EXISTS score DOUBLE PRECISION
+        GENERATED ALWAYS AS ({STAT_SCORE_EXPRESSION}) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_stats_user_language_score_word ON stats (user_id, language, score, word_id)
+    """,
+    """
+    DROP INDEX IF EXISTS ix_stats_user_language_score
+    """,
+    """
+    ALTER TABLE stats ADD COLUMN IF NOT EXISTS sample_key DOUBLE PRECISION NOT NULL DEFAULT random()
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_stats_user_language_sample_key ON stats (user_id, language, sample_key)
+        INCLUDE (score, word_id)
+    """,
+    """
+    DO $$ BEGIN
+        IF to_regclass('ix_unique_user_word_stat') IS NULL THEN
+            UPDATE stats SET n_appearances = duplicates.n_appearances, n_correct_answers = duplicates.n_correct_answers
+                FROM (
+                    SELECT min(id) AS id, sum(n_appearances) AS n_appearances, sum(n_correct_answers) AS n_correct_answers
+                    FROM stats GROUP BY user_id, word_id HAVING count(*) > 1
+                ) AS duplicates
+                WHERE stats.id = duplicates.id;
+            DELETE FROM stats a USING stats b
+                WHERE a.user_id = b.user_id AND a.word_id = b.word_id AND a.id > b.id;
+            CREATE UNIQUE INDEX ix_unique_user_word_stat ON stats (user_id, word_id);
+        END IF;
+    END $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_word_translations_translation_id ON word_translations (translation_id)
+    """,
+    # pairs streamed before imports recorded their pairs can't be told apart from the csv ones: all the pairs
+    # of a language with imports are kept, as they were until then
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (
+            SELECT FROM information_schema.columns
+                WHERE table_name = 'word_translations' AND column_name = 'import_checkpoint_id'
+        ) THEN
+            ALTER TABLE word_translations ADD COLUMN import_checkpoint_id INTEGER
+                REFERENCES vocabulary_import_checkpoints (id) ON DELETE SET NULL;
+            UPDATE word_translations SET import_checkpoint_id = checkpoints.id
+                FROM words, (
+                    SELECT language, max(id) AS id FROM vocabulary_import_checkpoints GROUP BY language
+                ) AS checkpoints
+                WHERE words.id = word_translations.word_id AND checkpoints.language = words.language;
+        END IF;
+    END $$
+    """,
+]
+
+def create_db_schema():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
 
 def init_db():
     print("Initializing database...")
-    Base.metadata.create_all(bind=engine)
+    create_db_schema()
     import_csvs_to_db()
     print("Database is ready.")
 
-def import_csvs_to_db(db=SessionLocal()):
-        for language in SUPPORTED_LANGUAGES:
-            result = db.query(Word).filter(Word.language == language).limit(1).first()
-            if not result:
-                print(f"No words present in Word table for language {language}: importing words from csvs...")
-                csv_file = f"{os.path.dirname(os.path.abspath(__file__))}/csv/{language}.csv"
-                with open(csv_file, mode='r', encoding='utf-8') as file:
-                    csv_reader = csv.DictReader(file)
-                    for row in csv_reader:
-                        word_text = row['Word']
-                        word = db.query(Word).filter(Word.language == language).filter(Word.text == word_text).first()
-                        if word is None:
-                            word = Word(
-                                text=word_text,
-                                language=language
-                            )
-                            db.add(word)
-                        translation_text = row['Translation']
-                        translation = db.query(Word).filter(Word.language == USER_LANGUAGE).filter(Word.text == translation_text).first()
-                        if translation is None:
-                            translation = Word(
-                                text=translation_text,
-                                language=USER_LANGUAGE
-                            )
-                            db.add(translation)
-                        db.commit()
-                        db.refresh(word)
-                        db.refresh(translation)
-                        translation = WordTranslation(
-                            word_id=word.id,
-                            translation_id=translation.id,
-                            frequency=int(row['Frequency'])
-                        )
-                        db.add(translation)
-                        db.commit()
-                print(f"Data imported successfully for language: {language}!")
+def import_csvs_to_db(db: Session | None = None):
+    # imported here since the vocabulary loaders depend on the models defined above
+    from src.db.vocabulary import sync_vocabulary_csvs
+    if db is None:
+        with SessionLocal() as db:
+            sync_vocabulary_csvs(db)
+    else:
+        sync_vocabulary_csvs(db)
 
 if __name__=="__main__":
     init_db()
\ No newline at end of file
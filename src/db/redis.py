@@ -1,23 +1,198 @@
+import asyncio
 import redis
+import redis.asyncio
 import os
+import threading
+import time
+from typing import Dict, Protocol
+from weakref import WeakKeyDictionary
+from src.db.blocklist_filter import revoked_token_filter
+from src.metrics import REDIS_BLOCKLIST_LOOKUP_LATENCY, TOKEN_BLOCKLIST_FILTER_LOOKUPS, TimedBlockingConnectionPool
 
 ACCESS_TOKEN_JTI_EXPIRY = 700000 # ttl of access token in the redis db
+# every revoked jti is published here, so that the workers evict it from their verified token caches
+TOKEN_BLOCKLIST_CHANNEL = "token_blocklist"
+# every revoked jti is also appended here, for the workers to load and tail into their revoked token filters:
+# entries older than the jtis are trimmed away
+TOKEN_BLOCKLIST_STREAM = "token_blocklist_revocations"
+# username of every deleted, verified or updated user, so that the workers evict it from their principal caches
+USER_CHANGES_CHANNEL = "user_changes"
+LISTENER_RECONNECT_DELAY_SECONDS = 1.0
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
+# connections of the async pool of every worker: beyond, requests wait up to REDIS_POOL_TIMEOUT_SECONDS for one
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT_SECONDS = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", 1))
+# timeouts of the commands of the request handlers, so that an unresponsive redis fails requests instead of piling them up
+REDIS_SOCKET_TIMEOUT_SECONDS = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", 0.5))
+REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS", 1))
+# pooled connections idle for longer are pinged before being reused
+REDIS_HEALTH_CHECK_INTERVAL_SECONDS = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL_SECONDS", 30))
 
+# used by the background threads (invalidation listener, revoked token filter), which block on redis
 token_blacklist = redis.StrictRedis(
     host=REDIS_HOST,
     port=REDIS_PORT,
     db=0
 )
 
-def add_jti_to_blocklist(jti: str) -> None:    
-    token_blacklist.set(
+
+class AsyncRedisPool:
+    """
+    Async redis clients of the request handlers, sharing a bounded connection pool per event loop,
+    since asyncio connections cannot be used outside of the loop that opened them: in production every
+    worker runs a single loop, hence a single pool.
+
+    Attributes:
+        max_connections (int): Max number of connections of every pool.
+        timeout (float): How long a command waits for a connection once all are in use.
+    """
+    def __init__(self, max_connections: int = REDIS_MAX_CONNECTIONS, timeout: float = REDIS_POOL_TIMEOUT_SECONDS):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._clients: WeakKeyDictionary[asyncio.AbstractEventLoop, redis.asyncio.Redis] = WeakKeyDictionary()
+
+    def get_client(self) -> redis.asyncio.Redis:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            connection_pool = TimedBlockingConnectionPool(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=0,
+                max_connections=self.max_connections,
+                timeout=self.timeout,
+                socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL_SECONDS,
+            )
+            client = self._clients[loop] = redis.asyncio.StrictRedis.from_pool(connection_pool)
+        return client
+
+    async def close(self) -> None:
+        """
+        Close the pool of the running event loop.
+        """
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+async_redis_pool = AsyncRedisPool()
+
+
+async def add_jti_to_blocklist(jti: str) -> None:
+    pipeline = async_redis_pool.get_client().pipeline()
+    pipeline.set(
         name=jti,
         value="",
         ex=ACCESS_TOKEN_JTI_EXPIRY
     )
+    pipeline.publish(TOKEN_BLOCKLIST_CHANNEL, jti)
+    pipeline.xadd(
+        TOKEN_BLOCKLIST_STREAM,
+        {"jti": jti},
+        minid=int((time.time() - ACCESS_TOKEN_JTI_EXPIRY) * 1000),
+        approximate=True
+    )
+    await pipeline.execute()
+    revoked_token_filter.add(jti)
+
+async def token_in_blocklist(jti: str) -> bool:
+    is_filter_ready = revoked_token_filter.is_ready
+    if is_filter_ready and not revoked_token_filter.might_contain(jti):
+        TOKEN_BLOCKLIST_FILTER_LOOKUPS.labels("negative").inc()
+        return False
+    try:
+        with REDIS_BLOCKLIST_LOOKUP_LATENCY.time():
+            response = await async_redis_pool.get_client().get(jti)
+    except redis.RedisError:
+        if not is_filter_ready:
+            raise
+        # the jti may be revoked and cannot be confirmed: fail closed
+        print(f"Token blocklist unreachable, jti {jti} matching the revoked token filter is rejected")
+        TOKEN_BLOCKLIST_FILTER_LOOKUPS.labels("revoked").inc()
+        return True
+    if is_filter_ready:
+        TOKEN_BLOCKLIST_FILTER_LOOKUPS.labels("revoked" if response is not None else "false_positive").inc()
+    else:
+        TOKEN_BLOCKLIST_FILTER_LOOKUPS.labels("unavailable").inc()
+    return response is not None
+
+async def publish_user_change(username: str) -> None:
+    await async_redis_pool.get_client().publish(USER_CHANGES_CHANNEL, username)
+
+
+class InvalidatedCache(Protocol):
+    def enable(self) -> None:
+        """
+        Start serving from an empty cache: called once subscribed, since changes published before were missed.
+        """
+
+    def disable(self) -> None:
+        """
+        Stop serving from the cache: called when the subscription is lost.
+        """
+
+    def invalidate(self, key: str) -> None:
+        ...
+
+
+class InvalidationListener:
+    """
+    Thread subscribed to the invalidation channels of the per-process caches, evicting the keys published
+    on the channel of every cache. Caches are only enabled while the listener is subscribed.
+    """
+    def __init__(self):
+        self._caches: Dict[str, InvalidatedCache] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def register(self, channel: str, cache: InvalidatedCache) -> None:
+        self._caches[channel] = cache
+
+    def start(self, redis_client: redis.Redis) -> None:
+        if self._thread is not None or not self._caches:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, args=(redis_client,), name="cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for cache in self._caches.values():
+            cache.disable()
+
+    def _listen(self, redis_client: redis.Redis) -> None:
+        while not self._stop.is_set():
+            pubsub = redis_client.pubsub()
+            try:
+                pubsub.subscribe(*self._caches)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    channel = message["channel"]
+                    cache = self._caches.get(channel.decode() if isinstance(channel, bytes) else channel)
+                    if cache is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        cache.enable()
+                    elif message["type"] == "message":
+                        data = message["data"]
+                        cache.invalidate(data.decode() if isinstance(data, bytes) else data)
+            except redis.RedisError as exception:
+                print(f"Cache invalidation listener disconnected: {exception}")
+                for cache in self._caches.values():
+                    cache.disable()
+                self._stop.wait(LISTENER_RECONNECT_DELAY_SECONDS)
+            finally:
+                pubsub.close()
+
 
-def token_in_blocklist(jti: str) -> bool:
-    response = token_blacklist.get(jti)
-    return response is not None
\ No newline at end of file
+invalidation_listener = InvalidationListener()
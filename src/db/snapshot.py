@@ -0,0 +1,314 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.db.models import USER_LANGUAGE, VocabularyImportCheckpoint, VocabularyManifest, Word, WordTranslation
+from src.services.matching import AnswerMatchingPolicy, get_answer_matching_policy, get_normalized_spellings
+
+VOCABULARY_SNAPSHOT_PATH = os.getenv("VOCABULARY_SNAPSHOT_PATH")
+
+SNAPSHOT_MAGIC = b"VOCABSNP"
+SNAPSHOT_VERSION = 1
+# magic, version, length of the json table of contents that follows the header
+SNAPSHOT_HEADER = struct.Struct("<8sII")
+SECTION_ALIGNMENT = 8
+
+
+class SnapshotTexts:
+    """
+    Sorted texts of a snapshot section, decoded on access: searched by bisection without being copied.
+    """
+    def __init__(self, offsets: memoryview, texts: memoryview):
+        self.offsets = offsets
+        self.texts = texts
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self.texts[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def __contains__(self, text: str) -> bool:
+        index = bisect_left(self, text)
+        return index < len(self) and self[index] == text
+
+    def release(self):
+        self.offsets.release()
+        self.texts.release()
+
+
+class VocabularySnapshot:
+    """
+    Read-only, memory-mapped view of the whole vocabulary.
+
+    The file is made of a small json table of contents followed by flat sections:
+    - words: sorted word ids (int32), their language index (uint8) and the offsets (uint32)
+      of their utf-8 text inside a single string blob;
+    - for every language, its word translations as three parallel int32 arrays
+      (word id, translation id, frequency) sorted by frequency rank, and two int32 arrays of positions
+      in them sorted by word id and by translation id, to look up the translations of a word in both directions;
+    - for every language, the sorted normalized spellings of its words and of their translations, as offsets
+      into a string blob, to tell whether an answer is a known word.
+    Sections are exposed as memoryviews over the mapping, so the data is never copied
+    and workers mapping the same file share the same pages.
+    The table of contents also records the vocabulary manifests and the streaming import checkpoints
+    the snapshot was built from, to tell whether the database changed since.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, mode='rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, toc_length = SNAPSHOT_HEADER.unpack_from(buffer)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} vocabulary snapshot")
+        toc = json.loads(bytes(buffer[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + toc_length]))
+        self.languages: List[str] = toc["languages"]
+        self.checksums: Dict[str, str | None] = toc["checksums"]
+        # missing from the snapshots built before imports were recorded
+        self.import_checkpoints: Dict[str, List] = toc.get("import_checkpoints", {})
+        sections = toc["sections"]
+
+        def section(name: str, format: str) -> memoryview:
+            offset, length = sections[name]
+            return buffer[offset:offset + length].cast(format)
+
+        self._word_ids = section("word_ids", "i")
+        self._word_languages = section("word_languages", "B")
+        self._text_offsets = section("text_offsets", "I")
+        self._texts = section("texts", "B")
+        self._word_translations = {
+            language: (
+                section(f"{language}.word_ids", "i"),
+                section(f"{language}.translation_ids", "i"),
+                section(f"{language}.frequencies", "i"),
+            )
+            for language in toc["translated_languages"]
+        }
+        # missing from the snapshots built before answers were looked up in the snapshot
+        self._answer_indexes = {
+            language: (section(f"{language}.word_positions", "i"), section(f"{language}.translation_positions", "i"))
+            for language in toc["translated_languages"]
+            if f"{language}.word_positions" in sections
+        }
+        # normalized for the answer matching policy of the build: missing from the snapshots built before
+        self.known_words_normalization: Dict[str, bool] | None = toc.get("known_words_normalization")
+        self._known_words = {
+            language: {
+                answer_language: SnapshotTexts(
+                    section(f"{language}.{answer_language}.known_word_offsets", "I"),
+                    section(f"{language}.{answer_language}.known_words", "B"),
+                )
+                for answer_language in (language, USER_LANGUAGE)
+            }
+            for language in toc["translated_languages"]
+            if f"{language}.{language}.known_words" in sections
+        }
+
+    def __len__(self):
+        return len(self._word_ids)
+
+    def _find(self, word_id: int) -> int | None:
+        index = bisect_left(self._word_ids, word_id)
+        if index < len(self._word_ids) and self._word_ids[index] == word_id:
+            return index
+        return None
+
+    def get_word(self, word_id: int) -> Tuple[str, str] | None:
+        """
+        Return the (text, language) of a word, or None if the word is not in the snapshot.
+        """
+        index = self._find(word_id)
+        if index is None:
+            return None
+        text = bytes(self._texts[self._text_offsets[index]:self._text_offsets[index + 1]]).decode("utf-8")
+        return text, self.languages[self._word_languages[index]]
+
+    def get_word_translations(self, language: str) -> Tuple[memoryview, memoryview, memoryview]:
+        """
+        Return the word ids, translation ids and frequencies of a language, ordered by frequency rank.
+        """
+        return self._word_translations[language]
+
+    def get_answer_index(self, language: str) -> Tuple[memoryview, memoryview] | None:
+        """
+        Return the positions of the word translations of a language sorted by word id and by translation id.
+        """
+        return self._answer_indexes.get(language)
+
+    def get_known_words(self, language: str, policy: AnswerMatchingPolicy) -> Dict[str, SnapshotTexts] | None:
+        """
+        Return the normalized spellings of the words of a language and of their translations, by answer language,
+        or None if the snapshot does not have them normalized as the policy does.
+        """
+        if self.known_words_normalization != get_normalization(policy):
+            return None
+        return self._known_words.get(language)
+
+    def is_up_to_date(self, db: Session) -> bool:
+        """
+        Whether the snapshot was built from the vocabulary currently synced in the database.
+        """
+        checksums = dict(db.execute(select(VocabularyManifest.language, VocabularyManifest.checksum)).all())
+        return (
+            all(checksums.get(language) == checksum for language, checksum in self.checksums.items())
+            # streaming imports and synthetic loads add words without touching the manifests
+            and get_import_checkpoints(db) == self.import_checkpoints
+        )
+
+    def close(self):
+        # memoryviews must be released before the mapping can be closed
+        for view in (self._word_ids, self._word_languages, self._text_offsets, self._texts):
+            view.release()
+        for views in (*self._word_translations.values(), *self._answer_indexes.values()):
+            for view in views:
+                view.release()
+        for known_words in self._known_words.values():
+            for texts in known_words.values():
+                texts.release()
+        self._mmap.close()
+
+
+def build_snapshot(db: Session, path: str) -> int:
+    """
+    Compile the vocabulary stored in the database into a snapshot file.
+
+    The file is written next to the destination and then renamed over it, so workers that
+    already mapped a previous snapshot keep reading a consistent file.
+    Returns the number of words in the snapshot.
+    """
+    words = db.execute(select(Word.id, Word.language, Word.text).order_by(Word.id)).all()
+    languages = sorted({language for _, language, _ in words})
+    language_indexes = {language: index for index, language in enumerate(languages)}
+
+    word_ids = array("i")
+    word_languages = array("B")
+    text_offsets = array("I", [0])
+    texts = bytearray()
+    for word_id, language, text in words:
+        word_ids.append(word_id)
+        word_languages.append(language_indexes[language])
+        texts += text.encode("utf-8")
+        text_offsets.append(len(texts))
+
+    sections: Dict[str, bytes] = {
+        "word_ids": word_ids.tobytes(),
+        "word_languages": word_languages.tobytes(),
+        "text_offsets": text_offsets.tobytes(),
+        "texts": bytes(texts),
+    }
+    texts_by_id = {word_id: text for word_id, _, text in words}
+    policy = get_answer_matching_policy()
+    translated_languages = []
+    for language in languages:
+        rows = db.execute(
+            select(WordTranslation.word_id, WordTranslation.translation_id, WordTranslation.frequency)
+                .join(Word, Word.id == WordTranslation.word_id)
+                .where(Word.language == language)
+                .order_by(WordTranslation.frequency, WordTranslation.id)
+        ).all()
+        if not rows:
+            continue
+        translated_languages.append(language)
+        columns = list(zip(*rows))
+        for name, column in zip(("word_ids", "translation_ids", "frequencies"), columns):
+            sections[f"{language}.{name}"] = array("i", column).tobytes()
+        for name, column in zip(("word_positions", "translation_positions"), columns):
+            sections[f"{language}.{name}"] = get_sorted_positions(column).tobytes()
+        for answer_language, column in ((language, columns[0]), (USER_LANGUAGE, columns[1])):
+            known_word_offsets = array("I", [0])
+            known_words = bytearray()
+            for spelling in get_normalized_spellings(
+                (texts_by_id[word_id] for word_id in set(column)), answer_language, policy
+            ):
+                known_words += spelling.encode("utf-8")
+                known_word_offsets.append(len(known_words))
+            sections[f"{language}.{answer_language}.known_word_offsets"] = known_word_offsets.tobytes()
+            sections[f"{language}.{answer_language}.known_words"] = bytes(known_words)
+
+    toc = {
+        "languages": languages,
+        "translated_languages": translated_languages,
+        "checksums": dict(db.execute(select(VocabularyManifest.language, VocabularyManifest.checksum)).all()),
+        "import_checkpoints": get_import_checkpoints(db),
+        "known_words_normalization": get_normalization(policy),
+        "sections": {},
+    }
+    # section offsets depend on the toc length, which depends on the offsets: reserve room for them
+    toc_length = len(json.dumps(toc).encode("utf-8")) + sum(len(name) + 48 for name in sections)
+    offset = _align(SNAPSHOT_HEADER.size + toc_length)
+    for name, data in sections.items():
+        toc["sections"][name] = [offset, len(data)]
+        offset = _align(offset + len(data))
+    toc_bytes = json.dumps(toc).encode("utf-8").ljust(toc_length)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, mode='wb') as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, toc_length))
+        file.write(toc_bytes)
+        for name, data in sections.items():
+            file.seek(toc["sections"][name][0])
+            file.write(data)
+    os.replace(temporary_path, path)
+    print(f"Vocabulary snapshot with {len(word_ids)} words written to {path}.")
+    return len(word_ids)
+
+
+def get_sorted_positions(ids: Sequence[int]) -> array:
+    """
+    Return the positions of ids sorted by id, ties in position order.
+    """
+    return array("i", sorted(range(len(ids)), key=ids.__getitem__))
+
+
+def get_normalization(policy: AnswerMatchingPolicy) -> Dict[str, bool]:
+    return {"fold_characters": policy.fold_characters, "strip_articles": policy.strip_articles}
+
+
+def get_import_checkpoints(db: Session) -> Dict[str, List]:
+    """
+    Return the progress of every streaming import, as stored in the snapshot table of contents.
+    """
+    rows = db.execute(select(
+        VocabularyImportCheckpoint.source,
+        VocabularyImportCheckpoint.n_rows_imported,
+        VocabularyImportCheckpoint.updated_at
+    )).all()
+    return {source: [n_rows_imported, updated_at.isoformat()] for source, n_rows_imported, updated_at in rows}
+
+
+def _align(offset: int) -> int:
+    return -(-offset // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+_vocabulary_snapshot: VocabularySnapshot | None = None
+
+
+def load_vocabulary_snapshot(db: Session, path: str | None = VOCABULARY_SNAPSHOT_PATH) -> VocabularySnapshot | None:
+    """
+    Map the snapshot at path, if any, and make it available to the current process.
+
+    A snapshot built from an older vocabulary than the one in the database is ignored.
+    """
+    global _vocabulary_snapshot
+    if not path or not os.path.exists(path):
+        return None
+    snapshot = VocabularySnapshot(path)
+    if not snapshot.is_up_to_date(db):
+        print(f"Vocabulary snapshot {path} is outdated: ignoring it.")
+        snapshot.close()
+        return None
+    if _vocabulary_snapshot is not None:
+        _vocabulary_snapshot.close()
+    _vocabulary_snapshot = snapshot
+    print(f"Vocabulary snapshot {path} loaded ({len(snapshot)} words).")
+    return snapshot
+
+
+def get_vocabulary_snapshot() -> VocabularySnapshot | None:
+    return _vocabulary_snapshot
@@ -0,0 +1,329 @@
+import argparse
+import csv
+import io
+import itertools
+import math
+import random
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Set, Tuple
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from src.db.models import (
+    Base,
+    SessionLocal,
+    Game,
+    GameWord,
+    Stat,
+    User,
+    VocabularyImportCheckpoint,
+    Word,
+    WordTranslation,
+    create_db_schema,
+    SUPPORTED_LANGUAGES,
+    USER_LANGUAGE,
+)
+from src.services.auth import get_password_hash
+
+# password of every synthetic user, so that load tests can log in as any of them
+SYNTHETIC_USER_PASSWORD = "Synth3t1cUs3r"
+COPY_CHUNK_SIZE = 100000
+SYLLABLES: Dict[str, List[str]] = {
+    "english": ["an", "ber", "cal", "den", "er", "fol", "gar", "hin", "ing", "ton", "lo", "ment", "nor", "ous", "per", "ran", "sle", "ter", "un", "ver", "wa", "ly", "ex", "ble"],
+    "german": ["ab", "ber", "ch", "der", "ein", "fe", "ge", "hal", "ich", "ke", "lich", "mer", "nach", "ung", "rei", "sch", "ten", "ver", "wa", "zu", "ei", "au", "ü", "ö", "ä", "ß", "stein", "en"],
+    "italian": ["a", "bel", "ca", "di", "e", "fio", "gio", "la", "men", "no", "o", "pa", "ri", "sta", "to", "u", "ve", "zio", "re", "mo", "chi", "gna", "glio", "ne"],
+}
+
+
+class SyntheticDatasetConfig:
+    """
+    Shape of a synthetic dataset.
+
+    Attributes:
+        n_users (int): Number of users.
+        vocabulary_size (int): Number of words of every foreign language.
+        languages (Sequence[str]): Foreign languages of the vocabularies, games and stats.
+        mean_stats_per_user (int): Average number of stats of a user: the actual number follows a
+            Pareto distribution, so that a few power users hold most of the stats.
+        max_stats_per_user (int): Cap on the stats of a single user.
+        mean_games_per_user (int): Average number of games of a user, Pareto distributed as well.
+        max_active_games_per_user (int): Cap on the new and in progress games of a user: below the
+            limit of opened games, so that synthetic users can still open games.
+        zipf_exponent (float): Exponent of the Zipf distribution of word usage: word of rank r is
+            picked with probability proportional to 1 / r ** zipf_exponent.
+        seed (int): Seed of the generator, for reproducible datasets.
+    """
+    def __init__(
+        self,
+        n_users: int = 1000,
+        vocabulary_size: int = 20000,
+        languages: Sequence[str] = tuple(SUPPORTED_LANGUAGES),
+        mean_stats_per_user: int = 300,
+        max_stats_per_user: int = 10000,
+        mean_games_per_user: int = 20,
+        max_active_games_per_user: int = 5,
+        zipf_exponent: float = 1.0,
+        seed: int = 0
+    ):
+        self.n_users = n_users
+        self.vocabulary_size = vocabulary_size
+        self.languages = list(languages)
+        self.mean_stats_per_user = mean_stats_per_user
+        self.max_stats_per_user = max_stats_per_user
+        self.mean_games_per_user = mean_games_per_user
+        self.max_active_games_per_user = max_active_games_per_user
+        self.zipf_exponent = zipf_exponent
+        self.seed = seed
+
+
+class ZipfSampler:
+    """
+    Sample ranks in [0, n) with Zipf probabilities, in O(log n) per sample.
+    """
+    def __init__(self, n: int, exponent: float, rng: random.Random):
+        self.rng = rng
+        self.cumulative_weights = list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+
+    def sample(self, limit: int | None = None) -> int:
+        """
+        Return a rank, restricted to the limit most frequent ones if given.
+        """
+        n = len(self.cumulative_weights) if limit is None else min(limit, len(self.cumulative_weights))
+        return bisect_left(self.cumulative_weights, self.rng.random() * self.cumulative_weights[n - 1], hi=n - 1)
+
+    def sample_unique(self, k: int, limit: int | None = None) -> List[int]:
+        n = len(self.cumulative_weights) if limit is None else min(limit, len(self.cumulative_weights))
+        k = min(k, n)
+        ranks: Dict[int, None] = {}
+        # rejection gets slow once most of the ranks are taken: fill up the tail uniformly
+        for _ in range(4 * k):
+            if len(ranks) == k:
+                break
+            ranks.setdefault(self.sample(n))
+        if len(ranks) < k:
+            ranks.update(dict.fromkeys(self.rng.sample([rank for rank in range(n) if rank not in ranks], k - len(ranks))))
+        return list(ranks)
+
+
+class CopyBuffer:
+    """
+    Rows waiting to be bulk-loaded with COPY, flushed by table in foreign key order.
+    """
+    def __init__(self, db: Session, tables: Sequence[Tuple[str, Sequence[str]]], chunk_size: int = COPY_CHUNK_SIZE):
+        self.db = db
+        self.tables = tables
+        self.chunk_size = chunk_size
+        self.rows: Dict[str, List[tuple]] = {table: [] for table, _ in tables}
+        self.n_rows: Dict[str, int] = {table: 0 for table, _ in tables}
+
+    def add(self, table: str, row: tuple) -> None:
+        self.rows[table].append(row)
+        if len(self.rows[table]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        cursor = self.db.connection().connection.cursor()
+        for table, columns in self.tables:
+            if not self.rows[table]:
+                continue
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(self.rows[table])
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            self.n_rows[table] += len(self.rows[table])
+            self.rows[table].clear()
+
+
+def generate_word_texts(rng: random.Random, language: str, n: int, length_sampler: ZipfSampler) -> List[str]:
+    """
+    Return n distinct pseudo-words made of the syllables of the language:
+    like in natural languages, frequent words are shorter.
+    """
+    syllables = SYLLABLES[language]
+    texts: Dict[str, None] = {}
+    while len(texts) < n:
+        rank = len(texts)
+        n_syllables = 1 + int(math.log2(2 + rank) / 3) + length_sampler.sample(3)
+        texts.setdefault("".join(rng.choice(syllables) for _ in range(n_syllables)))
+    return list(texts)
+
+
+def sample_pareto_count(rng: random.Random, mean: int, maximum: int) -> int:
+    # pareto with alpha 1.5 has mean 3
+    return max(1, min(maximum, round(mean * rng.paretovariate(1.5) / 3)))
+
+
+def sample_binomial(rng: random.Random, n: int, p: float) -> int:
+    return sum(rng.random() < p for _ in range(n))
+
+
+def get_next_id(db: Session, model: type[Base]) -> int:
+    return (db.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def generate_synthetic_dataset(db: Session, config: SyntheticDatasetConfig) -> Dict[str, int]:
+    """
+    Bulk-load a production-shaped dataset: users, Zipf-distributed vocabularies, games in all states
+    (new, in progress, finished) and skewed stat histories.
+
+    The vocabulary tables must be empty, so that the generated words cannot collide with existing ones.
+    Returns the number of rows loaded in every table.
+    """
+    if db.execute(select(func.count(Word.id))).scalar():
+        raise ValueError("The synthetic dataset must be generated in a database without words.")
+    start = time.perf_counter()
+    rng = random.Random(config.seed)
+    buffer = CopyBuffer(db, [
+        (User.__tablename__, ["id", "username", "email", "hashed_password", "created_at", "updated_at", "is_verified"]),
+        (Word.__tablename__, ["id", "text", "language"]),
+        (WordTranslation.__tablename__, ["word_id", "translation_id", "frequency", "import_checkpoint_id"]),
+        (Game.__tablename__, ["id", "user_id", "is_active", "language", "n_words_to_guess", "n_correct_answers", "n_vocabulary"]),
+        (GameWord.__tablename__, ["game_id", "word_id"]),
+        (Stat.__tablename__, ["user_id", "word_id", "language", "n_appearances", "n_correct_answers"]),
+    ])
+    length_sampler = ZipfSampler(3, 1.5, rng)
+    word_sampler = ZipfSampler(config.vocabulary_size, config.zipf_exponent, rng)
+    next_word_id = get_next_id(db, Word)
+
+    # user language words are shared by all the vocabularies: translations of frequent words are frequent
+    user_language_word_ids = list(range(next_word_id, next_word_id + config.vocabulary_size))
+    for word_id, word_text in zip(
+        user_language_word_ids,
+        generate_word_texts(rng, USER_LANGUAGE, config.vocabulary_size, length_sampler)
+    ):
+        buffer.add(Word.__tablename__, (word_id, word_text, USER_LANGUAGE))
+    next_word_id += config.vocabulary_size
+
+    # for every language, (word id, translation ids) by frequency rank
+    vocabularies: Dict[str, List[Tuple[int, List[int]]]] = {}
+    for language in config.languages:
+        # the pairs are owned by a completed import, so that the csv sync does not retire the synthetic vocabulary
+        checkpoint = VocabularyImportCheckpoint(
+            source=f"synthetic:{language}",
+            language=language,
+            checksum=f"seed:{config.seed}",
+            n_rows_imported=config.vocabulary_size,
+            is_completed=True
+        )
+        db.add(checkpoint)
+        db.flush()
+        vocabulary = []
+        for rank, word_text in enumerate(generate_word_texts(rng, language, config.vocabulary_size, length_sampler)):
+            translation_ids = {user_language_word_ids[rank]}
+            for _ in range(sample_binomial(rng, 2, 0.3)):
+                translation_ids.add(user_language_word_ids[word_sampler.sample()])
+            buffer.add(Word.__tablename__, (next_word_id, word_text, language))
+            for translation_id in translation_ids:
+                buffer.add(WordTranslation.__tablename__, (next_word_id, translation_id, rank + 1, checkpoint.id))
+            vocabulary.append((next_word_id, list(translation_ids)))
+            next_word_id += 1
+        vocabularies[language] = vocabulary
+
+    hashed_password = get_password_hash(SYNTHETIC_USER_PASSWORD)
+    next_user_id = get_next_id(db, User)
+    next_game_id = get_next_id(db, Game)
+    now = datetime.now()
+    for user_id in range(next_user_id, next_user_id + config.n_users):
+        created_at = now - timedelta(days=rng.randint(0, 730))
+        buffer.add(User.__tablename__, (
+            user_id, f"synthetic_user_{user_id}", f"synthetic_user_{user_id}@synthetic.org",
+            hashed_password, created_at, created_at, rng.random() < 0.9
+        ))
+        # the better a user, the more often right; rarer words are harder
+        skill = rng.betavariate(5, 3)
+        user_languages = rng.sample(config.languages, rng.randint(1, len(config.languages)))
+
+        def get_success_probability(rank: int) -> float:
+            return skill * (1 - 0.5 * rank / config.vocabulary_size)
+
+        stat_word_ids: Set[int] = set()
+        for _ in range(sample_pareto_count(rng, config.mean_stats_per_user, config.max_stats_per_user)):
+            language = rng.choice(user_languages)
+            rank = word_sampler.sample()
+            word_id, translation_ids = vocabularies[language][rank]
+            word_id = word_id if rng.random() < 0.5 else rng.choice(translation_ids)
+            if word_id in stat_word_ids:
+                continue
+            stat_word_ids.add(word_id)
+            n_appearances = 1 + min(99, int(math.log(1 - rng.random()) / math.log(0.7)))
+            buffer.add(Stat.__tablename__, (
+                user_id, word_id, language, n_appearances,
+                sample_binomial(rng, n_appearances, get_success_probability(rank))
+            ))
+
+        n_active_games = 0
+        for _ in range(sample_pareto_count(rng, config.mean_games_per_user, 50 * config.mean_games_per_user)):
+            language = rng.choice(user_languages)
+            n_vocabulary = rng.choice([100, 500, 1000, 5000, config.vocabulary_size])
+            ranks = word_sampler.sample_unique(rng.choice([10, 20, 30, 50]), n_vocabulary)
+            word_ids = list(dict.fromkeys(
+                word_id if rng.random() < 0.5 else rng.choice(translation_ids)
+                for word_id, translation_ids in (vocabularies[language][rank] for rank in ranks)
+            ))
+            state = rng.choices(["finished", "in_progress", "new"], weights=[70, 20, 10])[0]
+            if state != "finished":
+                if n_active_games == config.max_active_games_per_user:
+                    state = "finished"
+                else:
+                    n_active_games += 1
+            if state == "finished":
+                n_remaining_words = 0
+            elif state == "in_progress":
+                n_remaining_words = rng.randint(1, len(word_ids) - 1) if len(word_ids) > 1 else 1
+            else:
+                n_remaining_words = len(word_ids)
+            n_correct_answers = sample_binomial(rng, len(word_ids) - n_remaining_words, skill)
+            buffer.add(Game.__tablename__, (
+                next_game_id, user_id, state != "finished", language,
+                len(word_ids), n_correct_answers, n_vocabulary
+            ))
+            for word_id in word_ids[:n_remaining_words]:
+                buffer.add(GameWord.__tablename__, (next_game_id, word_id))
+            next_game_id += 1
+    buffer.flush()
+
+    # rows were loaded with explicit ids: move the sequences past them
+    for model in (User, Word, Game):
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+            f"(SELECT coalesce(max(id), 1) FROM {model.__tablename__}))"
+        ))
+    db.execute(text(f"ANALYZE {', '.join(table for table, _ in buffer.tables)}"))
+    db.commit()
+    elapsed = time.perf_counter() - start
+    n_rows = sum(buffer.n_rows.values())
+    print(
+        f"Synthetic dataset generated in {elapsed:.2f}s ({n_rows / max(elapsed, 1e-9):.0f} rows/s): "
+        + ", ".join(f"{n} {table}" for table, n in buffer.n_rows.items())
+    )
+    return buffer.n_rows
+
+
+if __name__ == "__main__":
+    defaults = SyntheticDatasetConfig()
+    parser = argparse.ArgumentParser(description="Load a synthetic, production-shaped dataset into the database.")
+    parser.add_argument("--users", type=int, default=defaults.n_users)
+    parser.add_argument("--vocabulary-size", type=int, default=defaults.vocabulary_size, help="words per language")
+    parser.add_argument("--languages", nargs="+", choices=SUPPORTED_LANGUAGES, default=defaults.languages)
+    parser.add_argument("--mean-stats-per-user", type=int, default=defaults.mean_stats_per_user)
+    parser.add_argument("--max-stats-per-user", type=int, default=defaults.max_stats_per_user)
+    parser.add_argument("--mean-games-per-user", type=int, default=defaults.mean_games_per_user)
+    parser.add_argument("--max-active-games-per-user", type=int, default=defaults.max_active_games_per_user)
+    parser.add_argument("--zipf-exponent", type=float, default=defaults.zipf_exponent)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    create_db_schema()
+    with SessionLocal() as db:
+        generate_synthetic_dataset(db, SyntheticDatasetConfig(
+            n_users=args.users,
+            vocabulary_size=args.vocabulary_size,
+            languages=args.languages,
+            mean_stats_per_user=args.mean_stats_per_user,
+            max_stats_per_user=args.max_stats_per_user,
+            mean_games_per_user=args.mean_games_per_user,
+            max_active_games_per_user=args.max_active_games_per_user,
+            zipf_exponent=args.zipf_exponent,
+            seed=args.seed,
+        ))
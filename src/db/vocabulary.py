@@ -0,0 +1,482 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import multiprocessing
+import os
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple
+from sqlalchemy import BindParameter, Integer, String, any_, create_engine, delete, func, literal, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased, sessionmaker
+from src.db.models import (
+    SessionLocal,
+    VocabularyImportCheckpoint,
+    VocabularyManifest,
+    Word,
+    WordTranslation,
+    create_db_schema,
+    SUPPORTED_LANGUAGES,
+    USER_LANGUAGE
+)
+from src.db.snapshot import VOCABULARY_SNAPSHOT_PATH, build_snapshot
+
+CSV_DIRECTORY = f"{os.path.dirname(os.path.abspath(__file__))}/csv"
+BATCH_SIZE = 20000 # max number of rows written or matched by a single statement
+CHECKSUM_CHUNK_SIZE = 1 << 20
+STREAM_CHUNK_SIZE = 10000 # csv rows flushed per transaction by the streaming import
+WORD_ID_CACHE_SIZE = 200000 # max number of word ids kept in memory by the streaming import
+
+# (frequency, word text, translation text), as read from a vocabulary csv
+VocabularyRow = Tuple[int, str, str]
+
+# session factory of a parallel sync worker process, see _init_sync_worker
+_worker_session_factory: sessionmaker | None = None
+
+
+def array_parameter(values: Iterable, item_type) -> BindParameter:
+    """
+    Bind a whole column of values as a single postgres array parameter.
+
+    Used with unnest() / ANY() it lets a batch of rows be written or matched by one statement
+    without compiling a placeholder per value.
+    """
+    return literal(list(values), postgresql.ARRAY(item_type))
+
+
+def get_csv_file_for_language(language: str) -> str:
+    return f"{CSV_DIRECTORY}/{language}.csv"
+
+
+def read_vocabulary_csv(csv_file: str) -> List[VocabularyRow]:
+    with open(csv_file, mode='r', encoding='utf-8') as file:
+        csv_reader = csv.DictReader(file)
+        return [
+            (int(row['Frequency']), row['Word'], row['Translation'])
+            for row in csv_reader
+        ]
+
+
+def dedupe_vocabulary_rows(rows: Iterable[VocabularyRow]) -> Dict[Tuple[str, str], int]:
+    """
+    Collapse csv rows into unique (word, translation) pairs.
+
+    When the same pair appears more than once, the lowest (most frequent) rank is kept.
+    """
+    pairs: Dict[Tuple[str, str], int] = {}
+    for frequency, word_text, translation_text in rows:
+        key = (word_text, translation_text)
+        if key not in pairs or frequency < pairs[key]:
+            pairs[key] = frequency
+    return pairs
+
+
+class WordIdCache:
+    """
+    Bounded LRU map of (language, text) -> word id, used to avoid looking up the same words over and over
+    while keeping memory flat during streaming imports.
+    """
+    def __init__(self, max_size: int = WORD_ID_CACHE_SIZE):
+        self.max_size = max_size
+        self._word_ids: OrderedDict[Tuple[str, str], int] = OrderedDict()
+
+    def get(self, language: str, text: str) -> int | None:
+        word_id = self._word_ids.get((language, text))
+        if word_id is not None:
+            self._word_ids.move_to_end((language, text))
+        return word_id
+
+    def put(self, language: str, text: str, word_id: int) -> None:
+        self._word_ids[(language, text)] = word_id
+        self._word_ids.move_to_end((language, text))
+        if len(self._word_ids) > self.max_size:
+            self._word_ids.popitem(last=False)
+
+    def __len__(self):
+        return len(self._word_ids)
+
+
+def insert_words(
+    db: Session,
+    language: str,
+    texts: Iterable[str],
+    word_id_cache: WordIdCache | None = None
+) -> Dict[str, int]:
+    """
+    Insert the words missing for a language and return the ids of all the given texts.
+
+    Texts are inserted sorted so that concurrent imports always lock index entries in the same order.
+    When a cache is given, only the texts it does not know are sent to the database.
+    """
+    texts = sorted(set(texts))
+    word_ids: Dict[str, int] = {}
+    if word_id_cache is not None:
+        for text in texts:
+            word_id = word_id_cache.get(language, text)
+            if word_id is not None:
+                word_ids[text] = word_id
+        texts = [text for text in texts if text not in word_ids]
+    if not texts:
+        return word_ids
+    for start in range(0, len(texts), BATCH_SIZE):
+        batch = array_parameter(texts[start:start + BATCH_SIZE], String)
+        db.execute(
+            insert(Word)
+                .from_select([Word.language, Word.text], select(literal(language), func.unnest(batch)))
+                .on_conflict_do_nothing(index_elements=[Word.language, Word.text])
+        )
+        for text, word_id in db.execute(
+            select(Word.text, Word.id)
+                .where(Word.language == language)
+                .where(Word.text == any_(batch))
+        ).all():
+            word_ids[text] = word_id
+            if word_id_cache is not None:
+                word_id_cache.put(language, text, word_id)
+    return word_ids
+
+
+def insert_word_translations(
+    db: Session,
+    language: str,
+    pairs: Dict[Tuple[str, str], int],
+    word_id_cache: WordIdCache | None = None,
+    import_checkpoint_id: int | None = None
+) -> int:
+    """
+    Load (word, translation) -> frequency pairs of a language with a few set-based statements.
+
+    Missing words are created on the fly; pairs already present are skipped. When loaded by a streaming
+    import, the pairs, including those already present, are recorded as its own so that syncs keep them.
+    The caller is in charge of committing. Returns the number of pairs processed.
+    """
+    if not pairs:
+        return 0
+    word_ids = insert_words(db, language, (word_text for word_text, _ in pairs), word_id_cache)
+    translation_ids = insert_words(db, USER_LANGUAGE, (translation_text for _, translation_text in pairs), word_id_cache)
+    word_translations = [
+        (word_ids[word_text], translation_ids[translation_text], frequency)
+        for (word_text, translation_text), frequency in pairs.items()
+    ]
+    for start in range(0, len(word_translations), BATCH_SIZE):
+        word_id_column, translation_id_column, frequency_column = zip(*word_translations[start:start + BATCH_SIZE])
+        word_translations_insert = insert(WordTranslation).from_select(
+            [
+                WordTranslation.word_id,
+                WordTranslation.translation_id,
+                WordTranslation.frequency,
+                WordTranslation.import_checkpoint_id
+            ],
+            select(
+                func.unnest(array_parameter(word_id_column, Integer)),
+                func.unnest(array_parameter(translation_id_column, Integer)),
+                func.unnest(array_parameter(frequency_column, Integer)),
+                literal(import_checkpoint_id, Integer),
+            )
+        )
+        index_elements = [WordTranslation.word_id, WordTranslation.translation_id]
+        if import_checkpoint_id is None:
+            db.execute(word_translations_insert.on_conflict_do_nothing(index_elements=index_elements))
+        else:
+            db.execute(
+                word_translations_insert.on_conflict_do_update(
+                    index_elements=index_elements,
+                    set_={WordTranslation.import_checkpoint_id: word_translations_insert.excluded.import_checkpoint_id},
+                    where=WordTranslation.import_checkpoint_id.is_(None)
+                )
+            )
+    return len(pairs)
+
+
+def compute_file_checksum(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, mode='rb') as file:
+        for chunk in iter(lambda: file.read(CHECKSUM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_current_word_translations(db: Session, language: str) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """
+    Return the word translations stored for a language as (word, translation) -> (id, frequency).
+    """
+    SourceWord = aliased(Word)
+    TranslationWord = aliased(Word)
+    rows = db.execute(
+        select(WordTranslation.id, SourceWord.text, TranslationWord.text, WordTranslation.frequency)
+            .join(SourceWord, SourceWord.id == WordTranslation.word_id)
+            .join(TranslationWord, TranslationWord.id == WordTranslation.translation_id)
+            .where(SourceWord.language == language)
+            .where(TranslationWord.language == USER_LANGUAGE)
+    ).all()
+    return {
+        (word_text, translation_text): (word_translation_id, frequency)
+        for word_translation_id, word_text, translation_text, frequency in rows
+    }
+
+
+def get_manifest(db: Session, language: str) -> VocabularyManifest | None:
+    return db.query(VocabularyManifest).filter(VocabularyManifest.language == language).first()
+
+
+def get_manifest_checksum(db: Session, language: str) -> str | None:
+    manifest = get_manifest(db, language)
+    return manifest.checksum if manifest is not None else None
+
+
+def get_sync_lock_key(language: str) -> int:
+    return zlib.crc32(f"vocabulary-sync:{language}".encode())
+
+
+def sync_language(db: Session, language: str, csv_file: str | None = None, force: bool = False) -> bool:
+    """
+    Bring the word translations of a language in line with its csv.
+
+    The csv checksum is compared with the one stored in the manifest: if it did not change
+    nothing is done, otherwise only the differences are applied in a single transaction:
+    - new (word, translation) pairs are inserted;
+    - pairs whose frequency changed are updated in place;
+    - pairs no longer in the csv are retired, i.e. their WordTranslation row is deleted.
+      Word rows are kept so that games and stats referencing them are not affected.
+      Pairs loaded by stream_import_csv are kept as long as their import checkpoint exists.
+    Only the changed rows are locked, so the tables stay available while syncing.
+
+    Returns True if the language has been synced, False if it was already up to date.
+    """
+    csv_file = csv_file or get_csv_file_for_language(language)
+    checksum = compute_file_checksum(csv_file)
+    # concurrent syncs of the same language (e.g. app workers starting together) are serialized:
+    # the lock is released at commit, after which the others find the manifest up to date
+    db.execute(select(func.pg_advisory_xact_lock(get_sync_lock_key(language))))
+    manifest = get_manifest(db, language)
+    if manifest is not None and manifest.checksum == checksum and not force:
+        db.commit()
+        return False
+
+    start = time.perf_counter()
+    rows = read_vocabulary_csv(csv_file)
+    pairs = dedupe_vocabulary_rows(rows)
+    current_pairs = get_current_word_translations(db, language)
+
+    pairs_to_insert = {
+        pair: frequency for pair, frequency in pairs.items() if pair not in current_pairs
+    }
+    pairs_to_update = [
+        {"id": current_pairs[pair][0], "frequency": frequency}
+        for pair, frequency in pairs.items()
+        if pair in current_pairs and current_pairs[pair][1] != frequency
+    ]
+    # pairs loaded by streaming imports, completed or in progress, are not in the csv: never retire them
+    imported_ids = set(db.execute(
+        select(WordTranslation.id)
+            .join(Word, Word.id == WordTranslation.word_id)
+            .where(Word.language == language)
+            .where(WordTranslation.import_checkpoint_id.is_not(None))
+    ).scalars())
+    ids_to_retire = [
+        word_translation_id
+        for pair, (word_translation_id, _) in current_pairs.items()
+        if pair not in pairs and word_translation_id not in imported_ids
+    ]
+
+    insert_word_translations(db, language, pairs_to_insert)
+    if pairs_to_update:
+        db.execute(update(WordTranslation), pairs_to_update)
+    for start_index in range(0, len(ids_to_retire), BATCH_SIZE):
+        db.execute(
+            delete(WordTranslation)
+                .where(WordTranslation.id == any_(array_parameter(ids_to_retire[start_index:start_index + BATCH_SIZE], Integer)))
+        )
+
+    if manifest is None:
+        manifest = VocabularyManifest(language=language)
+        db.add(manifest)
+    manifest.checksum = checksum
+    manifest.n_word_translations = len(pairs)
+    # always bumped, even when the checksum is unchanged (forced sync): in-process vocabulary indexes rely on it
+    manifest.updated_at = datetime.now()
+    db.commit()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Synced {len(rows)} rows for language {language} in {elapsed:.2f}s "
+        f"({len(rows) / max(elapsed, 1e-9):.0f} rows/s): {len(pairs_to_insert)} inserted, "
+        f"{len(pairs_to_update)} updated, {len(ids_to_retire)} retired."
+    )
+    return True
+
+
+def iter_vocabulary_csv(csv_file: str, start_row: int = 0) -> Iterator[VocabularyRow]:
+    with open(csv_file, mode='r', encoding='utf-8') as file:
+        csv_reader = csv.DictReader(file)
+        for row in itertools.islice(csv_reader, start_row, None):
+            yield int(row['Frequency']), row['Word'], row['Translation']
+
+
+def stream_import_csv(
+    db: Session,
+    language: str,
+    csv_file: str,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    word_id_cache_size: int = WORD_ID_CACHE_SIZE,
+    restart: bool = False
+) -> int:
+    """
+    Import a (possibly huge) vocabulary csv chunk by chunk, with bounded memory.
+
+    Each chunk is flushed in its own transaction together with the checkpoint row recording how many
+    csv rows have been imported so far: an interrupted import resumes right after the last flushed chunk.
+    Pairs already present are not updated, so the first (most frequent) occurrence of a pair wins,
+    but they are recorded as owned by the import, so that sync_language does not retire them.
+    Unlike sync_language, nothing is ever retired.
+
+    Returns the number of csv rows imported by this call.
+    """
+    source = f"{language}:{os.path.abspath(csv_file)}"
+    checksum = compute_file_checksum(csv_file)
+    checkpoint = db.query(VocabularyImportCheckpoint).filter(VocabularyImportCheckpoint.source == source).first()
+    if checkpoint is None:
+        checkpoint = VocabularyImportCheckpoint(source=source, language=language)
+        db.add(checkpoint)
+    if checkpoint.checksum != checksum or restart:
+        checkpoint.checksum = checksum
+        checkpoint.n_rows_imported = 0
+        checkpoint.is_completed = False
+    elif checkpoint.is_completed:
+        print(f"Import of {source} already completed.")
+        return 0
+    else:
+        print(f"Resuming import of {source} from row {checkpoint.n_rows_imported}.")
+    db.commit()
+
+    start = time.perf_counter()
+    start_row = checkpoint.n_rows_imported
+    word_id_cache = WordIdCache(word_id_cache_size)
+    rows = iter_vocabulary_csv(csv_file, start_row)
+    n_rows_imported = 0
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        insert_word_translations(db, language, dedupe_vocabulary_rows(chunk), word_id_cache, checkpoint.id)
+        n_rows_imported += len(chunk)
+        checkpoint.n_rows_imported = start_row + n_rows_imported
+        db.commit()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{language}: {checkpoint.n_rows_imported} rows imported "
+            f"({n_rows_imported / max(elapsed, 1e-9):.0f} rows/s)"
+        )
+    checkpoint.is_completed = True
+    db.commit()
+    return n_rows_imported
+
+
+def sync_vocabulary_csvs(db: Session, force: bool = False) -> None:
+    for language in SUPPORTED_LANGUAGES:
+        if sync_language(db, language, force=force):
+            print(f"Vocabulary synced successfully for language: {language}!")
+        else:
+            print(f"Vocabulary for language {language} is up to date.")
+
+
+def _init_sync_worker(database_url: str) -> None:
+    global _worker_session_factory
+    # pooled connections can't be shared across processes: every worker opens its own engine
+    _worker_session_factory = sessionmaker(bind=create_engine(database_url))
+
+
+def _sync_language_in_worker(language: str, force: bool) -> bool:
+    with _worker_session_factory() as db:
+        return sync_language(db, language, force=force)
+
+
+def parallel_sync_vocabulary_csvs(
+    db: Session,
+    languages: List[str] = SUPPORTED_LANGUAGES,
+    n_workers: int | None = None,
+    force: bool = False
+) -> None:
+    """
+    Sync several languages at once, one language per worker process.
+
+    The user language words are shared by all the languages: they are inserted once here before
+    fanning out, so workers only ever find them already committed and never race on the same keys.
+    """
+    start = time.perf_counter()
+    languages_to_sync = [
+        language for language in languages
+        if force or get_manifest_checksum(db, language) != compute_file_checksum(get_csv_file_for_language(language))
+    ]
+    for language in languages:
+        if language not in languages_to_sync:
+            print(f"Vocabulary for language {language} is up to date.")
+    if not languages_to_sync:
+        return
+
+    translation_texts = {
+        translation_text
+        for language in languages_to_sync
+        for _, _, translation_text in iter_vocabulary_csv(get_csv_file_for_language(language))
+    }
+    insert_words(db, USER_LANGUAGE, translation_texts)
+    db.commit()
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(languages_to_sync))
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_sync_worker,
+        # workers sync the database of the given session, not necessarily the one of the app
+        initargs=(db.get_bind().url.render_as_string(hide_password=False),)
+    ) as executor:
+        futures = {
+            executor.submit(_sync_language_in_worker, language, force): language
+            for language in languages_to_sync
+        }
+        for future in as_completed(futures):
+            future.result()
+            print(f"Vocabulary synced successfully for language: {futures[future]}!")
+    elapsed = time.perf_counter() - start
+    print(f"Synced {len(languages_to_sync)} languages with {n_workers} workers in {elapsed:.2f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the vocabulary stored in the database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser("sync", help="apply the changes of the vocabulary csvs to the database")
+    sync_parser.add_argument("--language", choices=SUPPORTED_LANGUAGES, help="sync this language only")
+    sync_parser.add_argument("--force", action="store_true", help="diff the csv even if its checksum did not change")
+    sync_parser.add_argument("--workers", type=int, default=1, help="sync languages in parallel with this many processes")
+    stream_parser = subparsers.add_parser("import-stream", help="import a large frequency csv in resumable chunks")
+    stream_parser.add_argument("--language", choices=SUPPORTED_LANGUAGES, required=True)
+    stream_parser.add_argument("--file", required=True, help="csv with Frequency, Word and Translation columns")
+    stream_parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    stream_parser.add_argument("--word-id-cache-size", type=int, default=WORD_ID_CACHE_SIZE)
+    stream_parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    snapshot_parser = subparsers.add_parser("build-snapshot", help="compile the vocabulary into a memory-mappable file")
+    snapshot_parser.add_argument("--output", default=VOCABULARY_SNAPSHOT_PATH, required=VOCABULARY_SNAPSHOT_PATH is None)
+    args = parser.parse_args()
+
+    create_db_schema()
+    with SessionLocal() as db:
+        if args.command == "sync":
+            if args.language:
+                sync_language(db, args.language, force=args.force)
+            elif args.workers > 1:
+                parallel_sync_vocabulary_csvs(db, n_workers=args.workers, force=args.force)
+            else:
+                sync_vocabulary_csvs(db, force=args.force)
+        elif args.command == "import-stream":
+            stream_import_csv(
+                db,
+                args.language,
+                args.file,
+                chunk_size=args.chunk_size,
+                word_id_cache_size=args.word_id_cache_size,
+                restart=args.restart
+            )
+        elif args.command == "build-snapshot":
+            build_snapshot(db, args.output)
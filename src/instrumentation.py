@@ -0,0 +1,109 @@
+import json
+import os
+import time
+from contextvars import ContextVar
+from fastapi import Request, Response
+from sqlalchemy import Engine, event
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+
+# when enabled, every response carries the sql stats of its request in X-DB-* headers
+SQL_INSTRUMENTATION_DEBUG = os.getenv("SQL_INSTRUMENTATION_DEBUG", "false").lower() == "true"
+# a request exceeding any of these thresholds is logged as slow
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 500))
+SLOW_REQUEST_DB_TIME_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_DB_TIME_THRESHOLD_MS", 200))
+SLOW_REQUEST_QUERY_COUNT_THRESHOLD = int(os.getenv("SLOW_REQUEST_QUERY_COUNT_THRESHOLD", 20))
+MAX_LOGGED_STATEMENT_LENGTH = 500
+
+
+class RequestQueryStats:
+    """
+    SQL statements run while serving a request.
+
+    Attributes:
+        n_queries (int): Number of statements executed.
+        db_time (float): Total time spent executing statements, in seconds.
+        slowest_statement (str | None): Text of the slowest statement.
+        slowest_statement_time (float): Execution time of the slowest statement, in seconds.
+    """
+    def __init__(self):
+        self.n_queries = 0
+        self.db_time = 0.0
+        self.slowest_statement: str | None = None
+        self.slowest_statement_time = 0.0
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.n_queries += 1
+        self.db_time += elapsed
+        if elapsed >= self.slowest_statement_time:
+            self.slowest_statement = statement
+            self.slowest_statement_time = elapsed
+
+
+# set by the middleware for the duration of a request; sync routes and dependencies run in
+# worker threads with a copy of the request context, so they all record into the same object
+_request_query_stats: ContextVar[RequestQueryStats | None] = ContextVar("request_query_stats", default=None)
+
+
+def get_request_query_stats() -> RequestQueryStats | None:
+    return _request_query_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_times"].pop()
+    request_query_stats = _request_query_stats.get()
+    if request_query_stats is not None:
+        request_query_stats.record(statement, elapsed)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time every statement executed by the engine, attributing it to the request being served, if any.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLInstrumentationMiddleware(BaseHTTPMiddleware):
+    """
+    Collect the SQL stats of every request, expose them as response headers in debug mode,
+    and log a structured line for the requests exceeding the slow request thresholds.
+    """
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        request_query_stats = RequestQueryStats()
+        token = _request_query_stats.set(request_query_stats)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _request_query_stats.reset(token)
+        duration_ms = 1000 * (time.perf_counter() - start)
+        db_time_ms = 1000 * request_query_stats.db_time
+        slowest_statement_ms = 1000 * request_query_stats.slowest_statement_time
+
+        if SQL_INSTRUMENTATION_DEBUG:
+            response.headers["X-DB-Query-Count"] = str(request_query_stats.n_queries)
+            response.headers["X-DB-Time-Ms"] = f"{db_time_ms:.2f}"
+            response.headers["X-DB-Slowest-Query-Ms"] = f"{slowest_statement_ms:.2f}"
+        if (
+            duration_ms > SLOW_REQUEST_THRESHOLD_MS
+            or db_time_ms > SLOW_REQUEST_DB_TIME_THRESHOLD_MS
+            or request_query_stats.n_queries > SLOW_REQUEST_QUERY_COUNT_THRESHOLD
+        ):
+            slowest_statement = request_query_stats.slowest_statement
+            print(json.dumps({
+                "event": "slow_request",
+                "method": request.method,
+                "path": request.url.path,
+                "status_code": response.status_code,
+                "duration_ms": round(duration_ms, 2),
+                "n_queries": request_query_stats.n_queries,
+                "db_time_ms": round(db_time_ms, 2),
+                "slowest_statement_ms": round(slowest_statement_ms, 2),
+                "slowest_statement": slowest_statement and " ".join(slowest_statement.split())[:MAX_LOGGED_STATEMENT_LENGTH],
+            }))
+        return response
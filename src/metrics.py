@@ -0,0 +1,215 @@
+import os
+import time
+from fastapi import Request, Response
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from redis.asyncio import BlockingConnectionPool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+
+# when set, every worker process writes its metrics to this directory and /metrics aggregates them:
+# it must be set before the workers start and emptied at every server start (see gunicorn.conf.py)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the HTTP requests, by route.",
+    ["method", "route"],
+)
+REQUESTS = Counter(
+    "http_requests",
+    "HTTP responses, by route and status code.",
+    ["method", "route", "status_code"],
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the database pool.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_EXHAUSTED = Counter(
+    "db_pool_exhausted",
+    "Checkouts finding every connection of the database pool in use, overflow included, "
+    "by outcome: waited for a connection, or timed out.",
+    ["outcome"],
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Connections opened by the database pools of the live workers.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections in use in the database pools of the live workers.",
+    multiprocess_mode="livesum",
+)
+REDIS_BLOCKLIST_LOOKUP_LATENCY = Histogram(
+    "redis_blocklist_lookup_duration_seconds",
+    "Latency of the token blocklist lookups on redis.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+REDIS_POOL_CHECKOUT_WAIT = Histogram(
+    "redis_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the async redis pool.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+REDIS_POOL_SIZE = Gauge(
+    "redis_pool_size",
+    "Connections opened by the async redis pools of the live workers.",
+    multiprocess_mode="livesum",
+)
+REDIS_POOL_CHECKED_OUT = Gauge(
+    "redis_pool_checked_out",
+    "Connections in use in the async redis pools of the live workers.",
+    multiprocess_mode="livesum",
+)
+TOKEN_BLOCKLIST_FILTER_LOOKUPS = Counter(
+    "token_blocklist_filter_lookups",
+    "Token blocklist lookups, by answer of the local revoked token filter: "
+    "negative, revoked, false_positive or unavailable (filter stale, checked on redis).",
+    ["result"],
+)
+PASSWORD_HASHING_QUEUE_DEPTH = Gauge(
+    "password_hashing_queue_depth",
+    "Password hashing jobs submitted to the hashing pools of the live workers and not finished yet.",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASHING_WAIT = Histogram(
+    "password_hashing_wait_seconds",
+    "Time a password hashing job waits for a thread of the hashing pool.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PASSWORD_HASHING_DURATION = Histogram(
+    "password_hashing_duration_seconds",
+    "Time spent hashing or verifying a password, by operation.",
+    ["operation"],
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2.5),
+)
+PASSWORD_HASHING_REJECTED = Counter(
+    "password_hashing_rejected",
+    "Password hashing jobs rejected because the hashing pool queue was full.",
+)
+GAMES_CREATED = Counter(
+    "games_created",
+    "Games created, by language and game type.",
+    ["language", "game_type"],
+)
+ANSWERS_VERIFIED = Counter(
+    "answers_verified",
+    "Answers checked against the solutions, by language and result.",
+    ["language", "result"],
+)
+WORDS_SCORED = Counter(
+    "words_scored",
+    "Game words answered and added to the user stats, by language.",
+    ["language"],
+)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool recording how long every checkout waits for a connection, how often it finds the pool exhausted,
+    and how many connections it holds.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        is_exhausted = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_EXHAUSTED.labels("timeout").inc()
+            raise
+        else:
+            if is_exhausted:
+                DB_POOL_EXHAUSTED.labels("waited").inc()
+            return connection
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        DB_POOL_SIZE.set(self.checkedin() + self.checkedout())
+        DB_POOL_CHECKED_OUT.set(self.checkedout())
+
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """
+    TimedQueuePool for the async engine.
+    """
+
+
+class TimedBlockingConnectionPool(BlockingConnectionPool):
+    """
+    Async redis pool recording how long every checkout waits for a connection, and how many connections it holds.
+    """
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().get_connection()
+        finally:
+            REDIS_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+            self._update_gauges()
+
+    async def release(self, connection):
+        await super().release(connection)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        REDIS_POOL_SIZE.set(len(self._available_connections) + len(self._in_use_connections))
+        REDIS_POOL_CHECKED_OUT.set(len(self._in_use_connections))
+
+
+def get_route_template(request: Request) -> str:
+    """
+    Return the path template of the route serving a request (e.g. /api/v1/games/{id}),
+    so that ids in paths do not create a time series each.
+    """
+    route = request.scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format is None:
+        return "unmatched"
+    # routes of routers included with a prefix may only know their path relative to the prefix:
+    # the prefix is what precedes the part of the request path matched by the route
+    matched_path = path_format.format(**request.scope.get("path_params", {}))
+    request_path = request.scope["path"]
+    if request_path.endswith(matched_path):
+        return request_path[:len(request_path) - len(matched_path)] + path_format
+    return path_format
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """
+    Record the latency and the status code of every request, labelled by route template.
+    """
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            route_path = get_route_template(request)
+            REQUEST_LATENCY.labels(request.method, route_path).observe(time.perf_counter() - start)
+            REQUESTS.labels(request.method, route_path, str(status_code)).inc()
+
+
+def generate_metrics() -> bytes:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, status
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.services.auth import (
     get_db_session,
-    get_current_user_factory
+    get_current_principal_factory
 )
-from src.db.models import User
+from src.services.principals import UserPrincipal
 from src.schemas.games import GameCreateInputModel, GameDetailOutputModel
 from src.schemas.games import AnswerInputModel
 from src.services.games import GameService
@@ -14,15 +14,15 @@ router = APIRouter()
 game_service = GameService()
 
 @router.post("/new", status_code=status.HTTP_201_CREATED, response_model=GameDetailOutputModel)
-def create_game(
+async def create_game(
     game_create_model: GameCreateInputModel,
-    db: Session = Depends(get_db_session),
-    current_user: User = Depends(get_current_user_factory()),
+    db: AsyncSession = Depends(get_db_session),
+    current_user: UserPrincipal = Depends(get_current_principal_factory()),
     ):
 
     language = game_create_model.language.lower()
 
-    new_game = game_service.create_new_game(
+    new_game = await game_service.create_new_game(
         db, 
         current_user, 
         language, 
@@ -34,56 +34,56 @@ def create_game(
 
     return new_game
 @router.get("/active")
-def get_active_games_for_user(
-    db: Session = Depends(get_db_session),
-    current_user: User = Depends(get_current_user_factory()),
+async def get_active_games_for_user(
+    db: AsyncSession = Depends(get_db_session),
+    current_user: UserPrincipal = Depends(get_current_principal_factory()),
     ):
-    games = game_service.get_games_for_user(db, current_user, active_only=True)
+    games = await game_service.get_games_for_user(db, current_user, active_only=True)
     return JSONResponse (
         status_code=status.HTTP_200_OK,
         content={"games": games}
     )
 
 @router.get("/")
-def get_all_games_for_user(
-    db: Session = Depends(get_db_session),
-    current_user: User = Depends(get_current_user_factory()),
+async def get_all_games_for_user(
+    db: AsyncSession = Depends(get_db_session),
+    current_user: UserPrincipal = Depends(get_current_principal_factory()),
     ):
-    games = game_service.get_games_for_user(db, current_user, active_only=False)
+    games = await game_service.get_games_for_user(db, current_user, active_only=False)
     return JSONResponse (
         status_code=status.HTTP_200_OK,
         content={"games": games}
     )
 
 @router.get("/{id}", status_code=status.HTTP_200_OK, response_model=GameDetailOutputModel)
-def get_game_details_from_id(
+async def get_game_details_from_id(
     id: int,
-    db: Session = Depends(get_db_session),
-    current_user: User = Depends(get_current_user_factory()),
+    db: AsyncSession = Depends(get_db_session),
+    current_user: UserPrincipal = Depends(get_current_principal_factory()),
     ):
-    game = game_service.get_game_details_from_id(db, current_user, id)
+    game = await game_service.get_game_details_from_id(db, current_user, id)
     return game
 
 @router.delete("/{id}", status_code=status.HTTP_200_OK)
-def delete_game(    
+async def delete_game(    
     id: int,
-    db: Session = Depends(get_db_session),
-    current_user: User = Depends(get_current_user_factory()),
+    db: AsyncSession = Depends(get_db_session),
+    current_user: UserPrincipal = Depends(get_current_principal_factory()),
     ):
-    game_service.delete_game(db, current_user, id)
+    await game_service.delete_game(db, current_user, id)
     return JSONResponse(
         content={"detail": "Game successfully deleted"}
     )
 
 
 @router.post("/{id}/answers")
-def post_answers_for_game(
+async def post_answers_for_game(
     id: int,
     answer_model: AnswerInputModel,
-    db: Session = Depends(get_db_session),
-    current_user: User = Depends(get_current_user_factory()),
+    db: AsyncSession = Depends(get_db_session),
+    current_user: UserPrincipal = Depends(get_current_principal_factory()),
     ):
-    game, round_score_percentage = game_service.give_answers_for_game(
+    game, round_score_percentage = await game_service.give_answers_for_game(
         db,
         current_user,
         id,
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response, status
+from prometheus_client import CONTENT_TYPE_LATEST
+from src.metrics import generate_metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+def get_metrics():
+    return Response(
+        status_code=status.HTTP_200_OK,
+        content=generate_metrics(),
+        media_type=CONTENT_TYPE_LATEST
+    )
@@ -1,11 +1,11 @@
 from typing import List
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.services.auth import (
     get_db_session,
-    get_current_user_factory
+    get_current_principal_factory
 )
-from src.db.models import User
+from src.services.principals import UserPrincipal
 from src.schemas.stats import StatOutputModel
 from src.services.stats import StatService
 
@@ -13,10 +13,10 @@ router = APIRouter()
 stats_service = StatService()
 
 @router.get("/", response_model=List[StatOutputModel])
-def get_stats_for_user(
-    db: Session = Depends(get_db_session),
-    current_user: User = Depends(get_current_user_factory()),
+async def get_stats_for_user(
+    db: AsyncSession = Depends(get_db_session),
+    current_user: UserPrincipal = Depends(get_current_principal_factory()),
     language: str | None = Query(None)
     ):
-    stats = stats_service.get_stats_for_user(db, current_user, language)
+    stats = await stats_service.get_stats_for_user(db, current_user, language)
     return stats
@@ -2,7 +2,8 @@ import datetime
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.db.models import User
 from src.services.auth import (
     get_db_session,
@@ -10,13 +11,15 @@ from src.services.auth import (
     get_user_by_email,
     create_token,
     authenticate_user,
-    get_password_hash,
+    get_password_hash_in_pool,
     validate_token_factory,
     create_url_safe_token,
-    decode_url_safe_token
+    decode_url_safe_token,
+    invalidate_user_principal
 )
 from fastapi.security import OAuth2PasswordRequestForm
 from src.db.redis import add_jti_to_blocklist
+from src.services.token_cache import verified_token_cache
 from src.schemas.users import ResetPasswordModel, SendResetPasswordLinkModel, UserCreate, UserModel
 from src.mail import mail, create_message
 import os
@@ -48,12 +51,12 @@ def check_password(password: str) -> bool:
 
 # User registration
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate, backgroud_tasks: BackgroundTasks, db: Session = Depends(get_db_session)):
-    if db.query(User).filter(User.username == user.username).first():
+async def register(user: UserCreate, backgroud_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db_session)):
+    if (await db.execute(select(User.id).where(User.username == user.username))).first():
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Username already registered"
         )
-    if db.query(User).filter(User.email == user.email).first():
+    if (await db.execute(select(User.id).where(User.email == user.email))).first():
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Email already registered"
         )
@@ -67,11 +70,11 @@ async def register(user: UserCreate, backgroud_tasks: BackgroundTasks, db: Sessi
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Password must contain 9 to 30 characters, including at least one letter and one digit",
         )
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_in_pool(user.password)
     new_user = User(username=user.username, hashed_password=hashed_password, email=user.email)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # Send email for user verification
     token = create_url_safe_token({"email": user.email})
@@ -97,7 +100,7 @@ async def register(user: UserCreate, backgroud_tasks: BackgroundTasks, db: Sessi
 @router.get("/verify/{token}")
 async def verify_user_account(
     token: str,
-    db : Session = Depends(get_db_session)
+    db : AsyncSession = Depends(get_db_session)
 ):
     try:
         token_data = decode_url_safe_token(token)
@@ -113,7 +116,7 @@ async def verify_user_account(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Email not found",
         )        
-    user = get_user_by_email(db, user_email)
+    user = await get_user_by_email(db, user_email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -121,8 +124,9 @@ async def verify_user_account(
         )
     
     user.is_verified = True
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await invalidate_user_principal(user.username)
+    await db.refresh(user)
     return JSONResponse (
         status_code=status.HTTP_200_OK,
         content={
@@ -133,11 +137,11 @@ async def verify_user_account(
 
 # User authentication: return a bearer token that allows the user to access the service
 @router.post("/get_access_token")
-def get_access_token(
+async def get_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_db_session),
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -151,11 +155,11 @@ def get_access_token(
 
 # User authentication: return a bearer token that allows the user to access the service
 @router.post("/get_refresh_token")
-def get_refresh_token(
+async def get_refresh_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_db_session),
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -169,7 +173,7 @@ def get_refresh_token(
     return {"refresh_token": refresh_token, "token_type": "bearer"}
 
 @router.get("/refresh_access_token")
-def get_access_token_from_refresh_token(
+async def get_access_token_from_refresh_token(
     current_user: User = Depends(get_current_user_factory(is_refresh_token=True)),
 ):
     access_token = create_token(
@@ -179,11 +183,13 @@ def get_access_token_from_refresh_token(
     return {"access_token": access_token, "token_type": "bearer"} 
 
 @router.get("/logout")
-def revoke_token(token_details: dict[str, Any] = Depends(validate_token_factory())):
+async def revoke_token(token_details: dict[str, Any] = Depends(validate_token_factory())):
     print(token_details)
     jti = token_details.get("jti")
     print(jti)
-    add_jti_to_blocklist(jti)
+    await add_jti_to_blocklist(jti)
+    # the other workers evict it when the revocation is published
+    verified_token_cache.invalidate(jti)
     return JSONResponse  (
         status_code=status.HTTP_200_OK,
         content={
@@ -192,26 +198,27 @@ def revoke_token(token_details: dict[str, Any] = Depends(validate_token_factory(
     )
 
 @router.delete("/delete")
-def delete_user(
-    db: Session = Depends(get_db_session),
+async def delete_user(
+    db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user_factory()),
 ):
-    db.delete(current_user)
-    db.commit()
+    await db.delete(current_user)
+    await db.commit()
+    await invalidate_user_principal(current_user.username)
     return {"message": "User deleted"}
 
 @router.get("/me", response_model=UserModel)
-def get_current_user(current_user = Depends(get_current_user_factory())):
+async def get_current_user(current_user = Depends(get_current_user_factory())):
     return current_user
 
 @router.post("/send_reset_password_link")
-def send_reset_password_link(
+async def send_reset_password_link(
     password_reset_model: SendResetPasswordLinkModel,
     backgroud_tasks: BackgroundTasks,
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_db_session),
 ):
     
-    if get_user_by_email(db, password_reset_model.email) is None:
+    if await get_user_by_email(db, password_reset_model.email) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User for email {password_reset_model.email} does not exist.",
@@ -239,10 +246,10 @@ def send_reset_password_link(
     )
 
 @router.post("/reset_password/{token}")
-def reset_password(
+async def reset_password(
     token: str,
     reset_password_model: ResetPasswordModel,
-    db: Session = Depends(get_db_session)
+    db: AsyncSession = Depends(get_db_session)
 ):
     
     if not check_password(reset_password_model.password):
@@ -265,16 +272,17 @@ def reset_password(
                 detail="Sorry, an unexpected error has occurred while decoding verification token...",
             )
     
-    user = get_user_by_email(db, user_email)
+    user = await get_user_by_email(db, user_email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
     
-    user.hashed_password = get_password_hash(reset_password_model.password)
-    db.commit()
-    db.refresh(user)
+    user.hashed_password = await get_password_hash_in_pool(reset_password_model.password)
+    await db.commit()
+    await invalidate_user_principal(user.username)
+    await db.refresh(user)
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
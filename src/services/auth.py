@@ -7,9 +7,14 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from src.db.models import User, SessionLocal
-from src.db.redis import token_in_blocklist
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from src.db.models import User, AsyncSessionLocal
+from src.db.redis import publish_user_change, token_in_blocklist
+from src.services.password_hashing import password_hashing_pool
+from src.services.principals import UserPrincipal, user_principal_cache
+from src.services.token_cache import verified_token_cache
 from itsdangerous import URLSafeTimedSerializer
 
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -59,6 +64,15 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+# bcrypt is slow on purpose: from the routes, passwords are hashed and verified in the hashing pool
+async def verify_password_in_pool(plain_password, hashed_password):
+    return await password_hashing_pool.run("verify", verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_in_pool(password):
+    return await password_hashing_pool.run("hash", get_password_hash, password)
+
+
 def create_token(
     data: dict,
     expires_delta: timedelta,
@@ -72,29 +86,34 @@ def create_token(
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_db_session():
-    session = SessionLocal()
-    try:
+async def get_db_session():
+    async with AsyncSessionLocal() as session:
         yield session
-    finally:
-        session.close()
 
 
-def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user(db: AsyncSession, username: str):
+    return (await db.execute(select(User).where(User.username == username))).scalars().first()
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return (await db.execute(select(User).where(User.email == email))).scalars().first()
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
-    if user and verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = (await db.execute(
+        select(User).options(undefer(User.hashed_password)).where(User.username == username)
+    )).scalars().first()
+    if user and await verify_password_in_pool(password, user.hashed_password):
         return user
     return None
 
 
-def validate_token(token: str, is_refresh_token: bool = False) -> dict[str, Any]:
+async def validate_token(token: str, is_refresh_token: bool = False) -> dict[str, Any]:
+    payload = verified_token_cache.get(token)
+    if payload is not None:
+        if payload.get("refresh") != is_refresh_token:
+            raise INVALID_TOKEN_EXCEPTION
+        return payload
+    generation = verified_token_cache.generation
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
@@ -109,35 +128,71 @@ def validate_token(token: str, is_refresh_token: bool = False) -> dict[str, Any]
             or datetime.datetime.fromtimestamp(exp) < datetime.datetime.now()
         ):
             raise INVALID_TOKEN_EXCEPTION
-        if token_in_blocklist(jti):
+        if await token_in_blocklist(jti):
             raise TOKEN_IN_BLOCKLIST_EXCEPTION
     except JWTError:
         raise INVALID_TOKEN_EXCEPTION
+    verified_token_cache.put(token, payload, generation)
     return payload
 
 
 def get_current_user_factory(
     is_refresh_token: bool = False
 ) -> Callable[[], User]:
-    def get_current_user_closure(    
+    async def get_current_user_closure(    
             token: str = Depends(oauth2_scheme), 
-            db: Session = Depends(get_db_session)
+            db: AsyncSession = Depends(get_db_session)
         ):
-        payload = validate_token(token, is_refresh_token)
+        payload = await validate_token(token, is_refresh_token)
         username = payload.get("sub")
-        user = get_user(db, username)
+        user = await get_user(db, username)
         if user is None:
             raise CREDENTIALS_EXCEPTION 
         return user
     return get_current_user_closure
 
+def get_current_principal_factory(
+    is_refresh_token: bool = False
+) -> Callable[[], UserPrincipal]:
+    """
+    Like get_current_user_factory, for the routes needing only the identity of the user:
+    the principal is served from the principal cache when possible.
+    """
+    async def get_current_principal_closure(
+            token: str = Depends(oauth2_scheme),
+            db: AsyncSession = Depends(get_db_session)
+        ):
+        payload = await validate_token(token, is_refresh_token)
+        username = payload.get("sub")
+        principal = user_principal_cache.get(username)
+        if principal is None:
+            generation = user_principal_cache.generation
+            row = (await db.execute(
+                select(User.id, User.username, User.is_verified).where(User.username == username)
+            )).first()
+            if row is None:
+                raise CREDENTIALS_EXCEPTION
+            principal = UserPrincipal(*row)
+            user_principal_cache.put(principal, generation)
+        return principal
+    return get_current_principal_closure
+
+
+async def invalidate_user_principal(username: str) -> None:
+    """
+    Evict a deleted or changed user from the principal caches of every worker, once the change is committed.
+    """
+    user_principal_cache.invalidate(username)
+    await publish_user_change(username)
+
+
 def validate_token_factory(
     is_refresh_token: bool = False
 ) -> Callable[[], dict[str, Any]]:
-    def validate_token_closure(    
+    async def validate_token_closure(    
             token: str = Depends(oauth2_scheme)
         ):
-        payload = validate_token(token, is_refresh_token)
+        payload = await validate_token(token, is_refresh_token)
         return payload
     return validate_token_closure
 
@@ -1,9 +1,15 @@
 from fastapi import HTTPException, status
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-from src.db.models import Stat, User, Word, Game, GameWord, SUPPORTED_LANGUAGES, USER_LANGUAGE, WordTranslation
+from sqlalchemy import Boolean, Float, Integer, any_, cast, delete, func, literal, select, true, tuple_, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from src.db.models import Stat, User, Word, Game, GameWord, SUPPORTED_LANGUAGES
+from src.db.vocabulary import array_parameter
+from src.metrics import ANSWERS_VERIFIED, GAMES_CREATED, WORDS_SCORED
 import random
 from src.schemas.games import GameOutputModel, GameDetailOutputModel
+from src.services.principals import UserPrincipal
+from src.services.vocabulary import IndexedWord, LanguageVocabulary, vocabulary_index
 from typing import List, Tuple
 from src.utils import calculate_score_percentage
 
@@ -12,11 +18,14 @@ class GameService:
         self.MAX_OPENED_GAMES_FOR_USER = 10
         self.MAX_WORD_SCORE_HARD_GAME = 0.5 #50%
         self.MIN_WORD_SCORE_RECAP_GAME = 0.5
+        self.N_SAMPLE_PROBES_PER_WORD = 2 # probes drawn per word to sample from the user stats, for duplicates
+        self.SAMPLE_PROBE_WINDOW = 32 # max number of stats read by a probe
+        self.vocabulary_index = vocabulary_index
 
-    def _generate_words_for_new_game(
+    async def _generate_words_for_new_game(
         self,
-        db: Session,
-        user: User,
+        db: AsyncSession,
+        user: User | UserPrincipal,
         language: str,
         n_words_to_guess: int,
         n_vocabulary: int,
@@ -24,93 +33,43 @@ class GameService:
         translate_from_your_language_percentage: int
     ):
         words = []
-        vocabulary = []
+        n_vocabulary_gt = 0
         n_words_to_guess = min(n_words_to_guess, n_vocabulary)  # n_words_to_guess <= n_vocabulary
         n_words_translate_from_your_language = int(n_words_to_guess * translate_from_your_language_percentage / 100)
         n_words_translate_from_foreign_language = n_words_to_guess - n_words_translate_from_your_language
 
-        if game_type == "hard":
-            stats = (
-                db.query(Stat)
-                    .filter(Stat.language == language)
-                    .filter(Stat.user_id == user.id)
-                    .filter((Stat.n_correct_answers / Stat.n_appearances) <= self.MAX_WORD_SCORE_HARD_GAME)
-                    .join(Stat.word)
-                    .filter(Word.language != language)
-                    .order_by(text('RANDOM()'))
-                    .limit(n_words_translate_from_your_language)
-                    .all()
-            )
-            words_translate_from_your_language = [stat.word for stat in stats]
-            n_words_translate_from_your_language -= len(words_translate_from_your_language)
-            stats = (
-                db.query(Stat)
-                    .filter(Stat.language == language)
-                    .filter(Stat.user_id == user.id)
-                    .filter((Stat.n_correct_answers / Stat.n_appearances) <= self.MAX_WORD_SCORE_HARD_GAME)
-                    .join(Stat.word)
-                    .filter(Word.language == language)
-                    .order_by(text('RANDOM()'))
-                    .limit(n_words_translate_from_foreign_language)
-                    .all()
-            )
-            words_translate_from_foreign_language = [stat.word for stat in stats]
-            n_words_translate_from_foreign_language -= len(words_translate_from_foreign_language)
-
-            words = words_translate_from_your_language + words_translate_from_foreign_language
-
-        elif game_type == "recap":
-            stats = (
-                db.query(Stat)
-                    .filter(Stat.language == language)
-                    .filter(Stat.user_id == user.id)
-                    .filter((Stat.n_correct_answers / Stat.n_appearances) >= self.MIN_WORD_SCORE_RECAP_GAME)
-                    .join(Stat.word)
-                    .filter(Word.language != language)
-                    .order_by(text('RANDOM()'))
-                    .limit(n_words_translate_from_your_language)
-                    .all()
+        if game_type in ("hard", "recap"):
+            if game_type == "hard":
+                score_range = (0.0, self.MAX_WORD_SCORE_HARD_GAME)
+            else:
+                score_range = (self.MIN_WORD_SCORE_RECAP_GAME, 1.0)
+            words_translate_from_your_language, words_translate_from_foreign_language = await self._sample_stat_words(
+                db,
+                user,
+                language,
+                score_range,
+                n_words_translate_from_your_language,
+                n_words_translate_from_foreign_language
             )
-            words_translate_from_your_language = [stat.word for stat in stats]
             n_words_translate_from_your_language -= len(words_translate_from_your_language)
-            stats = (
-                db.query(Stat)
-                    .filter(Stat.language == language)
-                    .filter(Stat.user_id == user.id)
-                    .filter((Stat.n_correct_answers / Stat.n_appearances) >= self.MIN_WORD_SCORE_RECAP_GAME)
-                    .join(Stat.word)
-                    .filter(Word.language == language)
-                    .order_by(text('RANDOM()'))
-                    .limit(n_words_translate_from_foreign_language)
-                    .all()
-            )
-            words_translate_from_foreign_language = [stat.word for stat in stats]
             n_words_translate_from_foreign_language -= len(words_translate_from_foreign_language)
 
             words = words_translate_from_your_language + words_translate_from_foreign_language
 
         n_missing_words = n_words_to_guess-len(words)
         if n_missing_words > 0:
-            words_translations = (
-                db.query(WordTranslation)
-                    .join(WordTranslation.word)
-                    .filter(Word.language == language)
-                    .order_by(WordTranslation.frequency)
-                    .limit(n_vocabulary)
-                    .all()
-            )
+            language_vocabulary = await self.vocabulary_index.get_async(db, language)
+            n_vocabulary_gt = min(n_vocabulary, len(language_vocabulary))
+            # sample positions among the n_vocabulary most frequent word translations
             if n_words_translate_from_foreign_language > 0:
-                vocabulary = [word_translation.word for word_translation in words_translations]
-                n_vocabulary_gt = len(vocabulary)
-                random.shuffle(vocabulary)
-                words.extend(vocabulary[0:n_words_translate_from_foreign_language])
+                positions = random.sample(range(n_vocabulary_gt), min(n_words_translate_from_foreign_language, n_vocabulary_gt))
+                words.extend(language_vocabulary.get_word(language_vocabulary.word_ids[position]) for position in positions)
             if n_words_translate_from_your_language > 0:
-                vocabulary = [word_translation.translation for word_translation in words_translations]
-                random.shuffle(vocabulary)
-                words.extend(vocabulary[0:n_words_translate_from_your_language])
+                positions = random.sample(range(n_vocabulary_gt), min(n_words_translate_from_your_language, n_vocabulary_gt))
+                words.extend(language_vocabulary.get_word(language_vocabulary.translation_ids[position]) for position in positions)
 
         random.shuffle(words)
-        words_dict_gt: dict[int, Word] = {}
+        words_dict_gt: dict[int, IndexedWord] = {}
         for word in words:
             if words_dict_gt.get(word.id) is None:
                 words_dict_gt[word.id] = word
@@ -118,13 +77,164 @@ class GameService:
         words_gt = list(words_dict_gt.values()) 
 
         n_words_to_guess_gt = len(words_gt) # n_words_to_guess_gt might be less than number provided by user
-        n_vocabulary_gt = max(len(vocabulary), n_words_to_guess_gt)   # n_vocabulary_gt might be less than number provided by user
+        n_vocabulary_gt = max(n_vocabulary_gt, n_words_to_guess_gt)   # n_vocabulary_gt might be less than number provided by user
         return words_gt, n_vocabulary_gt, n_words_to_guess_gt
 
-    def create_new_game(
+    async def _sample_stat_words(
+        self,
+        db: AsyncSession,
+        user: User | UserPrincipal,
+        language: str,
+        score_range: Tuple[float, float],
+        n_words_translate_from_your_language: int,
+        n_words_translate_from_foreign_language: int
+    ) -> Tuple[List[IndexedWord], List[IndexedWord]]:
+        """
+        Sample words of the user stats in a score range, split in (from your language, from foreign language).
+        """
+        n_words = {False: n_words_translate_from_your_language, True: n_words_translate_from_foreign_language}
+        probes = [
+            (random.random(), is_foreign)
+            for is_foreign, n in n_words.items()
+            for _ in range(n * self.N_SAMPLE_PROBES_PER_WORD)
+        ]
+        if not probes:
+            return [], []
+        words = {False: {}, True: {}}
+        for word in await self._probe_stat_words(db, user, language, score_range, probes):
+            words[word.language == language].setdefault(word.id, word)
+        # stats in the range too sparse among those of the user to be found by the probes: a run of consecutive
+        # stats from a random keyset fills in the words missing
+        n_missing_words = {is_foreign: n - len(words[is_foreign]) for is_foreign, n in n_words.items()}
+        if any(n > 0 for n in n_missing_words.values()):
+            for word in await self._sample_stat_words_by_score(db, user, language, score_range, {
+                is_foreign: n_words[is_foreign] for is_foreign, n in n_missing_words.items() if n > 0
+            }):
+                words[word.language == language].setdefault(word.id, word)
+        return (
+            list(words[False].values())[:n_words_translate_from_your_language],
+            list(words[True].values())[:n_words_translate_from_foreign_language],
+        )
+
+    async def _probe_stat_words(
+        self,
+        db: AsyncSession,
+        user: User | UserPrincipal,
+        language: str,
+        score_range: Tuple[float, float],
+        probes: List[Tuple[float, bool]]
+    ) -> List[IndexedWord]:
+        # independent probes over ix_stats_user_language_sample_key: every probe returns the first stat in the range
+        # after a random sample key (wrapping around), among the next SAMPLE_PROBE_WINDOW stats of the user. Sample
+        # keys are random, so every stat in the range is as likely to be found, whatever its score, and a probe
+        # reads a bounded number of index entries, whatever the number of stats of the user
+        min_score, max_score = score_range
+        probe_keys = (
+            func.unnest(
+                array_parameter([key for key, _ in probes], Float),
+                array_parameter([is_foreign for _, is_foreign in probes], Boolean)
+            )
+                .table_valued("key", "is_foreign")
+                .render_derived(name="probes")
+        )
+
+        def get_window(is_after_key: bool):
+            return (
+                select(Stat.word_id, Stat.score)
+                    .where(Stat.user_id == user.id, Stat.language == language)
+                    .where(Stat.sample_key >= probe_keys.c.key if is_after_key else Stat.sample_key < probe_keys.c.key)
+                    .order_by(Stat.sample_key)
+                    .limit(self.SAMPLE_PROBE_WINDOW)
+                    .correlate(probe_keys)
+            )
+
+        # the wrapped around branch is only read when the first one ends before the window does
+        window = select(
+            union_all(get_window(is_after_key=True), get_window(is_after_key=False)).subquery()
+        ).limit(self.SAMPLE_PROBE_WINDOW).subquery("window")
+        probe = (
+            select(Word.id, Word.text, Word.language)
+                .select_from(window)
+                .join(Word, Word.id == window.c.word_id)
+                .where(window.c.score.between(min_score, max_score))
+                .where((Word.language == language) == probe_keys.c.is_foreign)
+                .limit(1)
+                .lateral("probe")
+        )
+        return [
+            IndexedWord(*row)
+            for row in await db.execute(select(probe).select_from(probe_keys).join(probe, true()))
+        ]
+
+    async def _sample_stat_words_by_score(
         self,
-        db: Session,
-        user: User,
+        db: AsyncSession,
+        user: User | UserPrincipal,
+        language: str,
+        score_range: Tuple[float, float],
+        n_words: dict[bool, int]
+    ) -> List[IndexedWord]:
+        # random keyset over ix_stats_user_language_score_word: from a random (score, word id) pivot among the
+        # candidates, read the next words in index order, wrapping around to the lowest score, so that sampling
+        # reads as many index entries as words needed, whatever the number of stats of the user
+        min_score, max_score = score_range
+        candidate_filters = (
+            Stat.user_id == user.id,
+            Stat.language == language,
+            Stat.score.between(min_score, max_score),
+        )
+        # the pivot score is snapped down to an existing one (or wrapped to the lowest), and the pivot word id drawn
+        # between the lowest and the highest word ids of that score, so that words sharing a score (e.g. all the
+        # words never answered right) are entered at a random word rather than always from the first one
+        pivot_score = (
+            select(
+                func.coalesce(
+                    select(Stat.score)
+                        .where(*candidate_filters, Stat.score <= random.uniform(min_score, max_score))
+                        .order_by(Stat.score.desc())
+                        .limit(1)
+                        .scalar_subquery(),
+                    select(func.min(Stat.score)).where(*candidate_filters).scalar_subquery()
+                ).label("score")
+            ).cte("pivot_score")
+        )
+        pivot_score_word_ids = (
+            select(Stat.word_id).where(*candidate_filters, Stat.score == select(pivot_score.c.score).scalar_subquery())
+        )
+        min_word_id = pivot_score_word_ids.order_by(Stat.word_id).limit(1).scalar_subquery()
+        max_word_id = pivot_score_word_ids.order_by(Stat.word_id.desc()).limit(1).scalar_subquery()
+        pivot_word_id = (
+            select((min_word_id + cast((max_word_id - min_word_id) * random.random(), Integer)).label("word_id"))
+                .cte("pivot_word_id")
+        )
+        pivot = tuple_(select(pivot_score.c.score).scalar_subquery(), select(pivot_word_id.c.word_id).scalar_subquery())
+        key = tuple_(Stat.score, Stat.word_id)
+
+        def sample(is_foreign: bool, n: int):
+            candidates = (
+                select(Word.id, Word.text, Word.language)
+                    .select_from(Stat)
+                    .join(Word, Word.id == Stat.word_id)
+                    .where(*candidate_filters)
+                    .where(Word.language == language if is_foreign else Word.language != language)
+                    .order_by(Stat.score, Stat.word_id)
+                    .limit(n)
+            )
+            # the wrapped around branch is only read when the first one ends before n words
+            return select(
+                union_all(
+                    select(candidates.where(key >= pivot).subquery()),
+                    select(candidates.where(key < pivot).subquery()),
+                ).subquery()
+            ).limit(n)
+
+        samples = [sample(is_foreign, n) for is_foreign, n in n_words.items()]
+        return [IndexedWord(*row) for row in await db.execute(union_all(*(sample.subquery().select() for sample in samples)))]
+
+    async def create_new_game(
+        self,
+        db: AsyncSession,
+        user: User | UserPrincipal,
         language: str,
         n_words_to_guess: int,
         n_vocabulary: int,
@@ -137,7 +247,9 @@ class GameService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Language is not supported.",
             )
-        n_active_games = len([game for game in user.games if game.is_active])
+        n_active_games = (await db.execute(
+            select(func.count(Game.id)).where(Game.user_id == user.id).where(Game.is_active)
+        )).scalar_one()
         if n_active_games >= self.MAX_OPENED_GAMES_FOR_USER:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -147,7 +259,7 @@ class GameService:
                 """,
             )
 
-        words, n_vocabulary_gt, n_words_to_guess_gt  = self._generate_words_for_new_game(
+        words, n_vocabulary_gt, n_words_to_guess_gt  = await self._generate_words_for_new_game(
             db,
             user,
             language,
@@ -164,13 +276,10 @@ class GameService:
             n_vocabulary=n_vocabulary_gt,
         )
         db.add(new_game)
-        db.commit()
-        db.refresh(new_game)
+        await db.flush()
         for word in words:
             new_game_word = GameWord(game_id=new_game.id, word_id=word.id)
             db.add(new_game_word)
-        db.commit()
-
         game_detail_output_detail = GameDetailOutputModel(
             id=new_game.id,
             language=new_game.language,
@@ -182,38 +291,32 @@ class GameService:
             from_your_language=[word.text for word in words if word.language != language],
             game_score_percentage=None
         ).model_dump()
+        # built before committing: the expired game could not be lazy loaded by an async session
+        await db.commit()
+        GAMES_CREATED.labels(language, game_type).inc()
         return game_detail_output_detail
     
-    def get_games_for_user(self, db: Session, user: User, active_only: bool) -> List[GameOutputModel]:
+    async def get_games_for_user(self, db: AsyncSession, user: User | UserPrincipal, active_only: bool) -> List[GameOutputModel]:
 
-        games = db.query(Game).filter(Game.user_id == user.id)
+        games_query = select(Game).where(Game.user_id == user.id)
         if active_only:
-            games = games.filter(Game.is_active)
-        games = games.all()
+            games_query = games_query.where(Game.is_active)
+        games = (await db.execute(games_query)).scalars().all()
         games = [
             GameOutputModel.model_validate(game).model_dump() for game in games
         ]
         return games
     
-    def get_game_details_from_id(self, db: Session, user: User, game_id: int) -> GameDetailOutputModel:
+    async def get_game_details_from_id(self, db: AsyncSession, user: User | UserPrincipal, game_id: int) -> GameDetailOutputModel:
 
-        game = db.query(Game).filter(Game.user_id == user.id).filter(Game.id == game_id).first()
+        game = await self._get_game(db, user, game_id)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No game of yours corresponds to the id provided!"
             )
-        words_to_guess = []
-        words_to_guess_from_foreign_language = []
-        words_to_guess_from_your_language = []
-        for game_word in game.words:
-            word_text = game_word.word.text
-            words_to_guess.append(word_text)
-            if game_word.word.language == game.language:
-                words_to_guess_from_foreign_language.append(word_text)
-            else:
-                words_to_guess_from_your_language.append(word_text)
-        n_words_to_guess=len(words_to_guess)
+        words_to_guess_from_foreign_language, words_to_guess_from_your_language = await self._get_words_to_guess(db, game)
+        n_words_to_guess = len(words_to_guess_from_foreign_language) + len(words_to_guess_from_your_language)
 
         if n_words_to_guess==game.n_words_to_guess:
             game_score_percentage = None
@@ -233,27 +336,26 @@ class GameService:
         ).model_dump()
         return game_output_model
 
-    def delete_game(self, db: Session, user: User, game_id: int) -> None:
+    async def delete_game(self, db: AsyncSession, user: User | UserPrincipal, game_id: int) -> None:
 
-        game = db.query(Game).filter(Game.user_id == user.id).filter(Game.id == game_id).first()
+        game = await self._get_game(db, user, game_id)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No game of yours corresponds to the id provided!"
             )
-        db.delete(game)
-        db.commit()
+        await db.delete(game)
+        await db.commit()
 
-    def give_answers_for_game(
+    async def give_answers_for_game(
         self,
-        db: Session,
-        user: User,
+        db: AsyncSession,
+        user: User | UserPrincipal,
         game_id: int,
         from_foreign_language_translation_candidates: dict[str, str],
         from_your_language_translation_candidates: dict[str, str]
     ) -> Tuple[GameDetailOutputModel, float]:
-        game = db.query(Game).filter(Game.user_id == user.id) \
-            .filter(Game.id == game_id).first()
+        game = await self._get_game(db, user, game_id)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -267,119 +369,180 @@ class GameService:
         
         from_foreign_language_gamewords_dict: dict[str, GameWord] = {}
         from_your_language_gamewords_dict: dict[str, GameWord] = {}
-        game_words: List[GameWord] = game.words
+        game_words: List[GameWord] = (await db.execute(
+            select(GameWord)
+                .options(joinedload(GameWord.word))
+                .where(GameWord.game_id == game.id)
+        )).scalars().all()
         for game_word in game_words:
             if game_word.word.language == game.language:
                 from_foreign_language_gamewords_dict[game_word.word.text] = game_word
             else:
                 from_your_language_gamewords_dict[game_word.word.text] = game_word
 
-        n_from_foreign_language_valid_attemps, n_from_foreign_language_correct_answers = self._verify_answers(
-            db,
-            user,
-            game,
+        language_vocabulary = await self.vocabulary_index.get_async(db, game.language)
+        answered_game_words: List[Tuple[GameWord, bool]] = []
+        self._verify_answers(
+            language_vocabulary,
             from_foreign_language_translation_candidates,
             from_foreign_language_gamewords_dict,
+            answered_game_words
         )
-        n_from_your_language_valid_attemps, n_from_your_language_correct_answers = self._verify_answers(
-            db,
-            user,
-            game,
+        self._verify_answers(
+            language_vocabulary,
             from_your_language_translation_candidates,
             from_your_language_gamewords_dict,
+            answered_game_words
         )
+        # only the words claimed by this request are scored: a concurrent request answering the same
+        # words (a retry, another tab) claims each of them at most once
+        n_verified_correct_answers = sum(is_correct for _, is_correct in answered_game_words)
+        n_verified_wrong_answers = len(answered_game_words) - n_verified_correct_answers
+        answered_game_words = await self._save_answers(db, user, game, answered_game_words)
 
-        n_valid_attempts = n_from_foreign_language_valid_attemps + n_from_your_language_valid_attemps
-        n_correct_answers = n_from_foreign_language_correct_answers + n_from_your_language_correct_answers
+        n_valid_attempts = len(answered_game_words)
+        n_correct_answers = sum(is_correct for _, is_correct in answered_game_words)
         round_score_percentage = calculate_score_percentage(n_correct_answers, n_valid_attempts)
 
-        remaining_words_to_guess_from_foreign_language = [
-            game_word.word.text
-            for game_word in from_foreign_language_gamewords_dict.values()
-            if game_word.word.language == game.language
-        ]
-        remaining_words_to_guess_from_your_language = [
-            game_word.word.text
-            for game_word in from_your_language_gamewords_dict.values()
-            if game_word.word.language != game.language
-        ]
+        # incremented in place: the row stays locked until commit, so the words read below
+        # include those claimed by the requests committed before this one
+        game_n_correct_answers = (await db.execute(
+            update(Game)
+                .where(Game.id == game.id)
+                .values(n_correct_answers=Game.n_correct_answers + n_correct_answers)
+                .returning(Game.n_correct_answers)
+                .execution_options(synchronize_session=False)
+        )).scalar_one()
+        remaining_words_to_guess_from_foreign_language, remaining_words_to_guess_from_your_language = await self._get_words_to_guess(db, game)
         n_remaining_words_to_guess = len(remaining_words_to_guess_from_foreign_language) + len(remaining_words_to_guess_from_your_language)
-    
-        game.n_correct_answers = game.n_correct_answers + n_correct_answers
-        if n_remaining_words_to_guess == 0:
-            game.is_active = False
-        db.commit()
-        db.refresh(game)
 
-        n_game_answers = game.n_words_to_guess - n_remaining_words_to_guess
-        game_score_percentage = calculate_score_percentage(game.n_correct_answers, n_game_answers)
-        
-        game = GameDetailOutputModel(
+        if n_remaining_words_to_guess == 0:
+            await db.execute(
+                update(Game)
+                    .where(Game.id == game.id)
+                    .values(is_active=False)
+                    .execution_options(synchronize_session=False)
+            )
+        game_output_model = GameDetailOutputModel(
             id=game.id,
             language=game.language,
             n_words_to_guess=game.n_words_to_guess,
             n_vocabulary=game.n_vocabulary,
-            n_correct_answers=game.n_correct_answers,
+            n_correct_answers=game_n_correct_answers,
             n_remaining_words_to_guess=n_remaining_words_to_guess,
-            game_score_percentage=game_score_percentage,
+            game_score_percentage=calculate_score_percentage(
+                game_n_correct_answers,
+                game.n_words_to_guess - n_remaining_words_to_guess
+            ),
             from_foreign_language=remaining_words_to_guess_from_foreign_language,
             from_your_language=remaining_words_to_guess_from_your_language,
         ).model_dump()
-        return game, round_score_percentage
+        await db.commit()
+        ANSWERS_VERIFIED.labels(game_output_model["language"], "correct").inc(n_verified_correct_answers)
+        ANSWERS_VERIFIED.labels(game_output_model["language"], "wrong").inc(n_verified_wrong_answers)
+        WORDS_SCORED.labels(game_output_model["language"]).inc(n_valid_attempts)
+        return game_output_model, round_score_percentage
+
+    async def _get_game(self, db: AsyncSession, user: User | UserPrincipal, game_id: int) -> Game | None:
+        return (await db.execute(
+            select(Game).where(Game.user_id == user.id).where(Game.id == game_id)
+        )).scalars().first()
+
+    async def _get_words_to_guess(self, db: AsyncSession, game: Game) -> Tuple[List[str], List[str]]:
+        """
+        Return the texts of the words left to guess in a game, split in (from foreign language, from your language).
+        """
+        words_to_guess_from_foreign_language = []
+        words_to_guess_from_your_language = []
+        for word_text, word_language in await db.execute(
+            select(Word.text, Word.language)
+                .join(GameWord, GameWord.word_id == Word.id)
+                .where(GameWord.game_id == game.id)
+                .order_by(GameWord.id)
+        ):
+            if word_language == game.language:
+                words_to_guess_from_foreign_language.append(word_text)
+            else:
+                words_to_guess_from_your_language.append(word_text)
+        return words_to_guess_from_foreign_language, words_to_guess_from_your_language
 
     def _verify_answers(
         self,
-        db: Session,
-        user: User,
-        game: Game,
+        language_vocabulary: LanguageVocabulary,
         answers: dict[str, str],
-        solutions: dict[str, GameWord]
+        solutions: dict[str, GameWord],
+        answered_game_words: List[Tuple[GameWord, bool]]
     ):
-        n_valid_attempts = 0
-        n_correct_answers = 0
-
         for word_text, word_candidate_translation_text in answers.items():
             word_text = word_text.lower()
-            word_candidate_translation_text = word_candidate_translation_text.lower()
-            if word_text in list(solutions.keys()):
-                game_word = solutions[word_text]
-                word = game_word.word
-                n_valid_attempts += 1
-                if game.language == word.language:
-                    correct_solutions_gt: List[str] = [
-                        word_translation.translation.text
-                        for word_translation in word.associated_translations
-                        if word_translation.translation.language == USER_LANGUAGE
-                    ]
-                else:
-                    # if word is not in game language, it is to translate in game language
-                    # then the possible solutions are all words in game language associated with that translation
-                    correct_solutions_gt: List[str] = [
-                        translation_word.word.text
-                        for translation_word in word.associated_words
-                        if translation_word.word.language == game.language
-                    ]
-                if word_candidate_translation_text in correct_solutions_gt:
-                    correct_answer_increment = 1
-                    n_correct_answers += 1
-                else:
-                    correct_answer_increment = 0
-                solutions.pop(word_text)
-                db.delete(game_word)
-                stat = db.query(Stat).filter(Stat.user_id == user.id).filter(Stat.word_id == word.id).first()
-                if not stat:
-                    db.add(
-                        Stat(
-                            user_id=user.id,
-                            word_id=word.id,
-                            language=game.language,
-                            n_appearances=1,
-                            n_correct_answers=correct_answer_increment,
-                        )
-                    )
-                else:
-                    stat.n_appearances += 1
-                    stat.n_correct_answers += correct_answer_increment
-                db.commit()
-        
-        return n_valid_attempts, n_correct_answers
\ No newline at end of file
+            if word_text in solutions:
+                game_word = solutions.pop(word_text)
+                # words in game language are answered with their translations, user language words
+                # with all the words in game language they translate: the index holds both directions
+                is_correct = language_vocabulary.is_correct_answer(game_word.word_id, word_candidate_translation_text)
+                answered_game_words.append((game_word, is_correct))
+
+    async def _save_answers(
+        self,
+        db: AsyncSession,
+        user: User | UserPrincipal,
+        game: Game,
+        answered_game_words: List[Tuple[GameWord, bool]]
+    ) -> List[Tuple[GameWord, bool]]:
+        """
+        Claim the answered words, removing them from the game, and add the claimed ones to the user stats.
+        Returns the answers whose word was claimed. The caller is in charge of committing.
+        """
+        if not answered_game_words:
+            return []
+        # rows are locked in id order before being deleted, so that concurrent requests cannot deadlock:
+        # a row deleted by a request committed meanwhile is skipped once its lock is released
+        game_word_ids = [game_word.id for game_word, _ in answered_game_words]
+        locked_game_words = (
+            select(GameWord.id)
+                .where(GameWord.id == any_(array_parameter(game_word_ids, Integer)))
+                .order_by(GameWord.id)
+                .with_for_update()
+                .cte("locked_game_words")
+        )
+        claimed_game_word_ids = set((await db.execute(
+            delete(GameWord)
+                .where(GameWord.id == locked_game_words.c.id)
+                .returning(GameWord.id)
+                .execution_options(synchronize_session=False)
+        )).scalars())
+        answered_game_words = [
+            (game_word, is_correct)
+            for game_word, is_correct in answered_game_words
+            if game_word.id in claimed_game_word_ids
+        ]
+        if not answered_game_words:
+            return []
+        stat_increments: dict[int, list[int]] = {}
+        for game_word, is_correct in answered_game_words:
+            increments = stat_increments.setdefault(game_word.word_id, [0, 0])
+            increments[0] += 1
+            increments[1] += int(is_correct)
+        word_ids = sorted(stat_increments)
+        stats_insert = insert(Stat).from_select(
+            [Stat.user_id, Stat.word_id, Stat.language, Stat.n_appearances, Stat.n_correct_answers],
+            select(
+                literal(user.id),
+                func.unnest(array_parameter(word_ids, Integer)),
+                literal(game.language),
+                func.unnest(array_parameter([stat_increments[word_id][0] for word_id in word_ids], Integer)),
+                func.unnest(array_parameter([stat_increments[word_id][1] for word_id in word_ids], Integer)),
+            )
+        )
+        await db.execute(
+            stats_insert.on_conflict_do_update(
+                index_elements=[Stat.user_id, Stat.word_id],
+                set_={
+                    Stat.n_appearances: Stat.n_appearances + stats_insert.excluded.n_appearances,
+                    Stat.n_correct_answers: Stat.n_correct_answers + stats_insert.excluded.n_correct_answers,
+                    # drawn again, so that the stats found more often by the probes of a user do not stay the same
+                    Stat.sample_key: func.random(),
+                }
+            )
+        )
+        return answered_game_words
@@ -0,0 +1,180 @@
+import os
+import unicodedata
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set
+
+# leading articles ignored in answers, by answer language
+ARTICLES: Dict[str, FrozenSet[str]] = {
+    "english": frozenset({"the", "a", "an", "to"}),
+    "german": frozenset({"der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer", "eines"}),
+    "italian": frozenset({"il", "lo", "la", "i", "gli", "le", "un", "uno", "una"}),
+}
+# articles glued to the following word, e.g. "l'uomo"
+ELIDED_ARTICLES: Dict[str, tuple[str, ...]] = {
+    "italian": ("l'", "un'"),
+}
+APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'"})
+# umlauts can be typed either transliterated or without dots: an answer is folded both ways
+CHARACTER_FOLDINGS = (
+    str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"}),
+    str.maketrans({"ä": "a", "ö": "o", "ü": "u", "ß": "ss"}),
+)
+
+
+class AnswerMatchingPolicy:
+    """
+    How lenient answer checking is.
+
+    Attributes:
+        fold_characters (bool): Whether umlauts, ß and accents may be transliterated or dropped.
+        strip_articles (bool): Whether a leading article is ignored.
+        max_edit_distance (int): Max number of typos (insertions, deletions, substitutions, transpositions) accepted.
+        min_length_per_edit (int): Number of characters an answer needs for each accepted typo,
+            so that short words must be typed exactly.
+    """
+    def __init__(
+        self,
+        fold_characters: bool = True,
+        strip_articles: bool = True,
+        max_edit_distance: int = 1,
+        min_length_per_edit: int = 4
+    ):
+        self.fold_characters = fold_characters
+        self.strip_articles = strip_articles
+        self.max_edit_distance = max_edit_distance
+        self.min_length_per_edit = min_length_per_edit
+
+    def get_allowed_edit_distance(self, answer: str) -> int:
+        return min(self.max_edit_distance, len(answer) // self.min_length_per_edit)
+
+
+ANSWER_MATCHING_POLICIES: Dict[str, AnswerMatchingPolicy] = {
+    "exact": AnswerMatchingPolicy(fold_characters=False, strip_articles=False, max_edit_distance=0),
+    "normalized": AnswerMatchingPolicy(max_edit_distance=0),
+    "lenient": AnswerMatchingPolicy(max_edit_distance=1),
+}
+# typos are opt-in: one edit away from a word there is often another word (land, hand, band, wand)
+ANSWER_MATCHING_TOLERANCE = os.getenv("ANSWER_MATCHING_TOLERANCE", "normalized")
+
+
+def get_answer_matching_policy(tolerance: str = ANSWER_MATCHING_TOLERANCE) -> AnswerMatchingPolicy:
+    return ANSWER_MATCHING_POLICIES[tolerance]
+
+
+def strip_accents(text: str) -> str:
+    return "".join(
+        character for character in unicodedata.normalize("NFKD", text)
+        if not unicodedata.combining(character)
+    )
+
+
+def normalize_answer(text: str, language: str, policy: AnswerMatchingPolicy) -> Set[str]:
+    """
+    Return the normalized spellings of an answer written in the given language.
+    """
+    text = " ".join(text.lower().translate(APOSTROPHES).split())
+    if policy.strip_articles:
+        first_word, _, rest = text.partition(" ")
+        if rest and first_word in ARTICLES.get(language, ()):
+            text = rest
+        for article in ELIDED_ARTICLES.get(language, ()):
+            if text.startswith(article) and len(text) > len(article):
+                text = text[len(article):]
+                break
+    if not policy.fold_characters:
+        return {text}
+    return {strip_accents(text.translate(folding)) for folding in CHARACTER_FOLDINGS}
+
+
+def get_normalized_spellings(texts: Iterable[str], language: str, policy: AnswerMatchingPolicy) -> List[str]:
+    """
+    Return the sorted normalized spellings of words written in the given language.
+    """
+    return sorted({variant for text in texts for variant in normalize_answer(text, language, policy)})
+
+
+def get_deletes(text: str, max_distance: int) -> Set[str]:
+    """
+    Return the deletion neighborhood of a text: all the strings obtained removing up to max_distance characters.
+    """
+    deletes = {text}
+    frontier = {text}
+    for _ in range(max_distance):
+        frontier = {
+            candidate[:index] + candidate[index + 1:]
+            for candidate in frontier
+            for index in range(len(candidate))
+        }
+        deletes |= frontier
+    return deletes
+
+
+def get_edit_distance(source: str, target: str) -> int:
+    """
+    Optimal string alignment distance: Levenshtein distance where swapping adjacent characters costs one edit.
+    """
+    previous_previous_row = None
+    previous_row = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        row = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if (
+                previous_previous_row is not None
+                and i > 1 and j > 1
+                and source[i - 1] == target[j - 2]
+                and source[i - 2] == target[j - 1]
+            ):
+                row[j] = min(row[j], previous_previous_row[j - 2] + 1)
+        previous_previous_row, previous_row = previous_row, row
+    return previous_row[-1]
+
+
+class AnswerMatcher:
+    """
+    Precomputed index of the accepted answers for one word.
+
+    Answers are stored normalized for an exact hash lookup, and, when typos are accepted, expanded
+    into their deletion neighborhood (symmetric delete): a candidate only needs to generate its own
+    deletes and look them up, so a lenient check costs O(len(candidate) ** max_edit_distance)
+    lookups, independently of the vocabulary size.
+
+    A candidate within typo distance of an answer is still rejected when it is itself a known word of the
+    answer language, as told by is_known_word on its normalized spellings: it is a wrong answer, not a typo.
+    """
+    def __init__(
+        self,
+        answers: Iterable[str],
+        language: str,
+        policy: AnswerMatchingPolicy,
+        is_known_word: Callable[[str], bool] | None = None
+    ):
+        self.language = language
+        self.policy = policy
+        self.is_known_word = is_known_word
+        self.answers: FrozenSet[str] = frozenset(
+            variant for answer in answers for variant in normalize_answer(answer, language, policy)
+        )
+        self.max_edit_distance = max(
+            (policy.get_allowed_edit_distance(answer) for answer in self.answers),
+            default=0
+        )
+        self.deletes: Dict[str, Set[str]] = {}
+        for answer in self.answers:
+            for delete in get_deletes(answer, policy.get_allowed_edit_distance(answer)):
+                self.deletes.setdefault(delete, set()).add(answer)
+
+    def matches(self, candidate: str) -> bool:
+        candidate_variants = normalize_answer(candidate, self.language, self.policy)
+        if not candidate_variants.isdisjoint(self.answers):
+            return True
+        if self.max_edit_distance == 0:
+            return False
+        if self.is_known_word is not None and any(map(self.is_known_word, candidate_variants)):
+            return False
+        for candidate_variant in candidate_variants:
+            for delete in get_deletes(candidate_variant, self.max_edit_distance):
+                for answer in self.deletes.get(delete, ()):
+                    if get_edit_distance(candidate_variant, answer) <= self.policy.get_allowed_edit_distance(answer):
+                        return True
+        return False
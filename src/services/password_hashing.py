@@ -0,0 +1,97 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
+from fastapi import HTTPException, status
+from src.metrics import (
+    PASSWORD_HASHING_DURATION,
+    PASSWORD_HASHING_QUEUE_DEPTH,
+    PASSWORD_HASHING_REJECTED,
+    PASSWORD_HASHING_WAIT,
+)
+
+# bcrypt releases the GIL while hashing, so threads hash in parallel without the cost of a process pool
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", min(4, os.cpu_count() or 1)))
+# jobs queued or running beyond which new ones are rejected: with bcrypt taking about 250 ms,
+# a full queue is already seconds of waiting for the last login
+PASSWORD_HASHING_MAX_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASHING_MAX_QUEUE_DEPTH", 8 * PASSWORD_HASHING_WORKERS))
+PASSWORD_HASHING_RETRY_AFTER_SECONDS = 1
+
+PASSWORD_HASHING_OVERLOADED_EXCEPTION = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail={
+        "error": "Too many login attempts are being processed",
+        "resolution": "Please try again in a few seconds"
+    },
+    headers={"Retry-After": str(PASSWORD_HASHING_RETRY_AFTER_SECONDS)},
+)
+
+T = TypeVar("T")
+
+
+class PasswordHashingPool:
+    """
+    Bounded thread pool running the password hashing and verification off the event loop.
+
+    A burst of logins queues up in the pool instead of freezing every other request of the worker,
+    and once the queue is full further jobs are rejected right away with a 503.
+
+    Attributes:
+        max_workers (int): Number of threads hashing passwords.
+        max_queue_depth (int): Max number of jobs queued or running.
+        queue_depth (int): Number of jobs queued or running.
+    """
+    def __init__(
+        self,
+        max_workers: int = PASSWORD_HASHING_WORKERS,
+        max_queue_depth: int = PASSWORD_HASHING_MAX_QUEUE_DEPTH
+    ):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.queue_depth = 0
+        self._lock = threading.Lock()
+        # created on first use, so that forked workers do not inherit the threads of the master
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def run(self, operation: str, function: Callable[..., T], *args) -> T:
+        """
+        Run function(*args) in the pool and wait for its result without blocking the event loop.
+        """
+        with self._lock:
+            if self.queue_depth >= self.max_queue_depth:
+                PASSWORD_HASHING_REJECTED.inc()
+                raise PASSWORD_HASHING_OVERLOADED_EXCEPTION
+            self.queue_depth += 1
+            PASSWORD_HASHING_QUEUE_DEPTH.set(self.queue_depth)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="password-hashing")
+        submitted_at = time.perf_counter()
+
+        def timed_function() -> T:
+            started_at = time.perf_counter()
+            PASSWORD_HASHING_WAIT.observe(started_at - submitted_at)
+            try:
+                return function(*args)
+            finally:
+                PASSWORD_HASHING_DURATION.labels(operation).observe(time.perf_counter() - started_at)
+
+        future = self._executor.submit(timed_function)
+        # the job is accounted for until it finishes, even when the request awaiting it is cancelled
+        future.add_done_callback(self._on_job_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_job_done(self, future: Future) -> None:
+        with self._lock:
+            self.queue_depth -= 1
+            PASSWORD_HASHING_QUEUE_DEPTH.set(self.queue_depth)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+password_hashing_pool = PasswordHashingPool()
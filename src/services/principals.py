@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+# how long a worker trusts a cached principal, as a bound on staleness should an invalidation be lost
+USER_PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("USER_PRINCIPAL_CACHE_TTL_SECONDS", 60))
+# max number of principals kept by every worker, 0 disables the cache
+USER_PRINCIPAL_CACHE_SIZE = int(os.getenv("USER_PRINCIPAL_CACHE_SIZE", 10000))
+
+
+class UserPrincipal(NamedTuple):
+    """
+    Lightweight, read-only stand-in for the authenticated User row, for the routes needing only its identity.
+    """
+    id: int
+    username: str
+    is_verified: bool
+
+
+class UserPrincipalCache:
+    """
+    Per-process TTL cache of the principals of the authenticated users, keyed by token subject (username),
+    so that authenticated routes do not query the users table on every request.
+
+    Deletions, verifications and password changes are published on a redis channel (see publish_user_change)
+    and the invalidation listener evicts the changed users. Like the verified token cache, it is only used
+    while the listener is subscribed.
+
+    Attributes:
+        max_size (int): Max number of cached principals.
+        ttl_seconds (float): How long a principal is cached.
+        is_enabled (bool): Whether the invalidation listener is subscribed, hence the cache can be used.
+        generation (int): Number of invalidations seen: a principal loaded before an invalidation is not cached,
+            since it may be the changed user.
+    """
+    def __init__(self, max_size: int = USER_PRINCIPAL_CACHE_SIZE, ttl_seconds: float = USER_PRINCIPAL_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.is_enabled = False
+        self.generation = 0
+        # username -> (expiration time, principal)
+        self._principals: OrderedDict[str, Tuple[float, UserPrincipal]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> UserPrincipal | None:
+        if not self.is_enabled:
+            return None
+        with self._lock:
+            entry = self._principals.get(username)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at <= time.monotonic():
+                del self._principals[username]
+                return None
+            self._principals.move_to_end(username)
+            return principal
+
+    def put(self, principal: UserPrincipal, generation: int) -> None:
+        """
+        Cache a principal loaded while the cache was at the given generation.
+        """
+        if not self.is_enabled:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._principals[principal.username] = (time.monotonic() + self.ttl_seconds, principal)
+            self._principals.move_to_end(principal.username)
+            while len(self._principals) > self.max_size:
+                self._principals.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self.generation += 1
+            self._principals.pop(username, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._principals.clear()
+
+    def enable(self) -> None:
+        self.clear()
+        self.is_enabled = self.max_size > 0 and self.ttl_seconds > 0
+
+    def disable(self) -> None:
+        self.is_enabled = False
+        self.clear()
+
+    def __len__(self):
+        return len(self._principals)
+
+
+user_principal_cache = UserPrincipalCache()
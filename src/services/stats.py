@@ -1,7 +1,11 @@
-from sqlalchemy.orm import Session
-from src.db.models import Stat, User, Word
+from sqlalchemy import Integer, any_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from src.db.models import Stat, User, Word, WordTranslation
+from src.db.vocabulary import array_parameter
 from src.schemas.stats import StatOutputModel
-from typing import List
+from src.services.principals import UserPrincipal
+from typing import Dict, List
 from src.utils import calculate_score_percentage
 
 
@@ -9,28 +13,59 @@ class StatService:
     def __init__(self):
         pass
 
-    def get_stats_for_user(self, db: Session, user: User, language) -> List[StatOutputModel]:
-        stats_query = db.query(Stat).filter(Stat.user_id == user.id)
+    async def get_stats_for_user(self, db: AsyncSession, user: User | UserPrincipal, language) -> List[StatOutputModel]:
+        stats_query = (
+            select(Stat.word_id, Word.text, Word.language, Stat.language, Stat.n_appearances, Stat.n_correct_answers)
+                .join(Word, Word.id == Stat.word_id)
+                .where(Stat.user_id == user.id)
+        )
         if language:
-            stats_query = stats_query.join(Stat.word).filter(Stat.language == language)
+            stats_query = stats_query.where(Stat.language == language)
             # order by: foreign->user language translations before user->foreign, then stat score asc, then alphabetical order asc
-            stats_query = stats_query.order_by(Word.language != language, Stat.n_correct_answers / Stat.n_appearances, Word.text)
-        stats = stats_query.all()
-        print(stats)
+            stats_query = stats_query.order_by(Word.language != language, Stat.score, Word.text)
+        stats = (await db.execute(stats_query)).all()
+        translations = await self._get_translations(
+            db,
+            [word_id for word_id, _, word_language, stat_language, _, _ in stats if stat_language == word_language],
+            [word_id for word_id, _, word_language, stat_language, _, _ in stats if stat_language != word_language],
+        )
         stats_output_model = []
-        for stat in stats:
-            if stat.language == stat.word.language:
-                translations=[word_translation.translation.text for word_translation in stat.word.associated_translations]
-            else:
-                translations=[translation_words.word.text for translation_words in stat.word.associated_words]
+        for word_id, word_text, word_language, stat_language, n_appearances, n_correct_answers in stats:
             stat_output_model = StatOutputModel(
-                word=stat.word.text,
-                translations=translations,
-                language=stat.language,
-                word_language=stat.word.language,
-                n_appearances=stat.n_appearances,
-                n_correct_answers=stat.n_correct_answers,
-                total_score_percent=calculate_score_percentage(stat.n_correct_answers,stat.n_appearances)
+                word=word_text,
+                translations=translations.get(word_id, []),
+                language=stat_language,
+                word_language=word_language,
+                n_appearances=n_appearances,
+                n_correct_answers=n_correct_answers,
+                total_score_percent=calculate_score_percentage(n_correct_answers, n_appearances)
             )
             stats_output_model.append(stat_output_model)
-        return stats_output_model
\ No newline at end of file
+        return stats_output_model
+
+    async def _get_translations(
+        self,
+        db: AsyncSession,
+        foreign_word_ids: List[int],
+        your_language_word_ids: List[int]
+    ) -> Dict[int, List[str]]:
+        """
+        Return the translations of the given words, with one query per direction:
+        foreign words are translated by their translations, user language words by the words they translate.
+        """
+        translations: Dict[int, List[str]] = {}
+        OtherWord = aliased(Word)
+        for word_ids, word_id_column, other_word_id_column in (
+            (foreign_word_ids, WordTranslation.word_id, WordTranslation.translation_id),
+            (your_language_word_ids, WordTranslation.translation_id, WordTranslation.word_id),
+        ):
+            if not word_ids:
+                continue
+            for word_id, other_word_text in await db.execute(
+                select(word_id_column, OtherWord.text)
+                    .join(OtherWord, OtherWord.id == other_word_id_column)
+                    .where(word_id_column == any_(array_parameter(word_ids, Integer)))
+                    .order_by(WordTranslation.id)
+            ):
+                translations.setdefault(word_id, []).append(other_word_text)
+        return translations
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+
+# max number of verified tokens kept by every worker, 0 disables the cache
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", 10000))
+
+
+class VerifiedTokenCache:
+    """
+    Per-process LRU cache of the payloads of the tokens already decoded and checked against the blocklist,
+    kept until the tokens expire, so that authenticating a known token needs neither jwt.decode nor redis.
+
+    Revocations are published on a redis channel by every worker (see add_jti_to_blocklist) and the
+    invalidation listener evicts the revoked tokens. The cache is only used while the listener is
+    subscribed, since revocations published while it is disconnected are lost.
+
+    Attributes:
+        max_size (int): Max number of cached tokens.
+        is_enabled (bool): Whether the invalidation listener is subscribed, hence the cache can be used.
+        generation (int): Number of revocations seen: a token verified before a revocation is not cached,
+            since it may be the revoked one.
+    """
+    def __init__(self, max_size: int = VERIFIED_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.is_enabled = False
+        self.generation = 0
+        # token digest -> (jti, payload), the payloads are read-only copies shared by every request
+        self._payloads: OrderedDict[bytes, Tuple[str, Mapping[str, Any]]] = OrderedDict()
+        self._digests_by_jti: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Dict[str, Any] | None:
+        if not self.is_enabled:
+            return None
+        digest = self.get_digest(token)
+        with self._lock:
+            entry = self._payloads.get(digest)
+            if entry is None:
+                return None
+            _, payload = entry
+            if payload["exp"] <= time.time():
+                self._evict(digest)
+                return None
+            self._payloads.move_to_end(digest)
+        # a copy: the callers may change the payload they get
+        return dict(payload)
+
+    def put(self, token: str, payload: Dict[str, Any], generation: int) -> None:
+        """
+        Cache the payload of a token verified while the cache was at the given generation.
+        """
+        if not self.is_enabled or self.max_size <= 0:
+            return
+        digest = self.get_digest(token)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._payloads[digest] = (payload["jti"], MappingProxyType(dict(payload)))
+            self._payloads.move_to_end(digest)
+            self._digests_by_jti[payload["jti"]] = digest
+            while len(self._payloads) > self.max_size:
+                self._evict(next(iter(self._payloads)))
+
+    def invalidate(self, jti: str) -> None:
+        with self._lock:
+            self.generation += 1
+            digest = self._digests_by_jti.get(jti)
+            if digest is not None:
+                self._evict(digest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._payloads.clear()
+            self._digests_by_jti.clear()
+
+    def enable(self) -> None:
+        self.clear()
+        self.is_enabled = self.max_size > 0
+
+    def disable(self) -> None:
+        self.is_enabled = False
+        self.clear()
+
+    def _evict(self, digest: bytes) -> None:
+        jti, _ = self._payloads.pop(digest)
+        self._digests_by_jti.pop(jti, None)
+
+    def __len__(self):
+        return len(self._payloads)
+
+
+verified_token_cache = VerifiedTokenCache()
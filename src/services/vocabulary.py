@@ -0,0 +1,279 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from typing import Callable, Container, Dict, FrozenSet, NamedTuple, Sequence, Set, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from src.db.models import SessionLocal, VocabularyImportCheckpoint, VocabularyManifest, Word, WordTranslation, USER_LANGUAGE
+from src.db.snapshot import get_sorted_positions, get_vocabulary_snapshot
+from src.services.matching import (
+    AnswerMatcher,
+    AnswerMatchingPolicy,
+    get_answer_matching_policy,
+    get_normalized_spellings
+)
+
+# how often an index checks whether the vocabulary of a language changed in the database
+VOCABULARY_INDEX_CHECK_INTERVAL_SECONDS = float(os.getenv("VOCABULARY_INDEX_CHECK_INTERVAL_SECONDS", 30))
+
+
+class IndexedWord(NamedTuple):
+    """
+    Lightweight, read-only stand-in for a Word row.
+    """
+    id: int
+    text: str
+    language: str
+
+
+class LanguageVocabulary:
+    """
+    Word translations of a language ordered by frequency rank.
+
+    Answers are looked up when a word is first answered, by binary search over the positions of the
+    translations sorted by word id and by translation id: no text is decoded ahead of time, so that
+    workers serving from the shared snapshot do not each hold a copy of the vocabulary strings. For the same
+    reason, the normalized spellings that tell a wrong answer from a typo are searched in the snapshot.
+
+    Attributes:
+        language (str): The language of the vocabulary.
+        word_ids (Sequence[int]): Ids of the words in the language, most frequent first.
+        translation_ids (Sequence[int]): Ids of the translations, parallel to word_ids.
+        word_positions (Sequence[int]): Positions in word_ids, sorted by word id.
+        translation_positions (Sequence[int]): Positions in translation_ids, sorted by translation id.
+        known_words (Dict[str, Container[str]]): Normalized spellings of the words of the vocabulary,
+            by answer language: the vocabulary language and the user language of the translations.
+        version (Tuple): Version of the vocabulary in the database when the index was loaded.
+    """
+    def __init__(
+        self,
+        language: str,
+        word_ids: Sequence[int],
+        translation_ids: Sequence[int],
+        get_word: Callable[[int], IndexedWord],
+        version: Tuple,
+        answer_matching_policy: AnswerMatchingPolicy | None = None,
+        answer_index: Tuple[Sequence[int], Sequence[int]] | None = None,
+        known_words: Dict[str, Container[str]] | None = None
+    ):
+        self.language = language
+        self.word_ids = word_ids
+        self.translation_ids = translation_ids
+        self.get_word = get_word
+        self.version = version
+        self.checked_at = time.monotonic()
+        if answer_index is None:
+            answer_index = (get_sorted_positions(word_ids), get_sorted_positions(translation_ids))
+        self.word_positions, self.translation_positions = answer_index
+        self.answer_matching_policy = answer_matching_policy or get_answer_matching_policy()
+        if known_words is None:
+            known_words = {
+                answer_language: frozenset(get_normalized_spellings(
+                    (get_word(word_id).text for word_id in set(ids)), answer_language, self.answer_matching_policy
+                ))
+                for answer_language, ids in ((language, word_ids), (USER_LANGUAGE, translation_ids))
+            }
+        self.known_words = known_words
+        # matchers are built the first time a word is answered, then kept for the lifetime of the vocabulary
+        self._answer_matchers: Dict[int, AnswerMatcher] = {}
+
+    def __len__(self):
+        return len(self.word_ids)
+
+    def get_answers(self, word_id: int) -> Tuple[FrozenSet[str], str]:
+        """
+        Return the accepted answers for a word, in both directions, and their language: the translations
+        of a word in the language, or the words in the language translated by a user language word.
+        """
+        translations = self._get_paired_texts(word_id, self.word_positions, self.word_ids, self.translation_ids)
+        if translations:
+            return translations, USER_LANGUAGE
+        words = self._get_paired_texts(word_id, self.translation_positions, self.translation_ids, self.word_ids)
+        return words, self.language
+
+    def _get_paired_texts(
+        self,
+        id: int,
+        positions: Sequence[int],
+        ids: Sequence[int],
+        paired_ids: Sequence[int]
+    ) -> FrozenSet[str]:
+        texts: Set[str] = set()
+        index = bisect_left(positions, id, key=ids.__getitem__)
+        while index < len(positions) and ids[positions[index]] == id:
+            texts.add(self.get_word(paired_ids[positions[index]]).text)
+            index += 1
+        return frozenset(texts)
+
+    def get_answer_matcher(self, word_id: int) -> AnswerMatcher | None:
+        """
+        Return the matcher of the answers for a word, or None if the word is not in the vocabulary.
+        """
+        answer_matcher = self._answer_matchers.get(word_id)
+        if answer_matcher is None:
+            answers, answer_language = self.get_answers(word_id)
+            if not answers:
+                return None
+            answer_matcher = AnswerMatcher(
+                answers,
+                answer_language,
+                self.answer_matching_policy,
+                functools.partial(self.is_known_word, answer_language)
+            )
+            self._answer_matchers[word_id] = answer_matcher
+        return answer_matcher
+
+    def is_known_word(self, language: str, normalized_text: str) -> bool:
+        """
+        Whether a normalized answer is the spelling of a word of the vocabulary in the given language:
+        the vocabulary language, or the user language of the translations.
+        """
+        return normalized_text in self.known_words[language]
+
+    def is_correct_answer(self, word_id: int, candidate: str) -> bool:
+        answer_matcher = self.get_answer_matcher(word_id)
+        return answer_matcher is not None and answer_matcher.matches(candidate)
+
+
+class VocabularyIndex:
+    """
+    Per-process cache of the vocabulary of every language, used to build games without querying the words tables.
+
+    Vocabularies are loaded lazily from the memory-mapped snapshot, when an up to date one is available,
+    or from the database. Every VOCABULARY_INDEX_CHECK_INTERVAL_SECONDS a cheap query on the vocabulary
+    manifest tells whether the language has been synced since, in which case it is loaded again.
+
+    Attributes:
+        check_interval_seconds (float): How long a vocabulary is served before checking its version again.
+        session_factory (Callable[[], Session]): Sync sessions the async callers load vocabularies with,
+            on a worker thread.
+    """
+    def __init__(
+        self,
+        check_interval_seconds: float = VOCABULARY_INDEX_CHECK_INTERVAL_SECONDS,
+        session_factory: Callable[[], Session] = SessionLocal
+    ):
+        self.check_interval_seconds = check_interval_seconds
+        self.session_factory = session_factory
+        self._vocabularies: Dict[str, LanguageVocabulary] = {}
+        self._lock = threading.Lock()
+        # the threading lock cannot be held across awaits: coroutines reloading a vocabulary
+        # are serialized by a lock of their event loop instead
+        self._async_locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock] = weakref.WeakKeyDictionary()
+
+    def get(self, db: Session, language: str) -> LanguageVocabulary:
+        vocabulary = self._vocabularies.get(language)
+        if vocabulary is not None and time.monotonic() - vocabulary.checked_at < self.check_interval_seconds:
+            return vocabulary
+        with self._lock:
+            vocabulary = self._vocabularies.get(language)
+            version = get_vocabulary_version(db, language)
+            if vocabulary is not None and vocabulary.version == version:
+                vocabulary.checked_at = time.monotonic()
+            else:
+                vocabulary = load_language_vocabulary(db, language, version)
+                self._vocabularies[language] = vocabulary
+            return vocabulary
+
+    async def get_async(self, db: AsyncSession, language: str) -> LanguageVocabulary:
+        vocabulary = self._vocabularies.get(language)
+        if vocabulary is not None and time.monotonic() - vocabulary.checked_at < self.check_interval_seconds:
+            return vocabulary
+        loop = asyncio.get_running_loop()
+        async_lock = self._async_locks.setdefault(loop, asyncio.Lock())
+        async with async_lock:
+            # checked again: another coroutine may have reloaded the vocabulary while this one waited
+            vocabulary = self._vocabularies.get(language)
+            if vocabulary is not None and time.monotonic() - vocabulary.checked_at < self.check_interval_seconds:
+                return vocabulary
+            version = await db.run_sync(get_vocabulary_version, language)
+            if vocabulary is not None and vocabulary.version == version:
+                vocabulary.checked_at = time.monotonic()
+            else:
+                # loading is CPU bound: on the event loop it would stall every request in flight
+                vocabulary = await run_in_threadpool(self._load, language, version)
+                with self._lock:
+                    self._vocabularies[language] = vocabulary
+            return vocabulary
+
+    def _load(self, language: str, version: Tuple) -> LanguageVocabulary:
+        with self.session_factory() as db:
+            return load_language_vocabulary(db, language, version)
+
+    def invalidate(self, language: str | None = None) -> None:
+        with self._lock:
+            if language is None:
+                self._vocabularies.clear()
+            else:
+                self._vocabularies.pop(language, None)
+
+
+def get_vocabulary_version(db: Session, language: str) -> Tuple[datetime | None, datetime | None]:
+    return tuple(db.execute(
+        select(
+            select(func.max(VocabularyManifest.updated_at))
+                .where(VocabularyManifest.language == language)
+                .scalar_subquery(),
+            select(func.max(VocabularyImportCheckpoint.updated_at))
+                .where(VocabularyImportCheckpoint.language == language)
+                .scalar_subquery(),
+        )
+    ).one())
+
+
+def load_language_vocabulary(db: Session, language: str, version: Tuple) -> LanguageVocabulary:
+    answer_matching_policy = get_answer_matching_policy()
+    snapshot = get_vocabulary_snapshot()
+    if snapshot is not None and language in snapshot.languages and snapshot.is_up_to_date(db):
+        word_ids, translation_ids, _ = snapshot.get_word_translations(language)
+
+        def get_word_from_snapshot(word_id: int) -> IndexedWord:
+            text, word_language = snapshot.get_word(word_id)
+            return IndexedWord(word_id, text, word_language)
+
+        return LanguageVocabulary(
+            language,
+            word_ids,
+            translation_ids,
+            get_word_from_snapshot,
+            version,
+            answer_matching_policy,
+            answer_index=snapshot.get_answer_index(language),
+            known_words=snapshot.get_known_words(language, answer_matching_policy)
+        )
+
+    SourceWord = aliased(Word)
+    TranslationWord = aliased(Word)
+    rows = db.execute(
+        select(
+            WordTranslation.word_id,
+            SourceWord.text,
+            WordTranslation.translation_id,
+            TranslationWord.text,
+            TranslationWord.language
+        )
+            .join(SourceWord, SourceWord.id == WordTranslation.word_id)
+            .join(TranslationWord, TranslationWord.id == WordTranslation.translation_id)
+            .where(SourceWord.language == language)
+            .order_by(WordTranslation.frequency, WordTranslation.id)
+    ).all()
+    words: Dict[int, IndexedWord] = {}
+    word_ids = array("i")
+    translation_ids = array("i")
+    for word_id, word_text, translation_id, translation_text, translation_language in rows:
+        word_ids.append(word_id)
+        translation_ids.append(translation_id)
+        words.setdefault(word_id, IndexedWord(word_id, word_text, language))
+        words.setdefault(translation_id, IndexedWord(translation_id, translation_text, translation_language))
+    return LanguageVocabulary(language, word_ids, translation_ids, words.__getitem__, version)
+
+
+vocabulary_index = VocabularyIndex()
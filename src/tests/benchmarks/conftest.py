@@ -0,0 +1,113 @@
+import random
+import socket
+import threading
+import time
+from unittest.mock import patch
+import pytest
+import uvicorn
+from sqlalchemy import Engine, Integer, String, func, literal, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, sessionmaker
+from src import app
+from src.db.models import Base, Game, GameWord, Stat, User, Word, import_csvs_to_db, USER_LANGUAGE
+from src.db.vocabulary import array_parameter, insert_word_translations
+from src.services.vocabulary import vocabulary_index
+from src.tests.benchmarks.dataset import BENCHMARK_DATASETS, BENCHMARK_GAME_SIZE, BENCHMARK_LANGUAGE, BenchmarkDataset
+from src.tests.utils import in_process_redis
+
+
+def truncate_tables(engine: Engine) -> None:
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"TRUNCATE {', '.join(table.name for table in Base.metadata.sorted_tables)} RESTART IDENTITY CASCADE"
+        ))
+    vocabulary_index.invalidate()
+
+
+def load_benchmark_dataset(db: Session, vocabulary_size: int, n_stats: int, seed: int = 0) -> BenchmarkDataset:
+    """
+    Load a vocabulary of vocabulary_size word translations, a user with n_stats stats on its words,
+    and an active game of BENCHMARK_GAME_SIZE words.
+    """
+    rng = random.Random(seed)
+    insert_word_translations(
+        db,
+        BENCHMARK_LANGUAGE,
+        {(f"wort{index}", f"word{index}"): index for index in range(vocabulary_size)}
+    )
+    user = User(username="benchmark_user", email="benchmark_user@benchmark.org", hashed_password="")
+    db.add(user)
+    db.flush()
+
+    word_ids = db.execute(
+        select(Word.id).where(Word.language.in_([BENCHMARK_LANGUAGE, USER_LANGUAGE])).order_by(Word.id)
+    ).scalars().all()
+    stat_word_ids = rng.sample(word_ids, n_stats)
+    n_appearances = [rng.randint(1, 20) for _ in stat_word_ids]
+    n_correct_answers = [rng.randint(0, n) for n in n_appearances]
+    db.execute(
+        insert(Stat).from_select(
+            [Stat.user_id, Stat.word_id, Stat.language, Stat.n_appearances, Stat.n_correct_answers],
+            select(
+                literal(user.id),
+                func.unnest(array_parameter(stat_word_ids, Integer)),
+                literal(BENCHMARK_LANGUAGE, String),
+                func.unnest(array_parameter(n_appearances, Integer)),
+                func.unnest(array_parameter(n_correct_answers, Integer)),
+            )
+        )
+    )
+
+    game = Game(
+        user_id=user.id,
+        language=BENCHMARK_LANGUAGE,
+        n_words_to_guess=BENCHMARK_GAME_SIZE,
+        n_vocabulary=vocabulary_size
+    )
+    db.add(game)
+    db.flush()
+    db.add_all(GameWord(game_id=game.id, word_id=word_id) for word_id in rng.sample(word_ids, BENCHMARK_GAME_SIZE))
+    db.commit()
+    return BenchmarkDataset(user.id, game.id, vocabulary_size, n_stats)
+
+
+@pytest.fixture(
+    scope="module",
+    params=BENCHMARK_DATASETS,
+    ids=[f"vocabulary{vocabulary_size}-stats{n_stats}" for vocabulary_size, n_stats in BENCHMARK_DATASETS]
+)
+def benchmark_dataset(request: pytest.FixtureRequest, postgres_engine: Engine):
+    truncate_tables(postgres_engine)
+    with sessionmaker(bind=postgres_engine)() as db:
+        dataset = load_benchmark_dataset(db, *request.param)
+    yield dataset
+    truncate_tables(postgres_engine)
+
+
+@pytest.fixture(scope="function")
+def redis_stand_in():
+    # in-process redis, so that benchmarks only need a database
+    with in_process_redis() as redis:
+        yield redis
+
+
+@pytest.fixture(scope="function")
+def live_server_url(override_get_db, postgres_engine: Engine, redis_stand_in):
+    """
+    Serve the app over http from a background thread, on the test database.
+    """
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    # the lifespan would initialize the database of the environment, not the test one
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    with patch("src.routes.users.BackgroundTasks.add_task"):
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        yield f"http://127.0.0.1:{port}"
+        server.should_exit = True
+        thread.join()
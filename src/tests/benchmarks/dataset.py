@@ -0,0 +1,13 @@
+from typing import NamedTuple
+
+BENCHMARK_LANGUAGE = "german"
+BENCHMARK_GAME_SIZE = 50
+# (vocabulary size, number of stats of the user): 10k stats need a vocabulary of more than 10k words
+BENCHMARK_DATASETS = [(1000, 10), (100000, 10), (100000, 10000)]
+
+
+class BenchmarkDataset(NamedTuple):
+    user_id: int
+    game_id: int
+    vocabulary_size: int
+    n_stats: int
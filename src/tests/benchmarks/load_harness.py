@@ -0,0 +1,206 @@
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+import httpx
+from src import version
+
+API_BASE_ROUTE = f"/api/{version}"
+LOAD_TEST_RESULTS_DIRECTORY = os.getenv("LOAD_TEST_RESULTS_DIRECTORY", ".benchmarks/load")
+
+
+class LoadTestConfig:
+    """
+    Shape of a load test run, configurable through LOAD_TEST_* environment variables.
+
+    Attributes:
+        n_users (int): Number of users registered and playing.
+        concurrency (int): Number of users playing at the same time.
+        n_games_per_user (int): Number of games played by every user.
+        n_words_to_guess (int): Words of every game.
+        n_answer_rounds (int): Number of answer submissions needed to end a game.
+        language (str): Language of the games.
+        seed (int): Seed of the random choices, for reproducible runs.
+    """
+    def __init__(
+        self,
+        n_users: int = 20,
+        concurrency: int = 5,
+        n_games_per_user: int = 3,
+        n_words_to_guess: int = 20,
+        n_answer_rounds: int = 2,
+        language: str = "german",
+        seed: int = 0
+    ):
+        self.n_users = n_users
+        self.concurrency = concurrency
+        self.n_games_per_user = n_games_per_user
+        self.n_words_to_guess = n_words_to_guess
+        self.n_answer_rounds = n_answer_rounds
+        self.language = language
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls) -> "LoadTestConfig":
+        defaults = cls()
+        return cls(
+            n_users=int(os.getenv("LOAD_TEST_USERS", defaults.n_users)),
+            concurrency=int(os.getenv("LOAD_TEST_CONCURRENCY", defaults.concurrency)),
+            n_games_per_user=int(os.getenv("LOAD_TEST_GAMES_PER_USER", defaults.n_games_per_user)),
+            n_words_to_guess=int(os.getenv("LOAD_TEST_WORDS_TO_GUESS", defaults.n_words_to_guess)),
+            n_answer_rounds=int(os.getenv("LOAD_TEST_ANSWER_ROUNDS", defaults.n_answer_rounds)),
+            language=os.getenv("LOAD_TEST_LANGUAGE", defaults.language),
+            seed=int(os.getenv("LOAD_TEST_SEED", defaults.seed)),
+        )
+
+
+class LatencyRecorder:
+    """
+    Thread-safe collection of request latencies and failures, by endpoint.
+    """
+    def __init__(self):
+        self._latencies: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def request(self, client: httpx.Client, endpoint: str, method: str, url: str, expected_status: int, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latencies.setdefault(endpoint, []).append(elapsed)
+            if response.status_code != expected_status:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+        return response
+
+    def summary(self, duration: float) -> Dict[str, dict]:
+        return {
+            endpoint: {
+                "n_requests": len(latencies),
+                "n_errors": self._errors.get(endpoint, 0),
+                "throughput_rps": round(len(latencies) / duration, 2),
+                **get_latency_percentiles(latencies),
+            }
+            for endpoint, latencies in self._latencies.items()
+        }
+
+
+def get_latency_percentiles(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        # nearest-rank percentile, in milliseconds
+        index = min(len(latencies) - 1, max(0, int(round(p / 100 * len(latencies) + 0.5)) - 1))
+        return round(1000 * latencies[index], 2)
+
+    return {
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 2),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(1000 * latencies[-1], 2),
+    }
+
+
+def play_user_session(base_url: str, config: LoadTestConfig, recorder: LatencyRecorder, user_index: int) -> None:
+    """
+    Register a user, get a token, play n_games_per_user games to the end, then read the user stats.
+    """
+    rng = random.Random(config.seed * 1000003 + user_index)
+    username = f"loadtest_user_{user_index}"
+    password = f"L04dT3st{user_index}"
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        recorder.request(
+            client, "register", "POST", f"{API_BASE_ROUTE}/users/register", 201,
+            json={"username": username, "password": password, "email": f"{username}@loadtest.org"}
+        )
+        response = recorder.request(
+            client, "get_access_token", "POST", f"{API_BASE_ROUTE}/users/get_access_token", 200,
+            data={"username": username, "password": password}
+        )
+        client.headers["Authorization"] = f"Bearer {response.json().get('access_token')}"
+
+        for _ in range(config.n_games_per_user):
+            response = recorder.request(
+                client, "games_new", "POST", f"{API_BASE_ROUTE}/games/new", 201,
+                json={
+                    "language": config.language,
+                    "n_vocabulary": 500,
+                    "n_words_to_guess": config.n_words_to_guess,
+                    "type": rng.choice(["random", "random", "hard", "recap"]),
+                    "translate_from_your_language_percentage": rng.choice([0, 50, 100]),
+                }
+            )
+            if response.status_code != 201:
+                continue
+            game = response.json()
+            words = [("from_foreign_language", word) for word in game["from_foreign_language"]]
+            words += [("from_your_language", word) for word in game["from_your_language"]]
+            rng.shuffle(words)
+            round_size = -(-len(words) // config.n_answer_rounds)
+            for start in range(0, len(words), round_size):
+                body = {"from_foreign_language": {}, "from_your_language": {}}
+                for direction, word in words[start:start + round_size]:
+                    # the answers are mostly wrong: checking them costs the same
+                    body[direction][word] = word
+                recorder.request(
+                    client, "games_answers", "POST", f"{API_BASE_ROUTE}/games/{game['id']}/answers", 200,
+                    json=body
+                )
+
+        recorder.request(
+            client, "stats", "GET", f"{API_BASE_ROUTE}/stats/", 200,
+            params={"language": config.language}
+        )
+
+
+def run_load_test(base_url: str, config: LoadTestConfig) -> dict:
+    recorder = LatencyRecorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config.concurrency) as executor:
+        for future in [
+            executor.submit(play_user_session, base_url, config, recorder, user_index)
+            for user_index in range(config.n_users)
+        ]:
+            future.result()
+    duration = time.perf_counter() - start
+    endpoints = recorder.summary(duration)
+    n_requests = sum(endpoint["n_requests"] for endpoint in endpoints.values())
+    return {
+        "commit": get_git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(config),
+        "duration_s": round(duration, 3),
+        "n_requests": n_requests,
+        "n_errors": sum(endpoint["n_errors"] for endpoint in endpoints.values()),
+        "throughput_rps": round(n_requests / duration, 2),
+        "endpoints": endpoints,
+    }
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results: dict, directory: str = LOAD_TEST_RESULTS_DIRECTORY) -> str:
+    """
+    Write the results of a run as json, named after the commit, so that runs on different commits can be diffed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory,
+        f"{results['created_at'].replace(':', '')}_{results['commit'] or 'unknown'}.json"
+    )
+    with open(path, mode='w') as file:
+        json.dump(results, file, indent=2)
+    return path
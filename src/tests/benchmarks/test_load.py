@@ -0,0 +1,16 @@
+import json
+import pytest
+from src.tests.benchmarks.load_harness import LoadTestConfig, run_load_test, save_results
+
+
+@pytest.mark.performance
+def test_game_loop_load(live_server_url: str):
+    config = LoadTestConfig.from_env()
+    results = run_load_test(live_server_url, config)
+    path = save_results(results)
+    print(json.dumps(results, indent=2))
+    print(f"Load test results saved to {path}")
+
+    assert results["n_errors"] == 0
+    assert results["endpoints"]["games_new"]["n_requests"] == config.n_users * config.n_games_per_user
+    assert results["endpoints"]["stats"]["n_requests"] == config.n_users
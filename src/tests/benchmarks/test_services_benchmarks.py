@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from src.db.models import Game, GameWord, User
+from src.services.games import GameService
+from src.services.stats import StatService
+from src.tests.benchmarks.dataset import BENCHMARK_GAME_SIZE, BENCHMARK_LANGUAGE, BenchmarkDataset
+from src.tests.utils import count_queries
+
+# run with `pytest -m performance src/tests/benchmarks --benchmark-autosave` and compare runs with --benchmark-compare
+pytestmark = pytest.mark.performance
+
+game_service = GameService()
+stat_service = StatService()
+# max number of queries per call, whatever the size of the vocabulary or of the stats
+MAX_QUERIES_GENERATE_WORDS = 2
+MAX_QUERIES_VERIFY_ANSWERS = 0
+MAX_QUERIES_GET_GAME_DETAILS = 2
+MAX_QUERIES_GET_STATS = 3
+
+
+@pytest.fixture(scope="function")
+def runner():
+    # one event loop for the whole test, the one the connection of the session belongs to
+    with asyncio.Runner() as runner:
+        yield runner
+
+
+@pytest.fixture(scope="function")
+def db(runner: asyncio.Runner, postgres_async_engine: AsyncEngine):
+    db = async_sessionmaker(bind=postgres_async_engine, expire_on_commit=False)()
+    yield db
+    runner.run(db.close())
+
+
+@pytest.fixture(scope="function")
+def sync_db(postgres_engine: Engine):
+    with sessionmaker(bind=postgres_engine)() as db:
+        yield db
+
+
+def run_benchmark(benchmark: BenchmarkFixture, runner: asyncio.Runner, engine: AsyncEngine, function, *args) -> int:
+    """
+    Benchmark the coroutine function(*args) and return the number of queries a warm call runs.
+    """
+    def call():
+        return runner.run(function(*args))
+
+    # the first call loads the vocabulary index
+    call()
+    with count_queries(engine.sync_engine) as statements:
+        call()
+    benchmark.extra_info["n_queries"] = len(statements)
+    benchmark(call)
+    return len(statements)
+
+
+@pytest.mark.parametrize("game_type", ["random", "hard", "recap"])
+def test_generate_words_for_new_game(
+    benchmark: BenchmarkFixture,
+    runner: asyncio.Runner,
+    postgres_async_engine: AsyncEngine,
+    db: AsyncSession,
+    sync_db: Session,
+    benchmark_dataset: BenchmarkDataset,
+    game_type: str
+):
+    user = sync_db.get(User, benchmark_dataset.user_id)
+    n_queries = run_benchmark(
+        benchmark,
+        runner,
+        postgres_async_engine,
+        game_service._generate_words_for_new_game,
+        db,
+        user,
+        BENCHMARK_LANGUAGE,
+        BENCHMARK_GAME_SIZE,
+        benchmark_dataset.vocabulary_size,
+        game_type,
+        50
+    )
+    assert n_queries <= MAX_QUERIES_GENERATE_WORDS
+
+
+def test_verify_answers(benchmark: BenchmarkFixture, sync_db: Session, benchmark_dataset: BenchmarkDataset):
+    db = sync_db
+    game = db.get(Game, benchmark_dataset.game_id)
+    language_vocabulary = game_service.vocabulary_index.get(db, BENCHMARK_LANGUAGE)
+    game_words = db.query(GameWord).filter(GameWord.game_id == game.id).all()
+    solutions = {game_word.word.text: game_word for game_word in game_words}
+    # half of the answers are right
+    answers = {
+        game_word.word.text: next(iter(language_vocabulary.get_answers(game_word.word_id)[0])) if index % 2 else "wrong"
+        for index, game_word in enumerate(game_words)
+    }
+
+    def setup():
+        return (language_vocabulary, answers, dict(solutions), []), {}
+
+    with count_queries(db.get_bind()) as statements:
+        game_service._verify_answers(*setup()[0])
+    benchmark.extra_info["n_queries"] = len(statements)
+    benchmark.pedantic(game_service._verify_answers, setup=setup, rounds=200)
+    assert len(statements) <= MAX_QUERIES_VERIFY_ANSWERS
+
+
+def test_get_game_details_from_id(
+    benchmark: BenchmarkFixture,
+    runner: asyncio.Runner,
+    postgres_async_engine: AsyncEngine,
+    db: AsyncSession,
+    sync_db: Session,
+    benchmark_dataset: BenchmarkDataset
+):
+    user = sync_db.get(User, benchmark_dataset.user_id)
+    n_queries = run_benchmark(
+        benchmark, runner, postgres_async_engine, game_service.get_game_details_from_id, db, user, benchmark_dataset.game_id
+    )
+    assert n_queries <= MAX_QUERIES_GET_GAME_DETAILS
+
+
+def test_get_stats_for_user(
+    benchmark: BenchmarkFixture,
+    runner: asyncio.Runner,
+    postgres_async_engine: AsyncEngine,
+    db: AsyncSession,
+    sync_db: Session,
+    benchmark_dataset: BenchmarkDataset
+):
+    user = sync_db.get(User, benchmark_dataset.user_id)
+    n_queries = run_benchmark(benchmark, runner, postgres_async_engine, stat_service.get_stats_for_user, db, user, BENCHMARK_LANGUAGE)
+    assert n_queries <= MAX_QUERIES_GET_STATS
@@ -1,11 +1,18 @@
 from fastapi.testclient import TestClient
 from testcontainers.postgres import PostgresContainer
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine, NullPool, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from src import app
 import pytest
-from src.db.models import Base
+from src.db.models import Base, get_async_database_url
+from src.db.redis import TOKEN_BLOCKLIST_CHANNEL, USER_CHANGES_CHANNEL, InvalidationListener
+from src.instrumentation import instrument_engine
 from src.services.auth import get_db_session
+from src.services.principals import user_principal_cache
+from src.services.token_cache import verified_token_cache
+from src.services.vocabulary import vocabulary_index
+from src.tests.utils import in_process_redis, wait_until
 
 @pytest.fixture(scope="session")
 def postgres_container():
@@ -18,20 +25,30 @@ def postgres_container():
 @pytest.fixture(scope="session")
 def postgres_engine(postgres_container: PostgresContainer):
     engine: Engine = create_engine(postgres_container.get_connection_url())
+    instrument_engine(engine)
     Base.metadata.create_all(bind=engine)
+    # vocabularies are loaded with sync sessions, off the event loop
+    vocabulary_index.session_factory = sessionmaker(bind=engine)
     yield engine
     Base.metadata.drop_all(bind=engine)
 
+
+@pytest.fixture(scope="session")
+def postgres_async_engine(postgres_engine: Engine):
+    # the test client serves every request on a new event loop: asyncpg connections cannot be pooled across them
+    engine: AsyncEngine = create_async_engine(
+        get_async_database_url(postgres_engine.url.render_as_string(hide_password=False)), poolclass=NullPool
+    )
+    instrument_engine(engine.sync_engine)
+    yield engine
+
 @pytest.fixture(scope="function")
-def override_get_db(postgres_engine: Engine):
-    TestingSessionLocal = sessionmaker(bind=postgres_engine)
+def override_get_db(postgres_engine: Engine, postgres_async_engine: AsyncEngine):
+    TestingSessionLocal = async_sessionmaker(bind=postgres_async_engine, autoflush=False, expire_on_commit=False)
 
-    def _override():
-        db = TestingSessionLocal()
-        try:
+    async def _override():
+        async with TestingSessionLocal() as db:
             yield db
-        finally:
-            db.close()
     
     app.dependency_overrides[get_db_session] = _override
     yield
@@ -41,10 +58,27 @@ def override_get_db(postgres_engine: Engine):
         for table in reversed(Base.metadata.sorted_tables):
             connection.execute(table.delete())
         trans.commit()
+    # word ids change between tests: drop the vocabulary cached by the app
+    vocabulary_index.invalidate()
 
     app.dependency_overrides.clear()
 
 
 @pytest.fixture(scope="function")
 def client(override_get_db):
-    return TestClient(app)
\ No newline at end of file
+    return TestClient(app)
+
+
+@pytest.fixture(scope="function")
+def cache_invalidation_listener():
+    """
+    Enable the token and principal caches, kept in sync through an in-process redis.
+    """
+    listener = InvalidationListener()
+    listener.register(TOKEN_BLOCKLIST_CHANNEL, verified_token_cache)
+    listener.register(USER_CHANGES_CHANNEL, user_principal_cache)
+    with in_process_redis() as redis:
+        listener.start(redis)
+        wait_until(lambda: verified_token_cache.is_enabled and user_principal_cache.is_enabled)
+        yield redis
+        listener.stop()
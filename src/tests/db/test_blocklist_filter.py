@@ -0,0 +1,68 @@
+import asyncio
+from unittest.mock import patch
+import pytest
+import redis
+from src.db import redis as blocklist
+from src.db.blocklist_filter import BloomFilter, RevokedTokenFilter
+from src.db.redis import TOKEN_BLOCKLIST_STREAM, add_jti_to_blocklist, async_redis_pool, token_in_blocklist
+from src.tests.utils import in_process_redis, wait_until
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom_filter = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom_filter.add(f"revoked-{i}")
+    assert all(f"revoked-{i}" in bloom_filter for i in range(10000))
+    false_positives = sum(f"valid-{i}" in bloom_filter for i in range(10000))
+    assert false_positives < 2 * 0.01 * 10000
+    # items already in the filter are not counted again
+    n_items = bloom_filter.n_items
+    bloom_filter.add("revoked-0")
+    assert bloom_filter.n_items == n_items
+
+
+@pytest.fixture
+def revoked_token_filter():
+    """
+    Revoked token filter synced from an in-process redis, in place of the one of the server.
+    """
+    token_filter = RevokedTokenFilter(capacity=4, error_rate=0.001)
+    with in_process_redis() as redis_client, patch.object(blocklist, "revoked_token_filter", token_filter):
+        # revoked before the filter is started: loaded from the stream
+        asyncio.run(add_jti_to_blocklist("revoked-before-start"))
+        token_filter.start(redis_client, TOKEN_BLOCKLIST_STREAM)
+        wait_until(lambda: token_filter.is_ready)
+        yield token_filter
+        token_filter.stop()
+
+
+def test_unrevoked_tokens_are_not_looked_up_on_redis(revoked_token_filter: RevokedTokenFilter):
+    assert revoked_token_filter.might_contain("revoked-before-start")
+    with patch.object(async_redis_pool, "get_client", side_effect=AssertionError):
+        assert not asyncio.run(token_in_blocklist("valid"))
+    assert asyncio.run(token_in_blocklist("revoked-before-start"))
+
+
+def test_revocations_are_synced_and_filter_is_rebuilt_when_full(revoked_token_filter: RevokedTokenFilter):
+    # revoked by another worker: only seen through the stream
+    for i in range(8):
+        blocklist.token_blacklist.xadd(TOKEN_BLOCKLIST_STREAM, {"jti": f"revoked-{i}"})
+        blocklist.token_blacklist.set(f"revoked-{i}", "")
+    last_id = blocklist.token_blacklist.xinfo_stream(TOKEN_BLOCKLIST_STREAM)["last-generated-id"].decode()
+    wait_until(lambda: revoked_token_filter.capacity > 4 and revoked_token_filter.last_id == last_id)
+    assert all(revoked_token_filter.might_contain(f"revoked-{i}") for i in range(8))
+    assert all(asyncio.run(token_in_blocklist(f"revoked-{i}")) for i in range(8))
+
+
+def test_matching_tokens_are_rejected_while_redis_is_unreachable(revoked_token_filter: RevokedTokenFilter):
+    with patch.object(async_redis_pool, "get_client", side_effect=redis.ConnectionError):
+        assert not asyncio.run(token_in_blocklist("valid"))
+        assert asyncio.run(token_in_blocklist("revoked-before-start"))
+
+
+def test_local_revocations_are_counted_once(revoked_token_filter: RevokedTokenFilter):
+    # revoked by this worker: added to the filter right away, then read back from the stream
+    asyncio.run(add_jti_to_blocklist("revoked-locally"))
+    last_id = blocklist.token_blacklist.xinfo_stream(TOKEN_BLOCKLIST_STREAM)["last-generated-id"].decode()
+    wait_until(lambda: revoked_token_filter.last_id == last_id)
+    assert revoked_token_filter._filter.n_items == 2
@@ -0,0 +1,50 @@
+import threading
+from unittest.mock import patch
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import NullPool, create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from src.db import models
+from src.db.models import get_engine_options
+from src.metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool
+
+
+def get_exhausted_count(outcome: str) -> float:
+    return REGISTRY.get_sample_value("db_pool_exhausted_total", {"outcome": outcome}) or 0
+
+
+def test_pool_exhaustion_is_counted():
+    engine = create_engine("sqlite://", poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.2)
+    waited_before, timeouts_before = get_exhausted_count("waited"), get_exhausted_count("timeout")
+
+    connection = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    assert get_exhausted_count("timeout") == timeouts_before + 1
+
+    # returned while another checkout waits for it
+    threading.Timer(0.05, connection.close).start()
+    engine.connect().close()
+    assert get_exhausted_count("waited") == waited_before + 1
+    assert get_exhausted_count("timeout") == timeouts_before + 1
+    engine.dispose()
+
+
+def test_engine_options():
+    with patch.object(models, "DATABASE_STATEMENT_TIMEOUT_MILLISECONDS", 5000):
+        options = get_engine_options(is_async=True)
+        assert options["poolclass"] is TimedAsyncAdaptedQueuePool
+        assert options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+        options = get_engine_options(is_async=False)
+        assert options["poolclass"] is TimedQueuePool
+        assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+        # transaction pooling: no prepared statements kept, nor session settings
+        with patch.object(models, "DATABASE_PGBOUNCER_MODE", True):
+            options = get_engine_options(is_async=True)
+            assert options["poolclass"] is NullPool
+            assert options["connect_args"]["statement_cache_size"] == 0
+            assert options["connect_args"]["prepared_statement_cache_size"] == 0
+            names = {options["connect_args"]["prepared_statement_name_func"]() for _ in range(2)}
+            assert len(names) == 2
+            assert "connect_args" not in get_engine_options(is_async=False)
@@ -0,0 +1,108 @@
+from pathlib import Path
+from unittest.mock import patch
+from sqlalchemy import Engine
+from sqlalchemy.orm import sessionmaker
+from src.db import snapshot as snapshot_module
+from src.db.models import USER_LANGUAGE, Word, WordTranslation, import_csvs_to_db
+from src.db.snapshot import VocabularySnapshot, build_snapshot, load_vocabulary_snapshot
+from src.db.vocabulary import stream_import_csv
+from src.services.matching import normalize_answer
+from src.services.vocabulary import get_vocabulary_version, load_language_vocabulary
+
+
+def test_snapshot_matches_database(override_get_db, postgres_engine: Engine, tmp_path: Path):
+    snapshot_file = str(tmp_path / "vocabulary.snapshot")
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+        n_words = build_snapshot(db, snapshot_file)
+        snapshot = VocabularySnapshot(snapshot_file)
+        try:
+            assert len(snapshot) == n_words == db.query(Word).count()
+            assert snapshot.is_up_to_date(db)
+
+            word_ids, translation_ids, frequencies = snapshot.get_word_translations("german")
+            word_translations = (
+                db.query(WordTranslation)
+                    .join(WordTranslation.word)
+                    .filter(Word.language == "german")
+                    .order_by(WordTranslation.frequency, WordTranslation.id)
+                    .all()
+            )
+            assert list(word_ids) == [word_translation.word_id for word_translation in word_translations]
+            assert list(translation_ids) == [word_translation.translation_id for word_translation in word_translations]
+            assert list(frequencies) == [word_translation.frequency for word_translation in word_translations]
+
+            for word in db.query(Word).limit(50):
+                assert snapshot.get_word(word.id) == (word.text, word.language)
+            assert snapshot.get_word(-1) is None
+        finally:
+            snapshot.close()
+
+
+def test_snapshot_is_outdated_by_streaming_imports(override_get_db, postgres_engine: Engine, tmp_path: Path, monkeypatch):
+    snapshot_file = str(tmp_path / "vocabulary.snapshot")
+    csv_file = tmp_path / "frequency_list.csv"
+    csv_file.write_text("Frequency,Word,Translation\n1,streamwort,streamword\n")
+    monkeypatch.setattr(snapshot_module, "_vocabulary_snapshot", None)
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+        build_snapshot(db, snapshot_file)
+        snapshot = load_vocabulary_snapshot(db, snapshot_file)
+        try:
+            assert snapshot is not None and snapshot.is_up_to_date(db)
+
+            # words added without a manifest sync: served from the database, not from the snapshot
+            assert stream_import_csv(db, "german", str(csv_file)) == 1
+            assert not snapshot.is_up_to_date(db)
+            vocabulary = load_language_vocabulary(db, "german", get_vocabulary_version(db, "german"))
+            word_id = db.query(Word.id).filter(Word.language == "german", Word.text == "streamwort").scalar()
+            assert word_id in vocabulary.word_ids
+            assert vocabulary.is_correct_answer(word_id, "streamword")
+
+            build_snapshot(db, snapshot_file)
+            rebuilt_snapshot = VocabularySnapshot(snapshot_file)
+            assert rebuilt_snapshot.is_up_to_date(db)
+            rebuilt_snapshot.close()
+        finally:
+            snapshot.close()
+
+
+def test_answers_are_looked_up_in_the_snapshot(override_get_db, postgres_engine: Engine, tmp_path: Path, monkeypatch):
+    snapshot_file = str(tmp_path / "vocabulary.snapshot")
+    monkeypatch.setattr(snapshot_module, "_vocabulary_snapshot", None)
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+        build_snapshot(db, snapshot_file)
+        version = get_vocabulary_version(db, "german")
+        database_vocabulary = load_language_vocabulary(db, "german", version)
+        snapshot = load_vocabulary_snapshot(db, snapshot_file)
+        try:
+            assert snapshot.get_answer_index("german") is not None
+            # no text decoded until a word is answered
+            with patch.object(snapshot, "get_word", side_effect=AssertionError):
+                snapshot_vocabulary = load_language_vocabulary(db, "german", version)
+            assert snapshot_vocabulary.word_positions is snapshot.get_answer_index("german")[0]
+            word_ids = {*snapshot_vocabulary.word_ids[:100], *snapshot_vocabulary.translation_ids[:100]}
+            for word_id in word_ids:
+                answers, answer_language = snapshot_vocabulary.get_answers(word_id)
+                assert answers
+                assert (answers, answer_language) == database_vocabulary.get_answers(word_id)
+            assert snapshot_vocabulary.get_answers(-1) == (frozenset(), "german")
+            assert not snapshot_vocabulary.is_correct_answer(-1, "anything")
+
+            # known words are searched in the snapshot, not decoded into a per-process set
+            policy = snapshot_vocabulary.answer_matching_policy
+            answer_languages = {"german": database_vocabulary.word_ids, USER_LANGUAGE: database_vocabulary.translation_ids}
+            for answer_language, ids in answer_languages.items():
+                known_words = snapshot_vocabulary.known_words[answer_language]
+                assert list(known_words) == sorted(database_vocabulary.known_words[answer_language])
+                spellings = [
+                    spelling
+                    for word_id in ids[:50]
+                    for spelling in normalize_answer(database_vocabulary.get_word(word_id).text, answer_language, policy)
+                ]
+                with patch.object(snapshot, "get_word", side_effect=AssertionError):
+                    assert all(snapshot_vocabulary.is_known_word(answer_language, spelling) for spelling in spellings)
+                    assert not snapshot_vocabulary.is_known_word(answer_language, "xxxxxxxxxxyyyyyyy")
+        finally:
+            snapshot.close()
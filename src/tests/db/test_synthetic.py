@@ -0,0 +1,77 @@
+import asyncio
+from pathlib import Path
+from sqlalchemy import Engine, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from src.db.models import Game, GameWord, Stat, User, VocabularyImportCheckpoint, Word, WordTranslation
+from src.db.synthetic import SyntheticDatasetConfig, generate_synthetic_dataset
+from src.db.vocabulary import sync_language
+from src.services.games import GameService
+
+
+def test_generate_synthetic_dataset(override_get_db, postgres_engine: Engine, postgres_async_engine: AsyncEngine):
+    config = SyntheticDatasetConfig(
+        n_users=20, vocabulary_size=300, mean_stats_per_user=40, max_stats_per_user=200, mean_games_per_user=4
+    )
+    with sessionmaker(bind=postgres_engine)() as db:
+        n_rows = generate_synthetic_dataset(db, config)
+
+        assert db.execute(select(func.count(User.id))).scalar() == config.n_users == n_rows["users"]
+        assert db.execute(select(func.count(Word.id))).scalar() == 3 * config.vocabulary_size
+        assert db.execute(select(func.count(WordTranslation.id))).scalar() == n_rows["word_translations"]
+        assert db.execute(select(func.count(Stat.id))).scalar() == n_rows["stats"] > config.n_users
+        assert db.query(VocabularyImportCheckpoint).filter(VocabularyImportCheckpoint.is_completed).count() == 2
+
+        # games in every state, with counters consistent with the words still to guess
+        games = db.query(Game).all()
+        assert len(games) == n_rows["games"]
+        n_words_to_guess = dict(
+            db.execute(select(GameWord.game_id, func.count(GameWord.id)).group_by(GameWord.game_id)).all()
+        )
+        assert {game.is_active for game in games} == {True, False}
+        for game in games:
+            assert sum(other.is_active for other in games if other.user_id == game.user_id) <= config.max_active_games_per_user
+            n_answered = game.n_words_to_guess - n_words_to_guess.get(game.id, 0)
+            assert game.is_active == (game.id in n_words_to_guess)
+            assert 0 <= game.n_correct_answers <= n_answered
+        assert any(0 < n < game.n_words_to_guess for game in games for n in [n_words_to_guess.get(game.id, 0)])
+
+        # stats hold the language of the game the word was seen in
+        stat_languages = db.execute(
+            select(Stat.language, Word.language).join(Word, Word.id == Stat.word_id).distinct()
+        ).all()
+        assert {stat_language for stat_language, _ in stat_languages} == set(config.languages)
+        assert all(word_language in (stat_language, "english") for stat_language, word_language in stat_languages)
+
+        # sequences moved past the loaded ids: the app can keep inserting
+        user = db.query(User).first()
+
+        async def create_new_game():
+            async with async_sessionmaker(bind=postgres_async_engine)() as async_db:
+                return await GameService().create_new_game(
+                    async_db, await async_db.get(User, user.id), config.languages[0], 10, 100, "new_words", 50
+                )
+
+        game_output_model = asyncio.run(create_new_game())
+        assert game_output_model["id"] > max(game.id for game in games)
+
+        # the same seed generates the same dataset
+        words = db.execute(select(Word.text).order_by(Word.id)).scalars().all()
+    with postgres_engine.begin() as connection:
+        for table in ("stats", "game_words", "games", "word_translations", "words", "users", "vocabulary_import_checkpoints"):
+            connection.exec_driver_sql(f"DELETE FROM {table}")
+    with sessionmaker(bind=postgres_engine)() as db:
+        generate_synthetic_dataset(db, config)
+        assert db.execute(select(Word.text).order_by(Word.id)).scalars().all() == words
+
+
+def test_synthetic_vocabulary_is_not_retired_by_syncs(override_get_db, postgres_engine: Engine, tmp_path: Path):
+    config = SyntheticDatasetConfig(n_users=2, vocabulary_size=300, mean_stats_per_user=10, mean_games_per_user=1)
+    # none of the synthetic pairs is in the csv: all of them would be retired
+    csv_file = tmp_path / "empty.csv"
+    csv_file.write_text("Frequency,Word,Translation\n")
+    with sessionmaker(bind=postgres_engine)() as db:
+        n_rows = generate_synthetic_dataset(db, config)
+        for language in config.languages:
+            assert sync_language(db, language, str(csv_file))
+        assert db.execute(select(func.count(WordTranslation.id))).scalar() == n_rows["word_translations"]
@@ -0,0 +1,201 @@
+from pathlib import Path
+import pytest
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import sessionmaker
+from src.db import vocabulary
+from src.db.models import (
+    SUPPORTED_LANGUAGES,
+    USER_LANGUAGE,
+    Base,
+    VocabularyImportCheckpoint,
+    VocabularyManifest,
+    Word,
+    WordTranslation
+)
+from src.db.vocabulary import (
+    get_current_word_translations,
+    parallel_sync_vocabulary_csvs,
+    stream_import_csv,
+    sync_language
+)
+from src.tests.utils import count_queries
+
+
+def write_vocabulary_csv(csv_file: Path, rows: list[tuple[int, str, str]]):
+    lines = ["Frequency,Word,Translation"] + [f"{frequency},{word},{translation}" for frequency, word, translation in rows]
+    csv_file.write_text("\n".join(lines), encoding="utf-8")
+
+
+def get_vocabulary(db) -> tuple:
+    """
+    Words, word translations and manifests of all the languages, by text since ids depend on the insertion order.
+    """
+    words = set(db.execute(select(Word.language, Word.text)).all())
+    word_translations = {
+        language: {pair: frequency for pair, (_, frequency) in get_current_word_translations(db, language).items()}
+        for language in SUPPORTED_LANGUAGES
+    }
+    manifests = set(db.execute(
+        select(VocabularyManifest.language, VocabularyManifest.checksum, VocabularyManifest.n_word_translations)
+    ).all())
+    return words, word_translations, manifests
+
+
+def test_vocabulary_csv_is_bulk_loaded(override_get_db, postgres_engine: Engine, tmp_path: Path):
+    language = "german"
+    csv_file = tmp_path / f"{language}.csv"
+    # duplicated pair, word with two translations, translation shared by two words
+    rows = [(1, "ich", "i"), (2, "haus", "house"), (2, "haus", "house"), (3, "gebäude", "house"), (4, "bank", "bank"), (5, "bank", "bench")]
+    write_vocabulary_csv(csv_file, rows)
+    large_csv_file = tmp_path / "large.csv"
+    write_vocabulary_csv(large_csv_file, [(index, f"wort{index}", f"word{index % 50}") for index in range(500)])
+
+    with sessionmaker(bind=postgres_engine)() as db, count_queries(postgres_engine) as statements:
+        assert sync_language(db, language, str(csv_file))
+        n_statements = len(statements)
+        assert db.query(Word).filter(Word.language == language).count() == 4
+        assert db.query(Word).filter(Word.language == USER_LANGUAGE).count() == 4
+        assert db.query(WordTranslation).count() == 5
+        assert {pair: frequency for pair, (_, frequency) in get_current_word_translations(db, language).items()} == {
+            ("ich", "i"): 1,
+            ("haus", "house"): 2,
+            ("gebäude", "house"): 3,
+            ("bank", "bank"): 4,
+            ("bank", "bench"): 5,
+        }
+
+        # set-based: as many statements whatever the number of rows
+        statements.clear()
+        assert sync_language(db, "italian", str(large_csv_file))
+        assert len(statements) == n_statements
+        assert db.query(Word).filter(Word.language == "italian").count() == 500
+        assert db.query(Word).filter(Word.language == USER_LANGUAGE).count() == 4 + 50
+        assert db.query(WordTranslation).count() == 5 + 500
+
+
+def test_sync_language_applies_only_changes(override_get_db, postgres_engine: Engine, tmp_path: Path):
+    language = "german"
+    csv_file = tmp_path / f"{language}.csv"
+    write_vocabulary_csv(csv_file, [(1, "ich", "i"), (2, "haus", "house"), (3, "über", "over"), (3, "über", "over")])
+
+    with sessionmaker(bind=postgres_engine)() as db:
+        assert sync_language(db, language, str(csv_file))
+        word_translations = get_current_word_translations(db, language)
+        assert {pair: frequency for pair, (_, frequency) in word_translations.items()} == {
+            ("ich", "i"): 1,
+            ("haus", "house"): 2,
+            ("über", "over"): 3,
+        }
+        manifest = db.query(VocabularyManifest).filter(VocabularyManifest.language == language).one()
+        assert manifest.n_word_translations == 3
+
+        # unchanged csv: nothing to do
+        assert not sync_language(db, language, str(csv_file))
+
+        write_vocabulary_csv(csv_file, [(1, "ich", "i"), (5, "haus", "house"), (2, "katze", "cat")])
+        assert sync_language(db, language, str(csv_file))
+        updated_word_translations = get_current_word_translations(db, language)
+        assert {pair: frequency for pair, (_, frequency) in updated_word_translations.items()} == {
+            ("ich", "i"): 1,
+            ("haus", "house"): 5,
+            ("katze", "cat"): 2,
+        }
+        # untouched rows keep their ids, retired words are kept for games and stats
+        assert updated_word_translations[("ich", "i")][0] == word_translations[("ich", "i")][0]
+        assert updated_word_translations[("haus", "house")][0] == word_translations[("haus", "house")][0]
+        assert db.query(Word).filter(Word.language == language).filter(Word.text == "über").first() is not None
+
+
+def test_stream_import_csv_resumes_from_checkpoint(override_get_db, postgres_engine: Engine, tmp_path: Path, monkeypatch):
+    language = "german"
+    csv_file = tmp_path / "frequency_list.csv"
+    rows = [(index + 1, f"wort{index}", f"word{index % 7}") for index in range(25)]
+    write_vocabulary_csv(csv_file, rows)
+
+    insert_word_translations = vocabulary.insert_word_translations
+    n_flushed_chunks = 0
+
+    def fail_on_third_chunk(*args, **kwargs):
+        nonlocal n_flushed_chunks
+        if n_flushed_chunks == 2:
+            raise RuntimeError("import interrupted")
+        n_flushed_chunks += 1
+        return insert_word_translations(*args, **kwargs)
+
+    with sessionmaker(bind=postgres_engine)() as db:
+        monkeypatch.setattr(vocabulary, "insert_word_translations", fail_on_third_chunk)
+        with pytest.raises(RuntimeError):
+            stream_import_csv(db, language, str(csv_file), chunk_size=10, word_id_cache_size=5)
+        db.rollback()
+        checkpoint = db.query(VocabularyImportCheckpoint).one()
+        assert checkpoint.n_rows_imported == 20
+        assert not checkpoint.is_completed
+
+        monkeypatch.setattr(vocabulary, "insert_word_translations", insert_word_translations)
+        assert stream_import_csv(db, language, str(csv_file), chunk_size=10, word_id_cache_size=5) == 5
+        db.refresh(checkpoint)
+        assert checkpoint.n_rows_imported == 25
+        assert checkpoint.is_completed
+
+        word_translations = get_current_word_translations(db, language)
+        assert {pair: frequency for pair, (_, frequency) in word_translations.items()} == {
+            (word_text, translation_text): frequency for frequency, word_text, translation_text in rows
+        }
+        # a completed import is not run twice
+        assert stream_import_csv(db, language, str(csv_file)) == 0
+
+
+def test_sync_language_retires_only_pairs_not_imported(override_get_db, postgres_engine: Engine, tmp_path: Path, monkeypatch):
+    language = "german"
+    csv_file = tmp_path / f"{language}.csv"
+    stream_csv_file = tmp_path / "frequency_list.csv"
+    write_vocabulary_csv(csv_file, [(1, "ich", "i"), (2, "haus", "house"), (3, "katze", "cat")])
+    write_vocabulary_csv(stream_csv_file, [(1, "haus", "house"), (2, "baum", "tree"), (3, "hund", "dog")])
+
+    insert_word_translations = vocabulary.insert_word_translations
+
+    def fail_on_second_chunk(*args, **kwargs):
+        if args[2].keys() & {("hund", "dog")}:
+            raise RuntimeError("import interrupted")
+        return insert_word_translations(*args, **kwargs)
+
+    with sessionmaker(bind=postgres_engine)() as db:
+        assert sync_language(db, language, str(csv_file))
+        # import in progress: the pairs of its flushed chunks are its own, including one already in the csv
+        monkeypatch.setattr(vocabulary, "insert_word_translations", fail_on_second_chunk)
+        with pytest.raises(RuntimeError):
+            stream_import_csv(db, language, str(stream_csv_file), chunk_size=2)
+        db.rollback()
+        monkeypatch.setattr(vocabulary, "insert_word_translations", insert_word_translations)
+
+        write_vocabulary_csv(csv_file, [(1, "ich", "i")])
+        assert sync_language(db, language, str(csv_file))
+        assert set(get_current_word_translations(db, language)) == {("ich", "i"), ("haus", "house"), ("baum", "tree")}
+
+        # once the import is forgotten, its pairs are retired like any other
+        db.query(VocabularyImportCheckpoint).delete()
+        db.commit()
+        assert sync_language(db, language, str(csv_file), force=True)
+        assert set(get_current_word_translations(db, language)) == {("ich", "i")}
+
+
+def test_parallel_sync_matches_serial_sync(override_get_db, postgres_engine: Engine):
+    assert len(SUPPORTED_LANGUAGES) >= 2
+    with sessionmaker(bind=postgres_engine)() as db:
+        parallel_sync_vocabulary_csvs(db, SUPPORTED_LANGUAGES, n_workers=len(SUPPORTED_LANGUAGES))
+        parallel_vocabulary = get_vocabulary(db)
+        # synced languages are skipped
+        parallel_sync_vocabulary_csvs(db, SUPPORTED_LANGUAGES, n_workers=len(SUPPORTED_LANGUAGES))
+        assert get_vocabulary(db) == parallel_vocabulary
+
+        for table in reversed(Base.metadata.sorted_tables):
+            db.execute(table.delete())
+        db.commit()
+        for language in SUPPORTED_LANGUAGES:
+            assert sync_language(db, language)
+        serial_vocabulary = get_vocabulary(db)
+
+    words, word_translations, manifests = parallel_vocabulary
+    assert {language for language, _, _ in manifests} == set(SUPPORTED_LANGUAGES)
+    assert all(word_translations[language] for language in SUPPORTED_LANGUAGES)
+    assert parallel_vocabulary == serial_vocabulary
@@ -247,3 +247,52 @@ def test_play_game_2(client: TestClient, postgres_engine):
     assert response_dict.get("n_correct_answers") == n_game_correct_answers
     assert response_dict.get("game_score_percentage") == round(100*n_game_correct_answers/n_game_answers, 2)
     assert round_score_percentage == round(100*n_round_correct_answers/n_round_valid_answers, 2)
+
+
+def test_play_hard_and_recap_games(client: TestClient, postgres_engine):
+    username = "manukko_poli"
+    password = "4nCh3S3nZ4B3r&"
+    email = "manukko_poli@studenti.polimi.it"
+
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+    _, access_token = create_user_get_access_token(client, postgres_engine, username, password, email)
+
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+
+    language = "german"
+    body = {
+        "language": language,
+        "n_vocabulary": 300,
+        "n_words_to_guess": 10,
+        "type": "random"
+    }
+
+    response: JSONResponse = client.post(f"{GAMES_BASE_ROUTE}/new", json=body, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    id = response.json().get("id")
+    words_from_foreign_language: list = response.json().get("from_foreign_language")
+
+    # answer 3 words right and 3 words wrong
+    answers_right = get_answers_from_foreign_language(postgres_engine, words_from_foreign_language, language, 3, 3)
+    answers_wrong = get_answers_from_foreign_language(postgres_engine, words_from_foreign_language, language, 3, 0)
+    body = {
+        "from_foreign_language": answers_right | answers_wrong
+    }
+    response: JSONResponse = client.post(f"{GAMES_BASE_ROUTE}/{id}/answers", json=body, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    # hard games are made of the words answered wrong, recap games of the words answered right
+    for game_type, expected_words in (("hard", answers_wrong), ("recap", answers_right)):
+        body = {
+            "language": language,
+            "n_vocabulary": 300,
+            "n_words_to_guess": 3,
+            "type": game_type
+        }
+        response: JSONResponse = client.post(f"{GAMES_BASE_ROUTE}/new", json=body, headers=headers)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert sorted(response.json().get("from_foreign_language")) == sorted(expected_words)
+        assert response.json().get("from_your_language") == []
@@ -0,0 +1,50 @@
+import json
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, event
+from src import instrumentation, version
+from src.db.models import async_engine, engine
+from src.tests.utils import create_user_get_access_token
+
+
+def test_sql_stats_headers_and_slow_request_log(
+    client: TestClient,
+    postgres_engine: Engine,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture
+):
+    _, access_token = create_user_get_access_token(
+        client, postgres_engine, "mariosette", "Pr1m0L3v1", "mariosette@libero.org"
+    )
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+
+    response = client.get(f"/api/{version}/games/", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "X-DB-Query-Count" not in response.headers
+
+    monkeypatch.setattr(instrumentation, "SQL_INSTRUMENTATION_DEBUG", True)
+    monkeypatch.setattr(instrumentation, "SLOW_REQUEST_QUERY_COUNT_THRESHOLD", 0)
+    capsys.readouterr()
+    response = client.get(f"/api/{version}/games/", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    # the current user, then their games
+    assert response.headers["X-DB-Query-Count"] == "2"
+    assert float(response.headers["X-DB-Time-Ms"]) >= float(response.headers["X-DB-Slowest-Query-Ms"]) > 0
+
+    slow_request_logs = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines() if "slow_request" in line
+    ]
+    assert len(slow_request_logs) == 1
+    assert slow_request_logs[0]["path"] == f"/api/{version}/games/"
+    assert slow_request_logs[0]["n_queries"] == 2
+    assert slow_request_logs[0]["slowest_statement"].startswith("SELECT")
+
+
+def test_app_engines_are_instrumented():
+    # the tests run on engines of their own: the ones of the app are checked here
+    for app_engine in (engine, async_engine.sync_engine):
+        assert event.contains(app_engine, "before_cursor_execute", instrumentation._before_cursor_execute)
+        assert event.contains(app_engine, "after_cursor_execute", instrumentation._after_cursor_execute)
@@ -0,0 +1,71 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import Engine
+from sqlalchemy.orm import sessionmaker
+from src import version
+from src.db.models import import_csvs_to_db
+from src.tests.utils import create_user_get_access_token
+
+GAMES_BASE_ROUTE = f"/api/{version}/games"
+WRONG_ANSWER = "XXXXXXXXXXXXXXXYYYYYYY"
+
+
+def get_samples(client: TestClient) -> dict:
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+def test_metrics(client: TestClient, postgres_engine: Engine):
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+    _, access_token = create_user_get_access_token(
+        client, postgres_engine, "mariosette", "Pr1m0L3v1", "mariosette@libero.org"
+    )
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    route_labels = (("method", "GET"), ("route", f"{GAMES_BASE_ROUTE}/{{id}}"), ("status_code", "200"))
+    games_created_labels = (("game_type", "random"), ("language", "german"))
+    wrong_answers_labels = (("language", "german"), ("result", "wrong"))
+    samples_before = get_samples(client)
+
+    body = {
+        "language": "german",
+        "n_vocabulary": 100,
+        "n_words_to_guess": 5,
+        "type": "random"
+    }
+    response = client.post(f"{GAMES_BASE_ROUTE}/new", json=body, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    game = response.json()
+    for _ in range(2):
+        response = client.get(f"{GAMES_BASE_ROUTE}/{game['id']}", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+    body = {
+        "from_foreign_language": {word: WRONG_ANSWER for word in game["from_foreign_language"]}
+    }
+    response = client.post(f"{GAMES_BASE_ROUTE}/{game['id']}/answers", json=body, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    samples = get_samples(client)
+
+    def increase(name: str, labels: tuple) -> float:
+        return samples[(name, labels)] - samples_before.get((name, labels), 0)
+
+    # requests are labelled by route template, not by path
+    assert increase("http_requests_total", route_labels) == 2
+    assert increase("http_request_duration_seconds_count", route_labels[:2]) == 2
+    assert increase("games_created_total", games_created_labels) == 1
+    assert increase("answers_verified_total", wrong_answers_labels) == len(game["from_foreign_language"])
+    assert increase("words_scored_total", (("language", "german"),)) == len(game["from_foreign_language"])
+    assert increase("redis_blocklist_lookup_duration_seconds_count", ()) == 4
+    # every lookup checks a connection out of the async redis pool and returns it
+    assert increase("redis_pool_checkout_wait_seconds_count", ()) == 4
+    assert samples[("redis_pool_size", ())] >= 1
+    assert samples[("redis_pool_checked_out", ())] == 0
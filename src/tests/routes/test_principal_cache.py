@@ -0,0 +1,47 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src import version
+from src.services.auth import create_url_safe_token
+from src.services.principals import user_principal_cache
+from src.tests.utils import count_queries, create_user_get_access_token, wait_until
+
+GAMES_BASE_ROUTE = f"/api/{version}/games"
+
+
+def test_principals_are_cached_until_the_user_changes(
+    client: TestClient,
+    postgres_engine: Engine,
+    postgres_async_engine: AsyncEngine,
+    cache_invalidation_listener
+):
+    username = "mariosette"
+    email = "mariosette@libero.org"
+    user, access_token = create_user_get_access_token(client, postgres_engine, username, "Pr1m0L3v1", email)
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+
+    def get_games_queries() -> list[str]:
+        with count_queries(postgres_async_engine.sync_engine) as statements:
+            response = client.get(f"{GAMES_BASE_ROUTE}/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        return statements
+
+    # the principal, then the games; then the games only
+    assert len(get_games_queries()) == 2
+    assert user_principal_cache.get(username) == (user.id, username, False)
+    assert len(get_games_queries()) == 1
+
+    response = client.get(f"/api/{version}/users/verify/{create_url_safe_token({'email': email})}")
+    assert response.status_code == status.HTTP_200_OK
+    wait_until(lambda: user_principal_cache.get(username) is None)
+    assert len(get_games_queries()) == 2
+    assert user_principal_cache.get(username).is_verified
+
+    response = client.delete(f"/api/{version}/users/delete", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    wait_until(lambda: user_principal_cache.get(username) is None)
+    response = client.get(f"{GAMES_BASE_ROUTE}/", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
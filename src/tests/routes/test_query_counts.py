@@ -0,0 +1,121 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import sessionmaker
+from src import version
+from src.db.models import Stat, Word, import_csvs_to_db
+from src.services.games import GameService
+from src.tests.utils import count_queries, count_rows, create_user_get_access_token
+
+GAMES_BASE_ROUTE = f"/api/{version}/games"
+STATS_BASE_ROUTE = f"/api/{version}/stats"
+WRONG_ANSWER = "XXXXXXXXXXXXXXXYYYYYYY"
+# max number of queries per endpoint, whatever the size of the game or of the stats
+MAX_QUERIES_GET_GAME = 3
+MAX_QUERIES_POST_ANSWERS = 8
+MAX_QUERIES_GET_STATS = 4
+
+
+def play_game(client: TestClient, engine: Engine, headers: dict, n_words_to_guess: int) -> dict[str, int]:
+    body = {
+        "language": "german",
+        "n_vocabulary": 500,
+        "n_words_to_guess": n_words_to_guess,
+        "type": "random",
+        "translate_from_your_language_percentage": 50
+    }
+    response = client.post(f"{GAMES_BASE_ROUTE}/new", json=body, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    game = response.json()
+
+    n_queries = {}
+    with count_queries(engine) as statements:
+        response = client.get(f"{GAMES_BASE_ROUTE}/{game['id']}", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    n_queries["get_game"] = len(statements)
+
+    body = {
+        "from_foreign_language": {word: WRONG_ANSWER for word in game["from_foreign_language"]},
+        "from_your_language": {word: WRONG_ANSWER for word in game["from_your_language"]},
+    }
+    with count_queries(engine) as statements:
+        response = client.post(f"{GAMES_BASE_ROUTE}/{game['id']}/answers", json=body, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    n_queries["post_answers"] = len(statements)
+
+    with count_queries(engine) as statements:
+        response = client.get(f"{STATS_BASE_ROUTE}/", params={"language": "german"}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    n_queries["get_stats"] = len(statements)
+    return n_queries
+
+
+def test_query_counts_do_not_depend_on_size(client: TestClient, postgres_engine: Engine, postgres_async_engine: AsyncEngine):
+    username = "manukko_poli"
+    password = "4nCh3S3nZ4B3r&"
+    email = "manukko_poli@studenti.polimi.it"
+
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+    _, access_token = create_user_get_access_token(client, postgres_engine, username, password, email)
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+
+    # the first game loads the vocabulary index
+    play_game(client, postgres_async_engine.sync_engine, headers, 2)
+    n_queries_small_game = play_game(client, postgres_async_engine.sync_engine, headers, 4)
+    n_queries_large_game = play_game(client, postgres_async_engine.sync_engine, headers, 40)
+
+    assert n_queries_small_game == n_queries_large_game
+    assert n_queries_large_game["get_game"] <= MAX_QUERIES_GET_GAME
+    assert n_queries_large_game["post_answers"] <= MAX_QUERIES_POST_ANSWERS
+    assert n_queries_large_game["get_stats"] <= MAX_QUERIES_GET_STATS
+
+
+def test_hard_games_sample_a_bounded_number_of_stats(client: TestClient, postgres_engine: Engine, postgres_async_engine: AsyncEngine):
+    username = "manukko_poli"
+    password = "4nCh3S3nZ4B3r&"
+    email = "manukko_poli@studenti.polimi.it"
+    n_stats = 300
+    n_words_to_guess = 5
+
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+    user, access_token = create_user_get_access_token(client, postgres_engine, username, password, email)
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    # words all answered wrong: all candidates of a hard game, sharing the same score
+    with sessionmaker(bind=postgres_engine)() as db:
+        word_ids = db.scalars(select(Word.id).where(Word.language == "german").order_by(Word.id).limit(n_stats)).all()
+        db.add_all(
+            Stat(user_id=user.id, word_id=word_id, language="german", n_appearances=1, n_correct_answers=0)
+            for word_id in word_ids
+        )
+        db.commit()
+
+    body = {
+        "language": "german",
+        "n_vocabulary": 500,
+        "n_words_to_guess": n_words_to_guess,
+        "type": "hard"
+    }
+    sampled_words = set()
+    for _ in range(5):
+        with count_rows(postgres_async_engine.sync_engine) as results:
+            response = client.post(f"{GAMES_BASE_ROUTE}/new", json=body, headers=headers)
+            assert response.status_code == status.HTTP_201_CREATED
+        game = response.json()
+        assert len(game["from_foreign_language"]) == n_words_to_guess
+        sampled_words.update(game["from_foreign_language"])
+        # the stats are read through a limited keyset, not fetched whole
+        stats_statements = [(statement, n_rows) for statement, n_rows in results if "FROM stats" in statement]
+        assert stats_statements
+        for statement, n_rows in stats_statements:
+            assert "LIMIT" in statement
+            assert n_rows <= GameService().N_SAMPLE_PROBES_PER_WORD * n_words_to_guess
+        client.delete(f"{GAMES_BASE_ROUTE}/{game['id']}", headers=headers)
+    # words sharing a score are not always sampled from the first one
+    assert len(sampled_words) > n_words_to_guess
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, NullPool, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from src import version
+from src.db.models import Game, GameWord, Stat, Word, import_csvs_to_db
+from src.services.games import GameService
+from src.services.vocabulary import vocabulary_index
+from src.tests.utils import create_user_get_access_token
+
+GAMES_BASE_ROUTE = f"/api/{version}/games"
+N_CLIENTS = 8
+
+
+def test_concurrent_answers_are_scored_once(client: TestClient, postgres_engine: Engine, postgres_async_engine: AsyncEngine):
+    username = "manukko_poli"
+    password = "4nCh3S3nZ4B3r&"
+    email = "manukko_poli@studenti.polimi.it"
+
+    SessionLocal = sessionmaker(bind=postgres_engine)
+    with SessionLocal() as db:
+        import_csvs_to_db(db)
+    user, access_token = create_user_get_access_token(client, postgres_engine, username, password, email)
+
+    language = "german"
+    n_words_to_guess = 20
+    body = {
+        "language": language,
+        "n_vocabulary": 300,
+        "n_words_to_guess": n_words_to_guess,
+        "type": "random",
+        "translate_from_your_language_percentage": 50
+    }
+    response = client.post(f"{GAMES_BASE_ROUTE}/new", json=body, headers={"Authorization": f"Bearer {access_token}"})
+    game_id = response.json().get("id")
+    n_words_to_guess = response.json().get("n_words_to_guess")
+
+    # the first half of the words is answered right and the second half wrong
+    with SessionLocal() as db:
+        language_vocabulary = vocabulary_index.get(db, language)
+        game_words = db.execute(
+            select(Word.id, Word.text, Word.language)
+                .join(GameWord, GameWord.word_id == Word.id)
+                .where(GameWord.game_id == game_id)
+                .order_by(Word.id)
+        ).all()
+    n_expected_correct_answers = len(game_words) // 2
+    answers = [
+        (word_text, word_language, next(iter(language_vocabulary.get_answers(word_id)[0])))
+        if index < n_expected_correct_answers
+        else (word_text, word_language, "XXXXXXXXXXXXXXXYYYYYYY")
+        for index, (word_id, word_text, word_language) in enumerate(game_words)
+    ]
+
+    def get_round_answers(round_answers) -> tuple[dict[str, str], dict[str, str]]:
+        from_foreign_language = {}
+        from_your_language = {}
+        for word_text, word_language, answer in round_answers:
+            if word_language == language:
+                from_foreign_language[word_text] = answer
+            else:
+                from_your_language[word_text] = answer
+        return from_foreign_language, from_your_language
+
+    # every round, all the clients answer at once: round 1 claims the words answered right, round 2
+    # claims the rest and ends the game, and round 3 comes after the game ended
+    rounds = [
+        get_round_answers(answers[:n_expected_correct_answers]),
+        get_round_answers(answers),
+        get_round_answers(answers),
+    ]
+    game_service = GameService()
+    database_url = postgres_async_engine.url.render_as_string(hide_password=False)
+    barrier = threading.Barrier(N_CLIENTS, timeout=60)
+    outcomes = [[] for _ in rounds]
+    errors = []
+
+    # every client runs on its own thread and event loop, with its own engine, hence its own connections,
+    # and opens a new session per round, so that nothing is served from a previous round's identity map
+    async def answer_game():
+        client_engine = create_async_engine(database_url, poolclass=NullPool)
+        AsyncSessionLocal = async_sessionmaker(bind=client_engine, expire_on_commit=False)
+        try:
+            for round_index, (round_from_foreign_language, round_from_your_language) in enumerate(rounds):
+                barrier.wait()
+                async with AsyncSessionLocal() as db:
+                    try:
+                        await game_service.give_answers_for_game(
+                            db, user, game_id, round_from_foreign_language, round_from_your_language
+                        )
+                        outcomes[round_index].append(200)
+                    except HTTPException as exception:
+                        outcomes[round_index].append(exception.status_code)
+        except Exception as exception:
+            errors.append(exception)
+        finally:
+            await client_engine.dispose()
+
+    threads = [threading.Thread(target=asyncio.run, args=(answer_game(),)) for _ in range(N_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert outcomes[0] == [200] * N_CLIENTS
+    # requests arriving after the game ended are rejected
+    assert 200 in outcomes[1] and set(outcomes[1]) <= {200, 403}
+    assert outcomes[2] == [403] * N_CLIENTS
+    with SessionLocal() as db:
+        game = db.get(Game, game_id)
+        assert game.n_correct_answers == n_expected_correct_answers
+        assert not game.is_active
+        assert db.query(GameWord).filter(GameWord.game_id == game_id).count() == 0
+        stats = db.query(Stat).filter(Stat.user_id == user.id).all()
+        assert len(stats) == n_words_to_guess
+        assert {stat.word_id for stat in stats} == {word_id for word_id, _, _ in game_words}
+        assert all(stat.n_appearances == 1 for stat in stats)
+        assert sum(stat.n_correct_answers for stat in stats) == n_expected_correct_answers
+        assert all(
+            stat.n_correct_answers == int(index < n_expected_correct_answers)
+            for index, stat in enumerate(sorted(stats, key=lambda stat: stat.word_id))
+        )
@@ -0,0 +1,92 @@
+import asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from src.db.models import Stat, User, Word, import_csvs_to_db
+from src.services.games import GameService
+from src.tests.utils import create_user_get_access_token
+
+N_GAMES = 40
+N_WORDS_TO_GUESS = 5
+
+
+def add_stats(postgres_engine: Engine, user_id: int, word_ids: list[int], n_appearances: int, n_correct_answers: int):
+    with sessionmaker(bind=postgres_engine)() as db:
+        db.add_all(
+            Stat(
+                user_id=user_id,
+                word_id=word_id,
+                language="german",
+                n_appearances=n_appearances,
+                n_correct_answers=n_correct_answers
+            )
+            for word_id in word_ids
+        )
+        db.commit()
+
+
+def sample_hard_games(postgres_async_engine: AsyncEngine, user_id: int, n_games: int) -> list[list[int]]:
+    game_service = GameService()
+
+    async def sample():
+        async with async_sessionmaker(bind=postgres_async_engine)() as db:
+            user = await db.get(User, user_id)
+            games = []
+            for _ in range(n_games):
+                _, words = await game_service._sample_stat_words(
+                    db, user, "german", (0.0, game_service.MAX_WORD_SCORE_HARD_GAME), 0, N_WORDS_TO_GUESS
+                )
+                games.append([word.id for word in words])
+            return games
+
+    return asyncio.run(sample())
+
+
+def create_user_get_german_word_ids(client: TestClient, postgres_engine: Engine) -> tuple[int, list[int]]:
+    with sessionmaker(bind=postgres_engine)() as db:
+        import_csvs_to_db(db)
+        word_ids = db.scalars(select(Word.id).where(Word.language == "german").order_by(Word.id)).all()
+    user, _ = create_user_get_access_token(
+        client, postgres_engine, "manukko_poli", "4nCh3S3nZ4B3r&", "manukko_poli@studenti.polimi.it"
+    )
+    return user.id, word_ids
+
+
+def test_hard_games_sample_stats_uniformly(client: TestClient, postgres_engine: Engine, postgres_async_engine: AsyncEngine):
+    user_id, word_ids = create_user_get_german_word_ids(client, postgres_engine)
+    # many words never answered right, a few answered right once out of four, and mastered words in between
+    never_right_word_ids = word_ids[0:600:2]
+    rarely_right_word_ids = word_ids[600:610]
+    add_stats(postgres_engine, user_id, never_right_word_ids, 1, 0)
+    add_stats(postgres_engine, user_id, rarely_right_word_ids, 4, 1)
+    add_stats(postgres_engine, user_id, word_ids[1:600:2], 1, 1)
+    candidate_word_ids = never_right_word_ids + rarely_right_word_ids
+
+    games = sample_hard_games(postgres_async_engine, user_id, N_GAMES)
+
+    sampled_word_ids = [word_id for game in games for word_id in game]
+    assert all(len(set(game)) == len(game) == N_WORDS_TO_GUESS for game in games)
+    assert set(sampled_word_ids) <= set(candidate_word_ids)
+    # every stat as likely, whatever its score: 10 out of 310 candidates, about 6 out of 200 sampled words
+    assert sum(word_id in rarely_right_word_ids for word_id in sampled_word_ids) < 25
+    # words of a game are spread among the candidates, not neighbours in word id order
+    positions = {word_id: position for position, word_id in enumerate(candidate_word_ids)}
+    assert sum(
+        max(positions[word_id] for word_id in game) - min(positions[word_id] for word_id in game) < 2 * N_WORDS_TO_GUESS
+        for game in games
+    ) <= 1
+    quarter = len(candidate_word_ids) / 4
+    for quartile in range(4):
+        n_sampled = sum(quartile * quarter <= positions[word_id] < (quartile + 1) * quarter for word_id in sampled_word_ids)
+        assert n_sampled >= 20
+
+
+def test_hard_games_sample_stats_too_sparse_to_be_probed(client: TestClient, postgres_engine: Engine, postgres_async_engine: AsyncEngine):
+    user_id, word_ids = create_user_get_german_word_ids(client, postgres_engine)
+    candidate_word_ids = word_ids[:N_WORDS_TO_GUESS]
+    add_stats(postgres_engine, user_id, candidate_word_ids, 1, 0)
+    add_stats(postgres_engine, user_id, word_ids[N_WORDS_TO_GUESS:], 1, 1)
+
+    for game in sample_hard_games(postgres_async_engine, user_id, 5):
+        assert sorted(game) == candidate_word_ids
@@ -0,0 +1,74 @@
+import pytest
+from src.services.matching import AnswerMatcher, get_answer_matching_policy, get_edit_distance, normalize_answer
+
+
+@pytest.mark.parametrize("candidate", ["über", "ueber", "uber", "Über", " über "])
+def test_umlauts_are_folded(candidate: str):
+    matcher = AnswerMatcher(["über"], "german", get_answer_matching_policy("normalized"))
+    assert matcher.matches(candidate)
+
+
+@pytest.mark.parametrize("candidate", ["heiss", "heis", "heiß"])
+def test_sharp_s_is_folded(candidate: str):
+    matcher = AnswerMatcher(["heiß"], "german", get_answer_matching_policy("lenient"))
+    assert matcher.matches(candidate)
+
+
+@pytest.mark.parametrize("answers, language, candidate", [
+    (["haus"], "german", "das Haus"),
+    (["house"], "english", "the house"),
+    (["uomo"], "italian", "l’uomo"),
+    (["have"], "english", "to have"),
+])
+def test_articles_are_stripped(answers: list[str], language: str, candidate: str):
+    matcher = AnswerMatcher(answers, language, get_answer_matching_policy("normalized"))
+    assert matcher.matches(candidate)
+
+
+def test_typos_are_bounded():
+    matcher = AnswerMatcher(["hinzufügen"], "german", get_answer_matching_policy("lenient"))
+    assert matcher.matches("hinzufugen")
+    assert matcher.matches("hinzufgen")
+    assert matcher.matches("hinzuüfgen")
+    assert not matcher.matches("hinzfgen")
+    # short words must be typed exactly
+    short_word_matcher = AnswerMatcher(["ich"], "german", get_answer_matching_policy("lenient"))
+    assert short_word_matcher.matches("ich")
+    assert not short_word_matcher.matches("ic")
+    assert not short_word_matcher.matches("ish")
+
+
+def test_known_words_are_not_typos():
+    policy = get_answer_matching_policy("lenient")
+    known_words = {
+        variant for word in ["land", "hand", "band", "wand", "Übung"]
+        for variant in normalize_answer(word, "german", policy)
+    }
+    matcher = AnswerMatcher(["land"], "german", policy, known_words.__contains__)
+    assert matcher.matches("Land")
+    assert matcher.matches("lnad")
+    assert matcher.matches("lamd")
+    for other_word in ["hand", "Band", "wand"]:
+        assert not matcher.matches(other_word)
+
+
+def test_typos_are_not_accepted_by_default():
+    matcher = AnswerMatcher(["land"], "german", get_answer_matching_policy())
+    assert matcher.matches("das Land")
+    assert not matcher.matches("lnad")
+
+
+def test_exact_policy():
+    matcher = AnswerMatcher(["über"], "german", get_answer_matching_policy("exact"))
+    assert matcher.matches("Über")
+    assert not matcher.matches("ueber")
+    assert not matcher.matches("die über")
+
+
+def test_edit_distance():
+    assert get_edit_distance("house", "house") == 0
+    assert get_edit_distance("house", "huose") == 1
+    assert get_edit_distance("house", "hose") == 1
+    assert get_edit_distance("house", "mouse") == 1
+    assert get_edit_distance("house", "home") == 2
+    assert get_edit_distance("", "abc") == 3
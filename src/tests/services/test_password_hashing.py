@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException, status
+from src.services.auth import get_password_hash, verify_password
+from src.services.password_hashing import PasswordHashingPool
+
+
+def test_passwords_are_hashed_off_the_event_loop():
+    pool = PasswordHashingPool(max_workers=2, max_queue_depth=4)
+
+    async def hash_and_verify():
+        hashed_password = await pool.run("hash", get_password_hash, "Pr1m0L3v1")
+        thread_name = await pool.run("verify", lambda: threading.current_thread().name)
+        return hashed_password, thread_name
+
+    hashed_password, thread_name = asyncio.run(hash_and_verify())
+    assert verify_password("Pr1m0L3v1", hashed_password)
+    assert thread_name.startswith("password-hashing")
+    assert pool.queue_depth == 0
+    pool.shutdown()
+
+
+def test_full_queue_rejects_jobs():
+    pool = PasswordHashingPool(max_workers=1, max_queue_depth=2)
+    release = threading.Event()
+
+    async def flood():
+        jobs = [asyncio.ensure_future(pool.run("hash", release.wait)) for _ in range(2)]
+        # let the jobs be submitted
+        await asyncio.sleep(0)
+        assert pool.queue_depth == 2
+        with pytest.raises(HTTPException) as exception_info:
+            await pool.run("hash", release.wait)
+        assert exception_info.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert "Retry-After" in exception_info.value.headers
+        release.set()
+        await asyncio.gather(*jobs)
+        # the queue drained: jobs are accepted again
+        return await pool.run("hash", lambda: "hashed")
+
+    assert asyncio.run(flood()) == "hashed"
+    assert pool.queue_depth == 0
+    pool.shutdown()
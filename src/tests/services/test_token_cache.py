@@ -0,0 +1,59 @@
+import asyncio
+import datetime
+import time
+from unittest.mock import patch
+import pytest
+from fastapi import HTTPException, status
+from src.db.redis import add_jti_to_blocklist
+from src.services import auth
+from src.services.auth import create_token, validate_token
+from src.services.token_cache import verified_token_cache
+from src.tests.utils import wait_until
+
+
+def test_verified_tokens_are_cached_until_revoked(cache_invalidation_listener):
+    token = create_token({"sub": "mariosette"}, datetime.timedelta(minutes=5))
+    payload = asyncio.run(validate_token(token))
+    assert len(verified_token_cache) == 1
+
+    # cached: neither decoded again nor looked up in the blocklist
+    with patch.object(auth.jwt, "decode", side_effect=AssertionError), \
+            patch.object(auth, "token_in_blocklist", side_effect=AssertionError):
+        assert asyncio.run(validate_token(token)) == payload
+        with pytest.raises(HTTPException) as exception_info:
+            asyncio.run(validate_token(token, is_refresh_token=True))
+        assert exception_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # revoked by another worker: evicted through the published revocation
+    asyncio.run(add_jti_to_blocklist(payload["jti"]))
+    wait_until(lambda: len(verified_token_cache) == 0)
+    with pytest.raises(HTTPException) as exception_info:
+        asyncio.run(validate_token(token))
+    assert exception_info.value.detail == auth.TOKEN_IN_BLOCKLIST_EXCEPTION.detail
+
+
+def test_expired_tokens_are_evicted(cache_invalidation_listener):
+    token = create_token({"sub": "mariosette"}, datetime.timedelta(minutes=5))
+    # cached as if the token had expired since
+    verified_token_cache.put(token, {"jti": "jti", "exp": time.time() - 1}, verified_token_cache.generation)
+    assert len(verified_token_cache) == 1
+    assert verified_token_cache.get(token) is None
+    assert len(verified_token_cache) == 0
+
+
+def test_cached_payloads_are_not_changed_by_the_callers(cache_invalidation_listener):
+    token = create_token({"sub": "mariosette"}, datetime.timedelta(minutes=5))
+    payload = asyncio.run(validate_token(token))
+    payload["sub"] = "another-user"
+    cached_payload = asyncio.run(validate_token(token))
+    assert cached_payload["sub"] == "mariosette"
+    cached_payload["sub"] = "another-user"
+    assert asyncio.run(validate_token(token))["sub"] == "mariosette"
+
+
+def test_tokens_verified_before_a_revocation_are_not_cached(cache_invalidation_listener):
+    token = create_token({"sub": "mariosette"}, datetime.timedelta(minutes=5))
+    generation = verified_token_cache.generation
+    verified_token_cache.invalidate("another-jti")
+    verified_token_cache.put(token, {"jti": "jti", "exp": time.time() + 60}, generation)
+    assert verified_token_cache.get(token) is None
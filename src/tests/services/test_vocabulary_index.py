@@ -0,0 +1,30 @@
+import asyncio
+import threading
+from sqlalchemy import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from src.services import vocabulary
+from src.services.vocabulary import VocabularyIndex
+
+
+def test_vocabulary_is_loaded_off_the_event_loop(
+    monkeypatch, postgres_engine: Engine, postgres_async_engine: AsyncEngine
+):
+    loading_threads = []
+    load_language_vocabulary = vocabulary.load_language_vocabulary
+
+    def _load_language_vocabulary(db, language, version):
+        loading_threads.append(threading.get_ident())
+        return load_language_vocabulary(db, language, version)
+
+    monkeypatch.setattr(vocabulary, "load_language_vocabulary", _load_language_vocabulary)
+    index = VocabularyIndex(session_factory=sessionmaker(bind=postgres_engine))
+
+    async def get_vocabulary():
+        async with async_sessionmaker(bind=postgres_async_engine)() as db:
+            return threading.get_ident(), await index.get_async(db, "german")
+
+    loop_thread, language_vocabulary = asyncio.run(get_vocabulary())
+    assert language_vocabulary.language == "german"
+    assert len(loading_threads) == 1
+    assert loading_threads[0] != loop_thread
@@ -1,14 +1,18 @@
-from typing import Tuple
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
 from unittest.mock import MagicMock, patch
+import fakeredis
 from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import sessionmaker
 from fastapi import status
-from sqlalchemy import Engine
+from sqlalchemy import Engine, event
 from src import version
 import pytest
 
 from src.db.models import User
+from src.db.redis import async_redis_pool
 
 
 @pytest.mark.helper
@@ -58,4 +62,56 @@ def create_user_get_access_token(client: TestClient, postgres_engine: Engine, us
         user = db.query(User).filter(User.username == username).first()
     assert user is not None
     assert user.username == username
-    return user, token
\ No newline at end of file
+    return user, token
+
+@contextmanager
+def count_queries(engine: Engine):
+    """
+    Collect the statements executed by the engine inside the context.
+    """
+    statements: List[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def count_rows(engine: Engine):
+    """
+    Collect the statements executed by the engine inside the context, with the number of rows they returned.
+    """
+    results: List[Tuple[str, int]] = []
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        results.append((statement, cursor.rowcount))
+
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    try:
+        yield results
+    finally:
+        event.remove(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@contextmanager
+def in_process_redis():
+    """
+    Point the redis client of the background threads and the async clients of the requests to one in-process redis.
+    """
+    server = fakeredis.FakeServer()
+    redis = fakeredis.FakeStrictRedis(server=server)
+    with patch("src.db.redis.token_blacklist", redis), \
+            patch.object(async_redis_pool, "get_client", lambda: fakeredis.FakeAsyncRedis(server=server)):
+        yield redis